@@ -0,0 +1,141 @@
+"""
+模块名称: 主键预排序加载基准
+描述: 把同一批分区文件分别以原始顺序和按主键排序后的顺序 LOAD DATA 到基准表
+(CREATE TABLE ... LIKE 正式表, 主键与分区相同), 对比耗时与 InnoDB 页分裂次数
+(information_schema.INNODB_METRICS 的 index_page_splits, 为全局计数, 请在空闲实例上运行).
+
+用法 (在项目根目录):
+    python -m benchmark.presort_load_benchmark --table-path /home/changliu/junglescout/version=2/format=csv/table=sales_estimates_weekly_v2/ --partition-dir marketplace=us/root_category_id=1/year=2024/week=1
+"""
+
+import argparse
+import os
+import time
+
+from model.server_108.db_junglescout_amazon import TbSalesEstimatesWeeklyV2
+from util.compressed_input import PARTITION_FILE_FORMATS, open_partition_file
+from util.external_sort import (
+    DEFAULT_SORT_MEMORY_BYTES,
+    make_record_key_fn,
+    sort_stream,
+)
+from util.infile_stream import fifo_infile, iter_records_with_suffix
+from util.load_plan import get_file_load_plan
+from util.mysql_pool import POOL_LOAD, get_connection
+
+SQL_SELECT_PAGE_SPLITS = """
+    SELECT COUNT FROM information_schema.INNODB_METRICS WHERE NAME = 'index_page_splits'
+"""
+
+
+def get_page_splits(cursor) -> int:
+    cursor.execute(SQL_SELECT_PAGE_SPLITS)
+    row = cursor.fetchone()
+    return int(row[0]) if row else 0
+
+
+def run_once(
+    file_paths: list[str],
+    table_path: str,
+    bench_table: str,
+    presort: bool,
+    max_memory_bytes: int,
+) -> dict:
+    """
+    重建基准表并加载一次.
+
+    :return: {"mode", "seconds", "page_splits", "rows"}.
+    """
+    load_plan, partition_values = get_file_load_plan(
+        TbSalesEstimatesWeeklyV2, os.path.relpath(file_paths[0], table_path)
+    )
+    suffix = load_plan.partition_suffix(partition_values)
+
+    def iter_chunks():
+        for file_path in file_paths:
+            with open_partition_file(file_path) as f:
+                yield from iter_records_with_suffix(f, suffix)
+
+    with get_connection(POOL_LOAD) as connection:
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {bench_table}")
+            cursor.execute(f"CREATE TABLE {bench_table} LIKE {load_plan.table_name}")
+            cursor.execute("SET GLOBAL innodb_monitor_enable = 'index_page_splits'")
+            page_splits_before = get_page_splits(cursor)
+
+            start_time = time.time()
+            chunks = iter_chunks()
+            if presort:
+                chunks = sort_stream(
+                    chunks, make_record_key_fn(load_plan), max_memory_bytes
+                )
+            with fifo_infile(chunks) as infile_path:
+                cursor.execute(
+                    load_plan.load_data_stream_sql(bench_table), (infile_path,)
+                )
+            connection.commit()
+            seconds = time.time() - start_time
+
+            page_splits = get_page_splits(cursor) - page_splits_before
+            cursor.execute(f"SELECT COUNT(*) FROM {bench_table}")
+            rows = cursor.fetchone()[0]
+            cursor.execute(f"DROP TABLE IF EXISTS {bench_table}")
+    return {
+        "mode": "presorted" if presort else "unsorted",
+        "seconds": seconds,
+        "page_splits": page_splits,
+        "rows": rows,
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="对比按主键预排序前后的 LOAD DATA 性能")
+    parser.add_argument("--table-path", required=True, help="表的绝对路径")
+    parser.add_argument(
+        "--partition-dir", required=True, help="相对于表路径的分区目录, 其中的文件作为一批加载"
+    )
+    parser.add_argument(
+        "--bench-table",
+        default=f"{TbSalesEstimatesWeeklyV2.__tablename__}_bench",
+        help="基准表名, 每轮重建",
+    )
+    parser.add_argument(
+        "--memory-mb",
+        type=int,
+        default=DEFAULT_SORT_MEMORY_BYTES // 1024 // 1024,
+        help="外部排序内存上限 (MB)",
+    )
+    parser.add_argument("--repeat", type=int, default=1, help="每种模式重复次数")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    partition_path = os.path.join(args.table_path, args.partition_dir)
+    file_paths = sorted(
+        os.path.join(partition_path, name)
+        for name in os.listdir(partition_path)
+        if name.endswith(PARTITION_FILE_FORMATS)
+    )
+    print(f"{partition_path=} files={len(file_paths)}")
+
+    results = []
+    for _ in range(args.repeat):
+        for presort in (False, True):
+            result = run_once(
+                file_paths,
+                args.table_path,
+                args.bench_table,
+                presort,
+                args.memory_mb * 1024 * 1024,
+            )
+            print(result)
+            results.append(result)
+
+    for mode in ("unsorted", "presorted"):
+        mode_results = [result for result in results if result["mode"] == mode]
+        seconds = sum(result["seconds"] for result in mode_results) / len(mode_results)
+        page_splits = sum(result["page_splits"] for result in mode_results) / len(
+            mode_results
+        )
+        print(f"{mode:>10}: {seconds:.2f}s, {page_splits:.0f} page splits")
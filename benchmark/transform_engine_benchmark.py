@@ -0,0 +1,120 @@
+"""
+模块名称: 分区转换引擎基准
+描述: 在同一个分区上依次用各转换引擎 (util/transform_engine.py) 生成 tb_data_product / tb_data_week,
+写入基准表 (CREATE TABLE ... LIKE 正式表, 每轮重建), 对比耗时, 并用 CHECKSUM TABLE 确认各引擎的结果一致.
+json_table 引擎需要 MySQL 8.0.4+.
+
+用法 (在项目根目录):
+    python -m benchmark.transform_engine_benchmark --partition p0
+"""
+
+import argparse
+import time
+
+from util.mysql_pool import POOL_TRANSFORM, get_connection
+from util.transform_engine import (
+    DATA_PRODUCT_TABLE,
+    DATA_WEEK_TABLE,
+    TRANSFORM_ENGINES,
+    get_transform_engine,
+)
+
+
+def run_once(
+    engine_name: str,
+    partition_name: str,
+    bench_product_table: str,
+    bench_week_table: str,
+) -> dict:
+    """
+    重建基准表并用一个引擎转换一次.
+
+    :return: {"engine", "product_seconds", "week_seconds", "product_rows", "week_rows",
+        "product_checksum", "week_checksum"}.
+    """
+    engine = get_transform_engine(engine_name)
+    result = {"engine": engine_name}
+    with get_connection(POOL_TRANSFORM) as connection:
+        with connection.cursor() as cursor:
+            for kind, table_name, bench_table, build_sql in (
+                ("product", DATA_PRODUCT_TABLE, bench_product_table, engine.build_data_product_sql),
+                ("week", DATA_WEEK_TABLE, bench_week_table, engine.build_data_week_sql),
+            ):
+                cursor.execute(f"DROP TABLE IF EXISTS {bench_table}")
+                cursor.execute(f"CREATE TABLE {bench_table} LIKE {table_name}")
+                sql, params = build_sql(partition_name, target_table=bench_table)
+
+                start_time = time.time()
+                cursor.execute(sql, params)
+                connection.commit()
+                result[f"{kind}_seconds"] = time.time() - start_time
+
+                cursor.execute(f"SELECT COUNT(*) FROM {bench_table}")
+                result[f"{kind}_rows"] = cursor.fetchone()[0]
+                # 内容校验和与插入顺序无关
+                cursor.execute(f"CHECKSUM TABLE {bench_table}")
+                result[f"{kind}_checksum"] = cursor.fetchone()[1]
+                cursor.execute(f"DROP TABLE IF EXISTS {bench_table}")
+    return result
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="对比各分区转换引擎的耗时与结果")
+    parser.add_argument("--partition", required=True, help="分区名称, 例如 p0")
+    parser.add_argument(
+        "--engines",
+        nargs="+",
+        choices=list(TRANSFORM_ENGINES),
+        default=list(TRANSFORM_ENGINES),
+        help="参与对比的引擎",
+    )
+    parser.add_argument(
+        "--bench-product-table",
+        default=f"{DATA_PRODUCT_TABLE}_bench",
+        help="tb_data_product 的基准表名, 每轮重建",
+    )
+    parser.add_argument(
+        "--bench-week-table",
+        default=f"{DATA_WEEK_TABLE}_bench",
+        help="tb_data_week 的基准表名, 每轮重建",
+    )
+    parser.add_argument("--repeat", type=int, default=1, help="每个引擎重复次数")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    with get_connection(POOL_TRANSFORM) as connection:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT VERSION()")
+            print(f"mysql version={cursor.fetchone()[0]} partition={args.partition}")
+
+    results = []
+    for _ in range(args.repeat):
+        for engine_name in args.engines:
+            result = run_once(
+                engine_name,
+                args.partition,
+                args.bench_product_table,
+                args.bench_week_table,
+            )
+            print(result)
+            results.append(result)
+
+    checksums = {
+        (result["product_checksum"], result["week_checksum"]) for result in results
+    }
+    print(f"results consistent: {len(checksums) == 1}")
+    for engine_name in args.engines:
+        engine_results = [
+            result for result in results if result["engine"] == engine_name
+        ]
+        product_seconds = sum(
+            result["product_seconds"] for result in engine_results
+        ) / len(engine_results)
+        week_seconds = sum(result["week_seconds"] for result in engine_results) / len(
+            engine_results
+        )
+        print(
+            f"{engine_name:>14}: product {product_seconds:.2f}s, week {week_seconds:.2f}s"
+        )
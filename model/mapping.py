@@ -9,3 +9,17 @@ TABLE_RELATIVE_PATH_CLASS_MAPPING: dict[str, base_model.BaseModel] = {
     "version=2/format=csv/table=sales_estimates_weekly_v2/": db_junglescout_amazon.TbSalesEstimatesWeeklyV2,
     "version=2/format=csv/table=sales_estimates_weekly_v2_latest/": db_junglescout_amazon.TbSalesEstimatesWeeklyV2Latest,
 }
+
+# format=parquet 的分区目录与模型的映射, 分区布局与 csv 相同
+PARQUET_TABLE_RELATIVE_PATH_CLASS_MAPPING: dict[str, base_model.BaseModel] = {
+    "version=2/format=parquet/table=category_tree_v2/": db_junglescout_amazon.TbCategoryTreeV2,
+    "version=2/format=parquet/table=category_tree_v2_latest/": db_junglescout_amazon.TbCategoryTreeV2Latest,
+    "version=2/format=parquet/table=sales_estimates_weekly_v2/": db_junglescout_amazon.TbSalesEstimatesWeeklyV2,
+    "version=2/format=parquet/table=sales_estimates_weekly_v2_latest/": db_junglescout_amazon.TbSalesEstimatesWeeklyV2Latest,
+}
+
+# 分区文件格式与映射, 按顺序处理
+FORMAT_TABLE_MAPPINGS: dict[str, dict[str, base_model.BaseModel]] = {
+    "csv": TABLE_RELATIVE_PATH_CLASS_MAPPING,
+    "parquet": PARQUET_TABLE_RELATIVE_PATH_CLASS_MAPPING,
+}
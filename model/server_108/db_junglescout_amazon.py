@@ -4,6 +4,7 @@ from sqlalchemy import (
     Column,
     Date,
     DateTime,
+    Index,
     Integer,
     Numeric,
     PrimaryKeyConstraint,
@@ -43,6 +44,8 @@ class TbDataWeek(BaseModel):
     sales_org = Column(Numeric(20, 2))
     sales_1p_org = Column(Numeric(20, 2))
     sales_3p_org = Column(Numeric(20, 2))
+    # 值列的指纹 (MD5), 转换时指纹未变化的行不更新
+    row_fingerprint = Column(String(32))
 
     __table_args__ = (
         PrimaryKeyConstraint(
@@ -91,6 +94,8 @@ class TbDataProduct(BaseModel):
     data_type = Column(
         Integer, nullable=False, server_default="0", comment="数据清理状态"
     )
+    # 值列的指纹 (MD5), 转换时指纹未变化的行不更新
+    row_fingerprint = Column(String(32))
 
     __table_args__ = (
         PrimaryKeyConstraint(
@@ -122,21 +127,88 @@ class TbLoadedRecords(BaseModel):
     year = Column(Integer, default=0)
     week = Column(String(10), default="0")
     file_name = Column(String(255), default=0)
+    # 文件相对于表目录的完整分区路径, 区分不同分区下的同名文件, 台账的主键
+    relative_path = Column(String(512), nullable=False, server_default="")
+    # 加载时的文件指纹, 用于发现上游原地改写的文件
+    file_size = Column(BigInteger)
+    file_mtime_ns = Column(BigInteger)
+    content_hash = Column(String(32))
 
     __table_args__ = (
         PrimaryKeyConstraint(
-            "table_name",
-            "marketplace",
-            "root_category_id",
-            "year",
-            "week",
-            "file_name",
-            name="tb_loaded_records_unique",
+            "table_name", "relative_path", name="tb_loaded_records_unique"
+        ),
+        Index(
+            "idx_tb_loaded_records_created_datetime", "table_name", "created_datetime"
         ),
         {"mysql_charset": "utf8mb4", "mysql_collate": "utf8mb4_0900_bin"},
     )
 
 
+# 定义 tb_loaded_records_purges 表的 ORM, 台账行被删除时递增, 各客户端据此发现本地镜像过期
+class TbLoadedRecordsPurges(BaseModel):
+    __tablename__ = "tb_loaded_records_purges"
+
+    table_name = Column(String(100), nullable=False)
+    # 该表台账的删除次数, 手工清理台账后也需要递增
+    purge_count = Column(BigInteger, nullable=False, server_default="0")
+
+    __table_args__ = (
+        PrimaryKeyConstraint("table_name", name="pk_tb_loaded_records_purges"),
+        {"mysql_charset": "utf8mb4", "mysql_collate": "utf8mb4_0900_bin"},
+    )
+
+
+# 定义 tb_loaded_chunks 表的 ORM, 记录大文件分块加载的进度
+class TbLoadedChunks(BaseModel):
+    __tablename__ = "tb_loaded_chunks"
+
+    table_name = Column(String(100), nullable=False)
+    relative_path = Column(String(512), nullable=False)
+    # 分块时的文件指纹, 文件变化后断点失效
+    file_size = Column(BigInteger, nullable=False)
+    file_mtime_ns = Column(BigInteger, nullable=False)
+    # 已提交的最后一块的结束偏移
+    committed_offset = Column(BigInteger, nullable=False)
+
+    __table_args__ = (
+        PrimaryKeyConstraint(
+            "table_name", "relative_path", name="pk_tb_loaded_chunks"
+        ),
+        {"mysql_charset": "utf8mb4", "mysql_collate": "utf8mb4_0900_bin"},
+    )
+
+
+# 定义 tb_transform_chunks 表的 ORM, 记录分块转换的进度
+class TbTransformChunks(BaseModel):
+    __tablename__ = "tb_transform_chunks"
+
+    job_name = Column(String(100), nullable=False)
+    # 分块计划的摘要, 计划变化后断点失效
+    plan_hash = Column(String(32), nullable=False)
+    # 已提交的块数
+    committed_chunks = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        PrimaryKeyConstraint("job_name", name="pk_tb_transform_chunks"),
+        {"mysql_charset": "utf8mb4", "mysql_collate": "utf8mb4_0900_bin"},
+    )
+
+
+# 定义 tb_transform_watermarks 表的 ORM, 记录每个转换任务最近一次成功时的加载水位
+class TbTransformWatermarks(BaseModel):
+    __tablename__ = "tb_transform_watermarks"
+
+    job_name = Column(String(100), nullable=False)
+    # 任务开始前的服务端时间, 此前加载的切片已转换
+    loaded_until = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        PrimaryKeyConstraint("job_name", name="pk_tb_transform_watermarks"),
+        {"mysql_charset": "utf8mb4", "mysql_collate": "utf8mb4_0900_bin"},
+    )
+
+
 # 定义 tb_category_tree_v2 表的 ORM
 class TbCategoryTreeV2(BaseModel):
     __tablename__ = "tb_category_tree_v2"
@@ -253,6 +325,13 @@ class TbSalesEstimatesWeeklyV2(BaseModel):
             "asin",
             name="pk_tb_sales_estimates_weekly_v2",
         ),
+        # asin 不是主键前缀, 分块转换的 asin 区间与增量转换的 asin 过滤走这个索引
+        Index(
+            "idx_tb_sales_estimates_weekly_v2_asin",
+            "marketplace",
+            "root_category_id",
+            "asin",
+        ),
         {
             "mysql_engine": "InnoDB",
             "mysql_charset": "utf8mb4",
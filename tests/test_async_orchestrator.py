@@ -0,0 +1,91 @@
+"""
+async_orchestrator 的测试: 异步流水线的分流 (协程/线程加载)、计数、strict 语义与锁错误重试, 不需要数据库.
+"""
+
+import asyncio
+
+import pytest
+
+async_orchestrator = pytest.importorskip("util.async_orchestrator")
+
+
+def run_pipeline(items, invalid=(), failed=(), strict=False):
+    loaded = {"async": [], "thread": []}
+
+    async def async_load_fn(item):
+        await asyncio.sleep(0)
+        loaded["async"].append(item)
+        return item not in failed
+
+    def load_fn(item):
+        loaded["thread"].append(item)
+        if item in failed:
+            raise ValueError(item)
+        return True
+
+    stats = asyncio.run(
+        async_orchestrator.run_async_pipeline(
+            source=iter(items),
+            validate_fn=lambda item: item not in invalid,
+            load_fn=load_fn,
+            async_load_fn=async_load_fn,
+            is_async_item=lambda item: item.startswith("small"),
+            max_in_flight=2,
+            strict=strict,
+        )
+    )
+    return stats, loaded
+
+
+def test_small_files_load_as_coroutines():
+    items = ["small1", "big1", "small2", "small3", "big2"]
+    stats, loaded = run_pipeline(items, failed={"small3", "big2"})
+    assert sorted(loaded["async"]) == ["small1", "small2", "small3"]
+    assert sorted(loaded["thread"]) == ["big1", "big2"]
+    assert stats == {
+        "discovered": 5,
+        "valid": 5,
+        "invalid": 0,
+        "loaded": 3,
+        "load_failed": 2,
+        "async_loaded": 2,
+        "all_valid": True,
+    }
+
+
+def test_invalid_files_are_not_loaded():
+    stats, loaded = run_pipeline(["small1", "small2", "big1"], invalid={"small2"})
+    assert sorted(loaded["async"] + loaded["thread"]) == ["big1", "small1"]
+    assert stats["invalid"] == 1
+    assert not stats["all_valid"]
+
+
+def test_strict_loads_nothing_when_any_file_is_invalid():
+    stats, loaded = run_pipeline(["small1", "big1"], invalid={"big1"}, strict=True)
+    assert loaded == {"async": [], "thread": []}
+    assert stats["loaded"] == 0
+    stats, loaded = run_pipeline(["small1", "big1"], strict=True)
+    assert stats["loaded"] == 2
+
+
+def test_retry_on_lock_errors():
+    attempts = []
+
+    async def job():
+        attempts.append(None)
+        if len(attempts) < 3:
+            raise RuntimeError(1213, "Deadlock found")
+        return True
+
+    assert asyncio.run(
+        async_orchestrator.retry_on_lock_errors(job, "job", backoff_seconds=0)
+    )
+    assert len(attempts) == 3
+
+    async def failing_job():
+        raise RuntimeError(1062, "Duplicate entry")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(
+            async_orchestrator.retry_on_lock_errors(failing_job, "job", backoff_seconds=0)
+        )
@@ -0,0 +1,82 @@
+"""
+DeferredIndexLoad 的集成测试, 需要一个可写的 MySQL 库 (config/config.py 的 DB_CONFIG).
+设置环境变量 RUN_MYSQL_TESTS=1 后运行: python -m pytest tests/test_deferred_index.py
+"""
+
+import os
+
+import pytest
+
+if not os.environ.get("RUN_MYSQL_TESTS"):
+    pytest.skip("RUN_MYSQL_TESTS is not set", allow_module_level=True)
+
+from util.deferred_index import DeferredIndexLoad  # noqa: E402
+from util.mysql_pool import POOL_TRANSFORM, get_connection  # noqa: E402
+
+TABLE_NAME = "test_deferred_index"
+
+
+def execute(*statements: tuple[str, tuple]) -> list:
+    with get_connection(POOL_TRANSFORM) as connection:
+        with connection.cursor() as cursor:
+            for sql, params in statements:
+                cursor.execute(sql, params)
+            rows = cursor.fetchall() if cursor.with_rows else []
+        connection.commit()
+    return rows
+
+
+@pytest.fixture
+def deferred_index(tmp_path):
+    execute(
+        (f"DROP TABLE IF EXISTS {TABLE_NAME}", ()),
+        (
+            f"""
+            CREATE TABLE {TABLE_NAME} (
+              k1 VARCHAR(10) NOT NULL,
+              k2 INT NOT NULL,
+              v INT,
+              PRIMARY KEY (k1, k2),
+              INDEX idx_v (v)
+            )
+            """,
+            (),
+        ),
+    )
+    # 每批只复制两行, 覆盖跨批次的重复组
+    yield DeferredIndexLoad(
+        TABLE_NAME,
+        state_path=str(tmp_path / "state.json"),
+        pool_name=POOL_TRANSFORM,
+        dedup_batch_rows=2,
+    )
+    execute((f"DROP TABLE IF EXISTS {TABLE_NAME}", ()))
+
+
+def test_deferred_load_resolves_multiple_duplicate_groups(deferred_index):
+    rows = [
+        # 同一个键重复三次, 另一个键重复两次, 两个键各自成组
+        ("a", 1, 1),
+        ("a", 1, 2),
+        ("a", 1, 3),
+        ("a", 2, 4),
+        ("a", 2, 5),
+        ("b", 1, 6),
+        ("b", 1, 7),
+        ("c", 1, 8),
+    ]
+    with deferred_index.deferred():
+        execute(
+            *(
+                (f"INSERT INTO {TABLE_NAME} (k1, k2, v) VALUES (%s, %s, %s)", row)
+                for row in rows
+            )
+        )
+
+    keys = execute((f"SELECT k1, k2, COUNT(*) FROM {TABLE_NAME} GROUP BY k1, k2", ()))
+    assert sorted(keys) == [("a", 1, 1), ("a", 2, 1), ("b", 1, 1), ("c", 1, 1)]
+    indexes = deferred_index.get_index_definitions()
+    # 分批复制用的临时索引随旧表删除
+    assert set(indexes) == {"PRIMARY", "idx_v"}
+    assert [column["name"] for column in indexes["PRIMARY"]["columns"]] == ["k1", "k2"]
+    assert not os.path.exists(deferred_index.state_path)
@@ -0,0 +1,58 @@
+"""
+external_sort 的测试: 强制写出多个有序段, 检查归并后的顺序与临时文件的清理.
+"""
+
+import random
+import re
+
+import pytest
+
+external_sort = pytest.importorskip("util.external_sort")
+
+
+def record_key(record: bytes) -> tuple:
+    return (int(record.split(b",", 1)[0]),)
+
+
+def make_chunks(keys: list[int]) -> list[bytes]:
+    # 每块含若干条完整记录, 引号内含换行
+    records = [f'{key},"name\n{key}"\n'.encode() for key in keys]
+    return [b"".join(records[offset : offset + 3]) for offset in range(0, len(records), 3)]
+
+
+def test_sort_stream_merges_several_runs(tmp_path, capsys):
+    keys = list(range(200))
+    random.Random(0).shuffle(keys)
+    sorted_records = list(
+        external_sort.sort_stream(
+            make_chunks(keys),
+            record_key,
+            max_memory_bytes=10 * (external_sort.RECORD_OVERHEAD_BYTES + 20),
+            spill_dir=str(tmp_path),
+        )
+    )
+    spilled_runs = int(re.search(r"spilled (\d+) runs", capsys.readouterr().out).group(1))
+    assert spilled_runs > 1
+    assert sorted_records == [f'{key},"name\n{key}"\n'.encode() for key in range(200)]
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_sort_stream_in_memory(tmp_path):
+    sorted_records = list(
+        external_sort.sort_stream(make_chunks([3, 1, 2]), record_key, spill_dir=str(tmp_path))
+    )
+    assert [record_key(record) for record in sorted_records] == [(1,), (2,), (3,)]
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_sort_stream_cleans_up_when_closed_early(tmp_path):
+    stream = external_sort.sort_stream(
+        make_chunks(list(range(100, 0, -1))),
+        record_key,
+        max_memory_bytes=external_sort.RECORD_OVERHEAD_BYTES,
+        spill_dir=str(tmp_path),
+    )
+    assert record_key(next(stream)) == (1,)
+    assert list(tmp_path.iterdir()) != []
+    stream.close()
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,71 @@
+"""
+file_chunker 的分块边界测试: 每块以完整记录结束, 各块首尾相接覆盖整个数据区.
+"""
+
+from util.file_chunker import find_chunk_boundaries, iter_chunk_records
+
+HEADER = b"asin,name\n"
+
+
+def write_csv(tmp_path, data: bytes):
+    file_path = tmp_path / "a.csv"
+    file_path.write_bytes(HEADER + data)
+    return str(file_path)
+
+
+def read_chunks(file_path: str, boundaries: list[tuple[int, int]]) -> list[bytes]:
+    with open(file_path, "rb") as f:
+        content = f.read()
+    return [content[start:end] for start, end in boundaries]
+
+
+def assert_contiguous(file_path: str, boundaries: list[tuple[int, int]], size: int):
+    assert boundaries[0][0] == len(HEADER)
+    assert boundaries[-1][1] == size
+    for (_, end), (start, _) in zip(boundaries, boundaries[1:]):
+        assert end == start
+
+
+def test_quoted_newlines_stay_in_one_chunk(tmp_path):
+    records = [b'a1,"x\ny"\n', b'a2,"multi\nline\nname"\n', b"a3,plain\n"] * 4
+    data = b"".join(records)
+    file_path = write_csv(tmp_path, data)
+    # 目标块很小, 几乎每个切分点都落在记录中间或引号内
+    boundaries = find_chunk_boundaries(file_path, chunk_bytes=4)
+    assert_contiguous(file_path, boundaries, len(HEADER) + len(data))
+    for chunk in read_chunks(file_path, boundaries):
+        assert chunk.endswith(b"\n")
+        assert chunk.count(b'"') % 2 == 0
+    assert set(read_chunks(file_path, boundaries)) <= set(records)
+
+
+def test_file_smaller_than_one_chunk(tmp_path):
+    data = b"a1,x\na2,y\n"
+    file_path = write_csv(tmp_path, data)
+    assert find_chunk_boundaries(file_path, chunk_bytes=1024) == [
+        (len(HEADER), len(HEADER) + len(data))
+    ]
+
+
+def test_no_trailing_newline(tmp_path):
+    data = b"a1,x\na2,y\na3,z"
+    file_path = write_csv(tmp_path, data)
+    boundaries = find_chunk_boundaries(file_path, chunk_bytes=6)
+    assert_contiguous(file_path, boundaries, len(HEADER) + len(data))
+    assert read_chunks(file_path, boundaries)[-1] == b"a3,z"
+    records = [
+        record
+        for start, end in boundaries
+        for record in iter_chunk_records(file_path, start, end, b",us")
+    ]
+    assert b"".join(records) == b"a1,x,us\na2,y,us\na3,z,us\n"
+
+
+def test_header_only_and_empty_files(tmp_path):
+    file_path = tmp_path / "header.csv"
+    file_path.write_bytes(b"asin,name")
+    assert find_chunk_boundaries(str(file_path)) == []
+    file_path.write_bytes(HEADER)
+    assert find_chunk_boundaries(str(file_path)) == []
+    file_path.write_bytes(b"")
+    assert find_chunk_boundaries(str(file_path)) == []
@@ -0,0 +1,74 @@
+"""
+分区谓词解析与分区路径匹配的测试.
+"""
+
+import pytest
+
+from util.get_partition_info import (
+    parse_partition_predicate,
+    parse_partition_predicates,
+    partition_path_matches,
+)
+
+
+@pytest.mark.parametrize(
+    "expression, key, accepted, rejected",
+    [
+        ("marketplace in (us, de)", "marketplace", ["us", "de"], ["uk"]),
+        ("marketplace IN ('us','de')", "marketplace", ["us", "de"], ["fr"]),
+        ("week between 10 and 20", "week", ["10", "15", "20"], ["9", "21"]),
+        ("year >= 2024", "year", ["2024", "2025"], ["2023"]),
+        ("year <= 2024", "year", ["2023", "2024"], ["2025"]),
+        ("year > 2024", "year", ["2025"], ["2024"]),
+        ("year < 2024", "year", ["2023"], ["2024"]),
+        ("marketplace = us", "marketplace", ["us"], ["de"]),
+        ("marketplace != us", "marketplace", ["de"], ["us"]),
+        ("year>=2024", "year", ["2024"], ["2023"]),
+    ],
+)
+def test_parse_partition_predicate_operators(expression, key, accepted, rejected):
+    parsed_key, predicate = parse_partition_predicate(expression)
+    assert parsed_key == key
+    assert all(predicate(value) for value in accepted)
+    assert not any(predicate(value) for value in rejected)
+
+
+def test_numeric_values_compare_as_numbers():
+    _, predicate = parse_partition_predicate("week in (9)")
+    assert predicate("09")
+    _, predicate = parse_partition_predicate("week < 10")
+    # 按数值比较, 字符串比较时 "9" > "10"
+    assert predicate("9")
+
+
+@pytest.mark.parametrize(
+    "expression",
+    ["", "marketplace", "marketplace like us%", "year >", "week between 1", "= 2024"],
+)
+def test_parse_partition_predicate_rejects_bad_input(expression):
+    with pytest.raises(ValueError):
+        parse_partition_predicate(expression)
+
+
+def test_parse_partition_predicates_groups_by_key():
+    predicates = parse_partition_predicates(["year >= 2023", "year <= 2024", "week = 1"])
+    assert sorted(predicates) == ["week", "year"]
+    assert len(predicates["year"]) == 2
+    assert parse_partition_predicates(None) == {}
+
+
+def test_partition_path_matches_nested_paths():
+    predicates = parse_partition_predicates(
+        ["marketplace in (us)", "year >= 2024", "year <= 2024"]
+    )
+    assert partition_path_matches("marketplace=us/year=2024/week=1/a.csv", predicates)
+    assert not partition_path_matches("marketplace=de/year=2024/week=1/a.csv", predicates)
+    assert not partition_path_matches("marketplace=us/year=2025/week=1/a.csv", predicates)
+    # 路径中未出现的字段不参与判断, 扫描时可对单个目录名剪枝
+    assert partition_path_matches("marketplace=us", predicates)
+    assert not partition_path_matches("year=2023", predicates)
+    assert partition_path_matches("/data/t/other/a.csv", predicates)
+
+
+def test_partition_path_matches_without_predicates():
+    assert partition_path_matches("marketplace=us/year=2024", {})
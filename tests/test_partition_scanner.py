@@ -0,0 +1,69 @@
+"""
+partition_scanner 的清单缓存测试.
+"""
+
+import json
+import shutil
+
+from util.get_partition_info import parse_partition_predicates
+from util.partition_scanner import iter_partition_files
+
+
+def make_tree(table_path, marketplaces):
+    for marketplace in marketplaces:
+        partition_dir = table_path / f"marketplace={marketplace}" / "year=2024"
+        partition_dir.mkdir(parents=True)
+        (partition_dir / "a.csv").write_text("x")
+
+
+def scan(table_path, manifest_path, partition_filters=None):
+    return sorted(
+        (str(file_path), is_new)
+        for file_path, is_new in iter_partition_files(
+            str(table_path),
+            manifest_path=str(manifest_path),
+            predicates=parse_partition_predicates(partition_filters or []),
+        )
+    )
+
+
+def manifest_dirs(manifest_path):
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        return sorted(json.load(f)["dirs"])
+
+
+def test_unchanged_files_are_not_new(tmp_path):
+    table_path, manifest_path = tmp_path / "t", tmp_path / "manifest.json"
+    make_tree(table_path, ["us", "de"])
+    assert [is_new for _, is_new in scan(table_path, manifest_path)] == [True, True]
+    assert [is_new for _, is_new in scan(table_path, manifest_path)] == [False, False]
+
+
+def test_filtered_scan_keeps_pruned_subtrees(tmp_path):
+    table_path, manifest_path = tmp_path / "t", tmp_path / "manifest.json"
+    make_tree(table_path, ["us", "de"])
+    scan(table_path, manifest_path)
+    files = scan(table_path, manifest_path, ["marketplace in (us)"])
+    assert [path.split("/")[-3] for path, _ in files] == ["marketplace=us"]
+    assert manifest_dirs(manifest_path) == [
+        ".",
+        "marketplace=de",
+        "marketplace=de/year=2024",
+        "marketplace=us",
+        "marketplace=us/year=2024",
+    ]
+    # 剪枝后的全量扫描仍命中缓存
+    assert not any(is_new for _, is_new in scan(table_path, manifest_path))
+
+
+def test_removed_dirs_leave_the_manifest(tmp_path):
+    table_path, manifest_path = tmp_path / "t", tmp_path / "manifest.json"
+    make_tree(table_path, ["us", "de"])
+    scan(table_path, manifest_path)
+    shutil.rmtree(table_path / "marketplace=de")
+    scan(table_path, manifest_path)
+    assert manifest_dirs(manifest_path) == [
+        ".",
+        "marketplace=us",
+        "marketplace=us/year=2024",
+    ]
@@ -0,0 +1,169 @@
+"""
+product_dedup 的测试. 期望值按 SQL 转换 (ROW_NUMBER ... ORDER BY breadcrumb_path_category_ids DESC,
+seller_id_mode DESC, image_url DESC, 递归 CTE SplitSellerId, SUBSTRING_INDEX 拆分类目) 的语义给出;
+设置环境变量 RUN_MYSQL_TESTS=1 时另与 MySQL 对同一输入的计算结果逐一比较.
+"""
+
+import os
+
+import pytest
+
+from util.product_dedup import (
+    CATEGORY_LEVELS,
+    PRODUCT_SOURCE_FIELDS,
+    BestRowReducer,
+    iter_product_records,
+    product_key,
+    product_order,
+    split_categories,
+    split_sellers,
+)
+
+
+def make_row(asin="B1", breadcrumb="a|b", sellers="s1", image_url="i", name="n") -> tuple:
+    row = dict.fromkeys(PRODUCT_SOURCE_FIELDS)
+    row.update(
+        marketplace="us",
+        root_category_id=1,
+        asin=asin,
+        breadcrumb_path_category_ids=breadcrumb,
+        seller_id_mode=sellers,
+        image_url=image_url,
+        name=name,
+    )
+    return tuple(row[field] for field in PRODUCT_SOURCE_FIELDS)
+
+
+def best_names(rows: list[tuple], max_memory_bytes: int | None = None) -> list[str]:
+    name_index = PRODUCT_SOURCE_FIELDS.index("name")
+    kwargs = {} if max_memory_bytes is None else {"max_memory_bytes": max_memory_bytes}
+    with BestRowReducer(product_key, product_order, **kwargs) as reducer:
+        reducer.add_all(rows)
+        return [row[name_index] for row in reducer.iter_best()]
+
+
+@pytest.mark.parametrize(
+    "rows, expected",
+    [
+        # breadcrumb 最大者胜出
+        ([make_row(breadcrumb="a", name="x"), make_row(breadcrumb="b", name="y")], "y"),
+        # breadcrumb 相同时比较 seller_id_mode, 再比较 image_url
+        ([make_row(sellers="s2", name="x"), make_row(sellers="s1", name="y")], "x"),
+        ([make_row(image_url="i1", name="x"), make_row(image_url="i2", name="y")], "y"),
+        # DESC 排序时 NULL 排在最后, 空串排在 NULL 之前
+        ([make_row(breadcrumb=None, name="x"), make_row(breadcrumb="", name="y")], "y"),
+        ([make_row(sellers="", name="x"), make_row(sellers=None, name="y")], "x"),
+        # 按码点 (utf8mb4_0900_bin) 比较, 大写字母小于小写字母
+        ([make_row(breadcrumb="b", name="x"), make_row(breadcrumb="B", name="y")], "x"),
+        # 三列都相同时 SQL 的选择不确定, 客户端保留最先出现的行
+        ([make_row(name="x"), make_row(name="y")], "x"),
+    ],
+)
+def test_best_row_tie_breaks(rows, expected):
+    assert best_names(rows) == [expected]
+
+
+def test_best_row_across_spilled_runs(tmp_path):
+    rows = [
+        make_row(asin=f"B{index % 5}", breadcrumb=f"c{index % 7}", name=str(index))
+        for index in range(40)
+    ]
+    expected = best_names(rows)
+    # 每行都写出一个有序段, 同一个键的候选行分散在多个段中
+    assert best_names(rows, max_memory_bytes=1) == expected
+    assert len(expected) == 5
+
+
+@pytest.mark.parametrize(
+    "seller_id_mode, seller_ids, seller_num",
+    [
+        ("s1|s2", ["s1", "s2"], 2),
+        ("s1|", ["s1"], 2),
+        ("s1||", ["s1", ""], 3),
+        ("s1||s2", ["s1", "", "s2"], 3),
+        ("|", [""], 2),
+        ("", [""], 1),
+        (None, [None], None),
+    ],
+)
+def test_split_sellers(seller_id_mode, seller_ids, seller_num):
+    assert split_sellers(seller_id_mode) == (seller_ids, seller_num)
+
+
+@pytest.mark.parametrize(
+    "breadcrumb, categories",
+    [
+        ("a|b|c", ["a", "b", "c"]),
+        ("a||c", ["a", "", "c"]),
+        ("", [""]),
+        ("|".join("abcdefghi"), list("abcdefg")),
+        (None, []),
+    ],
+)
+def test_split_categories(breadcrumb, categories):
+    assert split_categories(breadcrumb) == categories + [None] * (
+        CATEGORY_LEVELS - len(categories)
+    )
+
+
+def test_product_records_encode_null_and_escapes():
+    row = make_row(breadcrumb=None, sellers="s1|s2|", image_url=None, name='a"b\\c')
+    records = list(iter_product_records([row]))
+    assert len(records) == 2
+    fields = records[0].rstrip(b"\n").split(b",")
+    # asin, seller_id, 名称中的引号与反斜杠转义, NULL 为 \N
+    assert fields[2:5] == [b'"B1"', b'"s1"', b"\\N"]
+    assert b'"a""b\\\\c"' in records[0]
+    assert b'"3"' in records[1]
+
+
+@pytest.mark.skipif(
+    not os.environ.get("RUN_MYSQL_TESTS"), reason="RUN_MYSQL_TESTS is not set"
+)
+@pytest.mark.parametrize(
+    "value", ["s1|s2", "s1|", "s1||", "s1||s2", "|", "", "a|b|c|d|e|f|g|h", None]
+)
+def test_splits_match_mysql(value):
+    from util.mysql_pool import POOL_TRANSFORM, get_connection
+
+    category_sql = ", ".join(
+        [
+            "SUBSTRING_INDEX(v, '|', 1)",
+            *(
+                f"CASE WHEN LENGTH(v) - LENGTH(REPLACE(v, '|', '')) >= {level} "
+                f"THEN SUBSTRING_INDEX(SUBSTRING_INDEX(v, '|', {level + 1}), '|', -1) END"
+                for level in range(1, CATEGORY_LEVELS)
+            ),
+        ]
+    )
+    with get_connection(POOL_TRANSFORM) as connection:
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT {category_sql} FROM (SELECT %s AS v) AS t", (value,))
+            assert list(cursor.fetchone()) == split_categories(value)
+            # 与 SQL 转换相同的递归拆分
+            cursor.execute(
+                """
+                WITH RECURSIVE SplitSellerId AS (
+                  SELECT
+                    SUBSTRING_INDEX(v, '|', 1) AS seller_id,
+                    SUBSTRING(v, LENGTH(SUBSTRING_INDEX(v, '|', 1)) + 2) AS remaining_sellers,
+                    (LENGTH(v) - LENGTH(REPLACE(v, '|', '')) + 1) AS seller_num,
+                    0 AS depth
+                  FROM (SELECT %s AS v) AS t
+                  UNION ALL
+                  SELECT
+                    SUBSTRING_INDEX(remaining_sellers, '|', 1),
+                    SUBSTRING(remaining_sellers, LENGTH(SUBSTRING_INDEX(remaining_sellers, '|', 1)) + 2),
+                    seller_num,
+                    depth + 1
+                  FROM SplitSellerId
+                  WHERE remaining_sellers != ''
+                )
+                SELECT seller_id, seller_num FROM SplitSellerId ORDER BY depth
+                """,
+                (value,),
+            )
+            rows = cursor.fetchall()
+    seller_ids, seller_num = split_sellers(value)
+    assert [row[0] for row in rows] == seller_ids
+    assert {row[1] for row in rows} == {seller_num}
@@ -0,0 +1,83 @@
+"""
+seller_explode 的单元测试: 拆分卖家、按主键去重与 CSV 编码, 对照递归 CTE SplitSellerId 的语义.
+"""
+
+import pytest
+
+pd = pytest.importorskip("pandas")
+seller_explode = pytest.importorskip("util.seller_explode")
+
+NULL_FIELD = seller_explode.NULL_FIELD
+
+
+def make_frame(sellers: list[str], asins: list[str] | None = None) -> "pd.DataFrame":
+    asins = asins or [f"B{index:03d}" for index in range(len(sellers))]
+    rows = [
+        {
+            **{field: "0" for field in seller_explode.WEEK_KEY_FIELDS},
+            "asin": asin,
+            seller_explode.SELLER_FIELD: seller,
+            "revenue": str(index),
+        }
+        for index, (asin, seller) in enumerate(zip(asins, sellers))
+    ]
+    return pd.DataFrame(rows, index=range(10, 10 + len(rows)))
+
+
+def exploded_rows(frame) -> list[tuple]:
+    return list(frame[["asin", "seller_id", "seller_num"]].itertuples(index=False))
+
+
+def test_explode_sellers_one_row_per_seller():
+    frame = seller_explode.explode_sellers(make_frame(["s1|s2|s3", "s4"]))
+    assert exploded_rows(frame) == [
+        ("B000", "s1", "3"),
+        ("B000", "s2", "3"),
+        ("B000", "s3", "3"),
+        ("B001", "s4", "1"),
+    ]
+    assert seller_explode.SELLER_FIELD not in frame.columns
+
+
+def test_explode_sellers_trailing_separator_counts_but_adds_no_row():
+    frame = seller_explode.explode_sellers(make_frame(["s1|s2|"]))
+    assert exploded_rows(frame) == [("B000", "s1", "3"), ("B000", "s2", "3")]
+
+
+def test_explode_sellers_null_and_empty():
+    frame = seller_explode.explode_sellers(make_frame([NULL_FIELD, ""]))
+    # NULL 产生一行空卖家, seller_num 为 NULL; 空串产生一行空卖家, seller_num 为 1
+    assert exploded_rows(frame) == [("B000", "", NULL_FIELD), ("B001", "", "1")]
+
+
+def test_drop_duplicate_week_rows_keeps_first_across_chunks():
+    seen_keys = set()
+    first = seller_explode.drop_duplicate_week_rows(
+        seller_explode.explode_sellers(
+            make_frame(["s1|s2", "s1", "s1|s1"], asins=["B1", "B1", "B2"])
+        ),
+        seen_keys,
+    )
+    assert list(first[["asin", "seller_id", "revenue"]].itertuples(index=False)) == [
+        ("B1", "s1", "0"),
+        ("B1", "s2", "0"),
+        ("B2", "s1", "2"),
+    ]
+    second = seller_explode.drop_duplicate_week_rows(
+        seller_explode.explode_sellers(make_frame(["s2|s3"], asins=["B1"])), seen_keys
+    )
+    assert list(second[["asin", "seller_id"]].itertuples(index=False)) == [("B1", "s3")]
+
+
+def test_encode_frame_quotes_values_and_keeps_null():
+    frame = pd.DataFrame({"a": ['x"y', NULL_FIELD, ""], "b": ["1,2", "3", NULL_FIELD]})
+    assert seller_explode.encode_frame(frame, ("a", "b")) == (
+        b'"x""y","1,2"\n' + b'\\N,"3"\n' + b'"",\\N\n'
+    )
+
+
+def test_encode_frame_column_order_and_utf8():
+    frame = pd.DataFrame({"a": ["\u00e9"], "b": ["z"]})
+    assert seller_explode.encode_frame(frame, ("b", "a")) == '"z","\u00e9"\n'.encode(
+        "utf-8"
+    )
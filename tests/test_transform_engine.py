@@ -0,0 +1,176 @@
+"""
+transform_engine 的测试: 检查两个引擎生成的语句 (目标表、分区、过滤参数、ON DUPLICATE KEY UPDATE);
+设置环境变量 RUN_MYSQL_TESTS=1 时, 在 tb_sales_estimates_weekly_v2 中写入一组专用切片的测试行,
+分别用两个引擎转换到基准表并逐行比较, 结束后删除测试行与基准表.
+"""
+
+import os
+import re
+
+import pytest
+
+transform_engine = pytest.importorskip("util.transform_engine")
+
+ENGINES = list(transform_engine.TRANSFORM_ENGINES.values())
+SLICES = [("us", 1, 2024, "10"), ("de", 2, 2024, "11")]
+ASIN_RANGE = ("us", 1, "B000", "B999")
+
+
+def insert_columns(sql: str) -> list[str]:
+    columns = re.search(r"INSERT INTO \S+ \((.*?)\)", sql, re.DOTALL).group(1)
+    return [column.strip() for column in columns.split(",")]
+
+
+def update_assignments(sql: str) -> list[str]:
+    clause = sql.split("ON DUPLICATE KEY UPDATE", 1)[1].strip().rstrip(";").strip()
+    return [assignment.split("=", 1)[0].strip() for assignment in clause.split(",\n")]
+
+
+@pytest.mark.parametrize("engine", ENGINES, ids=lambda engine: engine.name)
+def test_data_product_sql(engine):
+    sql, params = engine.build_data_product_sql("p7", target_table="t_product")
+    assert params == ()
+    assert "%s" not in sql
+    assert "INSERT INTO t_product (" in sql
+    assert "PARTITION (p7)" in sql
+    assert insert_columns(sql)[-1] == "row_fingerprint"
+    assert update_assignments(sql) == [
+        *transform_engine.DATA_PRODUCT_UPDATE_FIELDS,
+        "row_fingerprint",
+    ]
+    # 读取原值时以目标表限定列名
+    assert "t_product.row_fingerprint <=> VALUES(row_fingerprint)" in sql
+
+
+@pytest.mark.parametrize("engine", ENGINES, ids=lambda engine: engine.name)
+def test_data_product_sql_with_slices_and_asin_range(engine):
+    sql, params = engine.build_data_product_sql("p7", SLICES, asin_range=ASIN_RANGE)
+    assert params == (*SLICES[0], *SLICES[1], *ASIN_RANGE)
+    assert sql.count("%s") == len(params)
+    # 增量时只重算新切片中出现过的 asin, 仍读取这些 asin 的全部历史行
+    assert "(marketplace, root_category_id, asin) IN (" in sql
+    assert "asin BETWEEN %s AND %s" in sql
+
+
+@pytest.mark.parametrize("engine", ENGINES, ids=lambda engine: engine.name)
+def test_data_week_sql(engine):
+    sql, params = engine.build_data_week_sql("p7", target_table="t_week")
+    assert params == ()
+    assert "INSERT INTO t_week (" in sql
+    assert update_assignments(sql) == [
+        *transform_engine.DATA_WEEK_UPDATE_FIELDS,
+        "row_fingerprint",
+    ]
+    sql, params = engine.build_data_week_sql("p7", SLICES)
+    assert params == (*SLICES[0], *SLICES[1])
+    assert sql.count("%s") == len(params)
+    assert "(marketplace, root_category_id, year, week) IN ((%s, %s, %s, %s), (%s, %s, %s, %s))" in sql
+
+
+def test_engines_insert_the_same_columns():
+    product_columns = {
+        tuple(insert_columns(engine.build_data_product_sql("p0")[0])) for engine in ENGINES
+    }
+    week_columns = {
+        tuple(insert_columns(engine.build_data_week_sql("p0")[0])) for engine in ENGINES
+    }
+    assert len(product_columns) == 1
+    assert len(week_columns) == 1
+
+
+def test_get_transform_engine_rejects_unknown_name():
+    assert transform_engine.get_transform_engine().name == "recursive_cte"
+    with pytest.raises(ValueError):
+        transform_engine.get_transform_engine("unknown")
+
+
+# 专用切片, 不与真实数据重叠
+TEST_MARKETPLACE = "zz"
+TEST_ROOT_CATEGORY_ID = -7
+RAW_TABLE = "db_junglescout_amazon.tb_sales_estimates_weekly_v2"
+RAW_COLUMNS = (
+    "marketplace",
+    "root_category_id",
+    "year",
+    "week",
+    "start_date",
+    "end_date",
+    "asin",
+    "brand",
+    "name",
+    "image_url",
+    "breadcrumb_path_category_ids",
+    "seller_id_mode",
+    "seller_types",
+    "revenue",
+    "sales",
+)
+RAW_ROWS = [
+    # 同一 asin 多周, 按 breadcrumb / seller_id_mode / image_url 挑选
+    ("2099", "1", "2099-01-01", "2099-01-07", "ZT1", "b", "n1", "i1", "a|b", "s1|s2", "t", "10.00", "3"),
+    ("2099", "2", "2099-01-08", "2099-01-14", "ZT1", "b", "n2", "i2", "a|c", "s1|", "t", "7.50", "1"),
+    ("2099", "3", "2099-01-15", "2099-01-21", "ZT1", "b", "n3", None, "a|c", "s1||s3", "t", None, "2"),
+    ("2099", "1", "2099-01-01", "2099-01-07", "ZT2", "b", "n4", "i4", None, None, None, "5.00", "1"),
+    ("2099", "2", "2099-01-08", "2099-01-14", "ZT2", "b", "n5", "i5", "", "", "t", "1.00", "1"),
+    ("2099", "1", "2099-01-01", "2099-01-07", "ZT3", "b", "n6", "i6", "|".join("abcdefghi"), "|", "t", "3.33", "7"),
+]
+
+
+@pytest.mark.skipif(
+    not os.environ.get("RUN_MYSQL_TESTS"), reason="RUN_MYSQL_TESTS is not set"
+)
+def test_engines_produce_the_same_rows():
+    from util.mysql_pool import POOL_TRANSFORM, get_connection
+
+    slices = sorted(
+        {(TEST_MARKETPLACE, TEST_ROOT_CATEGORY_ID, int(row[0]), row[1]) for row in RAW_ROWS}
+    )
+    with get_connection(POOL_TRANSFORM) as connection:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {RAW_TABLE} WHERE marketplace = %s AND root_category_id = %s",
+                (TEST_MARKETPLACE, TEST_ROOT_CATEGORY_ID),
+            )
+            cursor.executemany(
+                f"INSERT INTO {RAW_TABLE} ({', '.join(RAW_COLUMNS)}) "
+                f"VALUES ({', '.join(['%s'] * len(RAW_COLUMNS))})",
+                [(TEST_MARKETPLACE, TEST_ROOT_CATEGORY_ID, *row) for row in RAW_ROWS],
+            )
+            connection.commit()
+            # 表按 KEY(asin) 分区, 由执行计划得到每个 asin 所在的分区
+            partitions = set()
+            for asin in {row[4] for row in RAW_ROWS}:
+                cursor.execute(f"EXPLAIN SELECT * FROM {RAW_TABLE} WHERE asin = %s", (asin,))
+                columns = [column[0] for column in cursor.description]
+                partitions.add(cursor.fetchone()[columns.index("partitions")])
+
+            results = {}
+            try:
+                for engine in ENGINES:
+                    for kind, table_name, build_sql in (
+                        ("product", transform_engine.DATA_PRODUCT_TABLE, engine.build_data_product_sql),
+                        ("week", transform_engine.DATA_WEEK_TABLE, engine.build_data_week_sql),
+                    ):
+                        target_table = f"{table_name}_test_{engine.name}"
+                        cursor.execute(f"DROP TABLE IF EXISTS {target_table}")
+                        cursor.execute(f"CREATE TABLE {target_table} LIKE {table_name}")
+                        for partition_name in sorted(partitions):
+                            cursor.execute(
+                                *build_sql(partition_name, slices, target_table=target_table)
+                            )
+                        connection.commit()
+                        cursor.execute(f"SELECT * FROM {target_table}")
+                        results[engine.name, kind] = sorted(cursor.fetchall(), key=repr)
+                        cursor.execute(f"DROP TABLE {target_table}")
+            finally:
+                cursor.execute(
+                    f"DELETE FROM {RAW_TABLE} WHERE marketplace = %s AND root_category_id = %s",
+                    (TEST_MARKETPLACE, TEST_ROOT_CATEGORY_ID),
+                )
+                connection.commit()
+
+    for kind in ("product", "week"):
+        expected = results[ENGINES[0].name, kind]
+        assert expected
+        for engine in ENGINES[1:]:
+            assert results[engine.name, kind] == expected, (engine.name, kind)
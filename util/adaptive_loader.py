@@ -0,0 +1,273 @@
+"""
+模块名称: 自适应并发加载调度
+描述: 同时运行多路 LOAD DATA, 按时间窗口统计总吞吐 (字节/秒) 以及本加载器自身的锁竞争:
+加载时遇到的死锁/锁等待超时 (1213/1205), 以及加载连接池的会话在 performance_schema.data_lock_waits
+中的锁等待 (其他客户端之间的锁等待不计入), 用爬山法自动上调或下调并发度; 出现锁竞争时减半.
+文件加载完成时才计入吞吐, 因此窗口至少取最近加载耗时中位数的数倍, 没有文件完成的窗口顺延到下一窗口.
+死锁和锁等待超时的文件按指数退避重试.
+"""
+
+import os
+import statistics
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable
+
+import mysql.connector
+
+from util.mysql_pool import POOL_LOAD, get_active_connection_ids, get_connection
+
+# 1213: 死锁, 1205: 锁等待超时
+RETRYABLE_LOCK_ERRNOS = {1213, 1205}
+# 窗口长度至少为最近加载耗时中位数的倍数, 以及参与统计的最近加载数
+LOAD_DURATION_WINDOW_FACTOR = 3
+LOAD_DURATION_SAMPLES = 20
+
+
+def get_item_size(item: str | list[str]) -> int:
+    """
+    单个任务的数据量: 文件大小, 或一批文件的大小之和.
+    """
+    if isinstance(item, str):
+        return os.path.getsize(item)
+    return sum(os.path.getsize(file_path) for file_path in item)
+
+
+class _ConcurrencyGate:
+    """
+    上限可动态调整的信号量.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self._condition = threading.Condition()
+
+    def set_limit(self, limit: int) -> None:
+        with self._condition:
+            self.limit = limit
+            self._condition.notify_all()
+
+    @contextmanager
+    def slot(self):
+        with self._condition:
+            while self.active >= self.limit:
+                self._condition.wait()
+            self.active += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self.active -= 1
+                self._condition.notify()
+
+
+class AdaptiveLoadScheduler:
+    """
+    自适应并发调度器. 用法:
+
+        scheduler = AdaptiveLoadScheduler(max_workers=8)
+        with scheduler.running():
+            run_streaming_pipeline(..., load_fn=scheduler.wrap(load_fn), load_workers=8)
+    """
+
+    def __init__(
+        self,
+        min_workers: int = 1,
+        max_workers: int = 8,
+        initial_workers: int = 2,
+        window_seconds: float = 30.0,
+        max_retries: int = 5,
+        backoff_seconds: float = 1.0,
+        weight_fn: Callable = get_item_size,
+        pool_name: str = POOL_LOAD,
+    ):
+        """
+        :param min_workers: 并发度下限.
+        :param max_workers: 并发度上限, 调用方需要启动相同数量的加载线程.
+        :param initial_workers: 初始并发度.
+        :param window_seconds: 统计与调整的最短时间窗口, 文件加载耗时较长时自动延长.
+        :param max_retries: 死锁/锁等待超时的最大重试次数.
+        :param backoff_seconds: 退避基数, 第 n 次重试等待 backoff_seconds * 2 ** (n - 1).
+        :param weight_fn: 计算单个任务数据量的函数, 默认为文件 (或一批文件) 的大小.
+        :param pool_name: 加载使用的连接池, 只统计其中会话的锁等待, 也用于采集锁指标.
+        """
+        self.min_workers = min_workers
+        self.max_workers = max_workers
+        self.window_seconds = window_seconds
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.weight_fn = weight_fn
+        self.pool_name = pool_name
+        self._gate = _ConcurrencyGate(
+            max(min_workers, min(initial_workers, max_workers))
+        )
+        self._lock = threading.Lock()
+        self._window_bytes = 0
+        self._window_deadlocks = 0
+        self._load_durations: deque[float] = deque(maxlen=LOAD_DURATION_SAMPLES)
+        self._stop = threading.Event()
+        self._monitor_thread: threading.Thread | None = None
+        self._last_throughput: float | None = None
+        self._direction = 1
+        self.history: list[dict] = []
+        self.retries = 0
+
+    def wrap(self, load_fn: Callable[[str], bool]) -> Callable[[str], bool]:
+        """
+        包装单文件加载函数: 受并发度限制, 记录吞吐, 死锁/锁等待超时退避重试.
+
+        :param load_fn: 单文件加载函数, 死锁类错误需要以 mysql.connector.Error 抛出.
+        :return: 包装后的加载函数.
+        """
+
+        def scheduled_load(file_path: str) -> bool:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    with self._gate.slot():
+                        started = time.monotonic()
+                        is_loaded = load_fn(file_path)
+                        duration = time.monotonic() - started
+                except mysql.connector.Error as ex:
+                    if ex.errno not in RETRYABLE_LOCK_ERRNOS:
+                        raise
+                    with self._lock:
+                        self._window_deadlocks += 1
+                        self.retries += 1
+                    if attempt == self.max_retries:
+                        print(f"giving up {file_path=} after {attempt} retries: {ex}")
+                        return False
+                    backoff = self.backoff_seconds * 2**attempt
+                    print(f"lock error on {file_path=}, retry in {backoff:.1f}s: {ex}")
+                    time.sleep(backoff)
+                    continue
+                if is_loaded:
+                    with self._lock:
+                        self._window_bytes += self.weight_fn(file_path)
+                        self._load_durations.append(duration)
+                return is_loaded
+            return False
+
+        return scheduled_load
+
+    def _sample_lock_waits(self) -> int:
+        """
+        采集加载连接池中的会话当前正在等待的行锁数.
+        """
+        connection_ids = get_active_connection_ids(self.pool_name)
+        if not connection_ids:
+            return 0
+        with get_connection(self.pool_name) as connection:
+            with connection.cursor() as cursor:
+                try:
+                    cursor.execute(
+                        f"""
+                        SELECT COUNT(*)
+                        FROM performance_schema.data_lock_waits AS lock_waits
+                        JOIN performance_schema.threads AS threads
+                          ON threads.THREAD_ID = lock_waits.REQUESTING_THREAD_ID
+                        WHERE threads.PROCESSLIST_ID IN ({", ".join(["%s"] * len(connection_ids))})
+                        """,
+                        tuple(connection_ids),
+                    )
+                    return cursor.fetchone()[0]
+                except mysql.connector.Error:
+                    return 0  # 低版本或未开启 performance_schema
+
+    def _current_window_seconds(self) -> float:
+        """
+        下一个窗口的长度: 至少 window_seconds, 且容纳得下数个典型文件的加载.
+        """
+        with self._lock:
+            durations = list(self._load_durations)
+        if not durations:
+            return self.window_seconds
+        return max(
+            self.window_seconds,
+            LOAD_DURATION_WINDOW_FACTOR * statistics.median(durations),
+        )
+
+    def _adjust(self, elapsed_seconds: float) -> bool:
+        """
+        按窗口内的吞吐与锁竞争调整并发度.
+
+        :param elapsed_seconds: 窗口的实际长度.
+        :return: 是否完成了调整; 窗口内既没有文件完成也没有锁竞争时不调整, 窗口顺延.
+        """
+        with self._lock:
+            window_bytes, self._window_bytes = self._window_bytes, 0
+            deadlocks, self._window_deadlocks = self._window_deadlocks, 0
+        throughput = window_bytes / elapsed_seconds
+
+        # 只看本加载器自身遇到的死锁/锁等待超时和自身会话的锁等待, 不受实例上其他负载影响
+        try:
+            lock_waits = self._sample_lock_waits()
+        except mysql.connector.Error as ex:
+            print(f"Error sampling lock waits: {ex}")
+            lock_waits = 0
+        lock_contention = deadlocks > 0 or lock_waits > 0
+        if not window_bytes and not lock_contention:
+            # 所有加载仍在进行中, 没有可比较的吞吐
+            return False
+
+        workers = self._gate.limit
+        if lock_contention:
+            # 出现锁竞争时快速收缩
+            new_workers = max(self.min_workers, workers // 2)
+            self._direction = 1
+        elif self._last_throughput is None or throughput >= self._last_throughput * 1.05:
+            # 吞吐提升, 沿当前方向继续
+            new_workers = workers + self._direction
+        elif throughput < self._last_throughput * 0.95:
+            # 吞吐下降, 回退并反向试探
+            self._direction = -self._direction
+            new_workers = workers + self._direction
+        else:
+            new_workers = workers
+        new_workers = max(self.min_workers, min(self.max_workers, new_workers))
+
+        self.history.append(
+            {
+                "workers": workers,
+                "window_seconds": elapsed_seconds,
+                "throughput_mb_s": throughput / 1024 / 1024,
+                "lock_contention": lock_contention,
+                "lock_waits": lock_waits,
+                "deadlock_retries": deadlocks,
+            }
+        )
+        print(
+            f"adaptive loader {workers=} window={elapsed_seconds:.0f}s throughput={throughput / 1024 / 1024:.2f}MB/s "
+            f"{lock_contention=} {deadlocks=} {lock_waits=} -> {new_workers}"
+        )
+        self._last_throughput = throughput
+        if new_workers != workers:
+            self._gate.set_limit(new_workers)
+        return True
+
+    def _monitor(self) -> None:
+        window_started = time.monotonic()
+        while not self._stop.wait(self._current_window_seconds()):
+            now = time.monotonic()
+            if self._adjust(now - window_started):
+                window_started = now
+
+    @contextmanager
+    def running(self):
+        """
+        启动后台调整线程, 退出时停止并打印每个窗口的统计.
+        """
+        self._stop.clear()
+        self._monitor_thread = threading.Thread(
+            target=self._monitor, name="adaptive-loader-monitor", daemon=True
+        )
+        self._monitor_thread.start()
+        try:
+            yield self
+        finally:
+            self._stop.set()
+            self._monitor_thread.join()
+            best = max(self.history, key=lambda item: item["throughput_mb_s"], default=None)
+            print(f"adaptive loader done, retries={self.retries}, best window={best}")
@@ -0,0 +1,266 @@
+"""
+模块名称: asyncio 加载编排
+描述: 基于 aiomysql 的异步连接池与异步流水线. 大量轻量的数据库往返 (服务端台账查询、分区状态查询、
+小文件的 LOAD DATA) 以协程方式在少量连接上重叠执行, 不必为每个在途文件占用一个线程和一个连接;
+发现与校验仍是阻塞的文件系统操作, 放在线程中执行. 不适合协程的文件 (大文件、需要解码或合并的文件)
+交给原有的同步加载函数, 在线程中执行, 并发数受 load_workers 限制. 依赖可选的 aiomysql.
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Iterable
+
+from config.config import DB_CONFIG  # 引入配置
+from util.mysql_pool import build_init_command
+
+try:
+    import aiomysql
+except ImportError:  # aiomysql 为可选依赖, 只有 --async-load 需要
+    aiomysql = None
+
+DEFAULT_ASYNC_POOL_SIZE = 8
+# 1213: 死锁, 1205: 锁等待超时
+RETRYABLE_LOCK_ERRNOS = {1213, 1205}
+
+_SENTINEL = object()
+
+
+def _require_aiomysql() -> None:
+    if aiomysql is None:
+        raise RuntimeError("aiomysql is required for async loading")
+
+
+class AsyncMySQLPool:
+    """
+    aiomysql 连接池的封装, 用法与 mysql_pool.get_connection 一致.
+    """
+
+    def __init__(self, pool):
+        """
+        :param pool: aiomysql 连接池, 请使用 AsyncMySQLPool.create 创建.
+        """
+        self._pool = pool
+
+    @classmethod
+    async def create(
+        cls,
+        pool_size: int = DEFAULT_ASYNC_POOL_SIZE,
+        db_config: dict = DB_CONFIG,
+        session_variables: dict[str, str] | None = None,
+    ) -> "AsyncMySQLPool":
+        """
+        创建连接池.
+
+        :param pool_size: 最大连接数, 协程数可以远大于连接数.
+        :param db_config: MySQL 连接配置 (mysql.connector 的键名).
+        :param session_variables: 会话变量 {变量名: SQL 字面量}, 建立连接时以 init_command 设置.
+        :return: 连接池.
+        """
+        _require_aiomysql()
+        connect_config = dict(db_config)
+        # aiomysql 的库名参数为 db
+        if "database" in connect_config:
+            connect_config["db"] = connect_config.pop("database")
+        if session_variables:
+            connect_config["init_command"] = build_init_command(session_variables)
+        pool = await aiomysql.create_pool(
+            minsize=1,
+            maxsize=max(1, pool_size),
+            autocommit=False,
+            local_infile=True,
+            **connect_config,
+        )
+        print(f"async connection pool created, {pool_size=}")
+        return cls(pool)
+
+    @asynccontextmanager
+    async def acquire(self):
+        """
+        借出一个连接, 退出时归还; 异常时先回滚.
+
+        :return: 连接上下文.
+        """
+        async with self._pool.acquire() as connection:
+            try:
+                yield connection
+            except BaseException:
+                try:
+                    await connection.rollback()
+                except Exception:
+                    pass
+                raise
+
+    async def close(self) -> None:
+        self._pool.close()
+        await self._pool.wait_closed()
+
+
+def get_error_code(ex: Exception) -> int | None:
+    """
+    aiomysql (PyMySQL) 错误的 MySQL 错误码, 对应 mysql.connector.Error.errno.
+    """
+    return ex.args[0] if ex.args and isinstance(ex.args[0], int) else None
+
+
+async def retry_on_lock_errors(
+    job: Callable[[], Awaitable[bool]],
+    name: str,
+    max_retries: int = 5,
+    backoff_seconds: float = 1.0,
+) -> bool:
+    """
+    执行一个异步任务, 死锁/锁等待超时时按指数退避重试 (与 AdaptiveLoadScheduler 的重试规则一致).
+
+    :param job: 无参数的协程函数, 返回是否成功.
+    :param name: 任务名, 用于日志.
+    :param max_retries: 最大重试次数.
+    :param backoff_seconds: 退避基数, 第 n 次重试等待 backoff_seconds * 2 ** (n - 1).
+    :return: 是否成功.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return await job()
+        except Exception as ex:
+            if get_error_code(ex) not in RETRYABLE_LOCK_ERRNOS:
+                raise
+            if attempt == max_retries:
+                print(f"giving up {name} after {attempt} retries: {ex}")
+                return False
+            backoff = backoff_seconds * 2**attempt
+            print(f"lock error on {name}, retry in {backoff:.1f}s: {ex}")
+            await asyncio.sleep(backoff)
+    return False
+
+
+async def get_nonempty_partitions(
+    pool: AsyncMySQLPool, table_name: str, partitions: list[str]
+) -> set[str]:
+    """
+    并发查询各分区是否有数据, 每个分区一次 LIMIT 1 的主键读取.
+
+    :param pool: 异步连接池.
+    :param table_name: 表名 (含库名).
+    :param partitions: 分区名称列表.
+    :return: 有数据的分区.
+    """
+
+    async def is_nonempty(partition_name: str) -> bool:
+        async with pool.acquire() as connection:
+            async with connection.cursor() as cursor:
+                await cursor.execute(
+                    f"SELECT 1 FROM {table_name} PARTITION ({partition_name}) LIMIT 1"
+                )
+                return await cursor.fetchone() is not None
+
+    results = await asyncio.gather(*map(is_nonempty, partitions))
+    return {
+        partition_name
+        for partition_name, nonempty in zip(partitions, results)
+        if nonempty
+    }
+
+
+async def run_async_pipeline(
+    source: Iterable[str],
+    validate_fn: Callable[[str], bool],
+    load_fn: Callable[[str], bool],
+    async_load_fn: Callable[[str], Awaitable[bool]],
+    is_async_item: Callable[[str], bool],
+    max_in_flight: int = 1000,
+    validate_workers: int = 4,
+    load_workers: int = 1,
+    strict: bool = False,
+) -> dict:
+    """
+    异步版的发现→校验→加载流水线, 参数与返回值同 pipeline.run_streaming_pipeline.
+    每个文件一个协程: 在线程中校验, 满足 is_async_item 的文件由 async_load_fn 以协程加载
+    (并发度由异步连接池大小限制), 其余文件在线程中调用 load_fn.
+
+    :param source: 待处理文件迭代器, 在线程中逐个读取.
+    :param validate_fn: 单文件校验函数, 返回是否通过, 抛出异常视为不通过.
+    :param load_fn: 同步的单文件加载函数.
+    :param async_load_fn: 异步的单文件加载函数.
+    :param is_async_item: 判断文件是否以协程加载.
+    :param max_in_flight: 同时在途 (校验中或加载中) 的文件数上限.
+    :param validate_workers: 同时校验的文件数.
+    :param load_workers: 同时以线程加载的文件数.
+    :param strict: 是否全部校验通过后才开始加载.
+    :return: {"discovered", "valid", "invalid", "loaded", "load_failed", "async_loaded"} 计数,
+        以及 "all_valid" (是否全部校验通过).
+    """
+    stats = {
+        "discovered": 0,
+        "valid": 0,
+        "invalid": 0,
+        "loaded": 0,
+        "load_failed": 0,
+        "async_loaded": 0,
+    }
+    in_flight = asyncio.Semaphore(max(1, max_in_flight))
+    validate_slots = asyncio.Semaphore(max(1, validate_workers))
+    load_slots = asyncio.Semaphore(max(1, load_workers))
+    strict_validated: list[str] = []
+    errors: list[BaseException] = []
+
+    async def load(file_path: str) -> None:
+        try:
+            if is_async_item(file_path):
+                is_loaded = await async_load_fn(file_path)
+                stats["async_loaded"] += bool(is_loaded)
+            else:
+                async with load_slots:
+                    is_loaded = await asyncio.to_thread(load_fn, file_path)
+        except Exception as ex:
+            print(f"Error loading {file_path}: {ex}")
+            is_loaded = False
+        stats["loaded" if is_loaded else "load_failed"] += 1
+
+    async def process(file_path: str) -> None:
+        try:
+            try:
+                async with validate_slots:
+                    is_valid = await asyncio.to_thread(validate_fn, file_path)
+            except Exception as ex:
+                print(f"Error validating {file_path}: {ex}")
+                is_valid = False
+            if not is_valid:
+                stats["invalid"] += 1
+                return
+            stats["valid"] += 1
+            if strict:
+                strict_validated.append(file_path)
+            else:
+                await load(file_path)
+        finally:
+            in_flight.release()
+
+    tasks = set()
+    iterator = iter(source)
+    while True:
+        await in_flight.acquire()
+        try:
+            file_path = await asyncio.to_thread(next, iterator, _SENTINEL)
+        except BaseException as ex:
+            errors.append(ex)
+            file_path = _SENTINEL
+        if file_path is _SENTINEL:
+            in_flight.release()
+            break
+        stats["discovered"] += 1
+        task = asyncio.create_task(process(file_path))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    await asyncio.gather(*tasks)
+
+    all_valid = stats["invalid"] == 0 and not errors
+    if strict and all_valid:
+        # 整表校验通过后再统一加载
+        async def load_bounded(file_path: str) -> None:
+            async with in_flight:
+                await load(file_path)
+
+        await asyncio.gather(*map(load_bounded, sorted(strict_validated)))
+
+    if errors:
+        print(f"Error discovering files: {errors[0]}")
+    return {**stats, "all_valid": all_valid}
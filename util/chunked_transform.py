@@ -0,0 +1,183 @@
+"""
+模块名称: 分块转换
+描述: 把一个分区的 INSERT ... SELECT ... ON DUPLICATE KEY UPDATE 拆成若干按键范围划分的块, 每块单独提交,
+undo 日志、tb_data_week 上的行锁和从库延迟都以块为上限. tb_data_week 按 (marketplace, root_category_id,
+year, week) 切片分块, tb_data_product 按 (marketplace, root_category_id) 内的 asin 区间分块 (同一 asin 的
+全部历史行在同一块内挑选, 不能按 year/week 切分), 区间边界从 (marketplace, root_category_id, asin)
+二级索引一次算出 (索引覆盖计数, 无需读取数据行), 每块也沿该索引只读取区间内的行. 每块的目标行数按原始数据的行数估算. 进度与块在同一事务中写入
+tb_transform_chunks, 中断后重新运行时跳过已提交的块; 分块计划变化 (例如期间又加载了数据) 时从头开始.
+"""
+
+import hashlib
+import json
+from typing import Callable
+
+from util.incremental_transform import build_asin_filter
+from util.mysql_pool import POOL_TRANSFORM, get_connection
+from util.transform_engine import build_week_filter
+
+DEFAULT_TRANSFORM_CHUNK_ROWS = 500000
+# 原始数据表上的 (marketplace, root_category_id, asin) 索引, 见 TbSalesEstimatesWeeklyV2
+ASIN_INDEX_NAME = "idx_tb_sales_estimates_weekly_v2_asin"
+
+SQL_SELECT_TRANSFORM_CHECKPOINT = """
+    SELECT plan_hash, committed_chunks
+    FROM db_junglescout_amazon.tb_transform_chunks
+    WHERE job_name = %s
+"""
+
+SQL_UPSERT_TRANSFORM_CHECKPOINT = """
+    INSERT INTO db_junglescout_amazon.tb_transform_chunks (job_name, plan_hash, committed_chunks)
+    VALUES (%s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        plan_hash = VALUES(plan_hash),
+        committed_chunks = VALUES(committed_chunks);
+"""
+
+SQL_DELETE_TRANSFORM_CHECKPOINT = """
+    DELETE FROM db_junglescout_amazon.tb_transform_chunks
+    WHERE job_name = %s;
+"""
+
+
+def plan_week_chunks(
+    partition_name: str,
+    slices: list[tuple] | None = None,
+    chunk_rows: int = DEFAULT_TRANSFORM_CHUNK_ROWS,
+    pool_name: str = POOL_TRANSFORM,
+) -> list[list[tuple]]:
+    """
+    按主键顺序把分区内的切片装入块, 每块的行数不超过 chunk_rows (单个切片超出时独占一块).
+
+    :param partition_name: 分区名称.
+    :param slices: 增量转换的切片, None 表示整个分区.
+    :param chunk_rows: 每块的目标行数.
+    :param pool_name: 连接池名称.
+    :return: [切片列表], 可直接作为 build_data_week_sql 的 slices.
+    """
+    slice_filter, params = build_week_filter(slices)
+    with get_connection(pool_name) as connection:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT marketplace, root_category_id, year, week, COUNT(*)
+                FROM db_junglescout_amazon.tb_sales_estimates_weekly_v2
+                PARTITION ({partition_name}){slice_filter}
+                GROUP BY marketplace, root_category_id, year, week
+                ORDER BY marketplace, root_category_id, year, week
+                """,
+                params,
+            )
+            slice_counts = cursor.fetchall()
+
+    chunks, chunk, rows = [], [], 0
+    for *slice_values, row_count in slice_counts:
+        if chunk and rows + row_count > chunk_rows:
+            chunks.append(chunk)
+            chunk, rows = [], 0
+        chunk.append(tuple(slice_values))
+        rows += row_count
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def plan_product_chunks(
+    partition_name: str,
+    slices: list[tuple] | None = None,
+    chunk_rows: int = DEFAULT_TRANSFORM_CHUNK_ROWS,
+    pool_name: str = POOL_TRANSFORM,
+) -> list[tuple]:
+    """
+    在服务端按 asin 顺序累计每个 (marketplace, root_category_id) 内的行数, 每满 chunk_rows 切一个 asin 区间.
+    asin 不是主键前缀, 计数沿 idx_tb_sales_estimates_weekly_v2_asin 索引按序进行 (覆盖索引, 不回表),
+    每块的 asin 区间条件同样走该索引, 不必扫描整个 (marketplace, root_category_id) 范围.
+
+    :param partition_name: 分区名称.
+    :param slices: 增量转换的切片, 只为其中出现过的 asin 分块; None 表示整个分区.
+    :param chunk_rows: 每块的目标行数.
+    :param pool_name: 连接池名称.
+    :return: [(marketplace, root_category_id, 起始 asin, 结束 asin)], 可直接作为 build_data_product_sql 的 asin_range.
+    """
+    asin_filter, params = build_asin_filter(partition_name, slices)
+    with get_connection(pool_name) as connection:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT marketplace, root_category_id, MIN(asin), MAX(asin)
+                FROM (
+                  SELECT
+                    marketplace,
+                    root_category_id,
+                    asin,
+                    FLOOR(
+                      (SUM(row_count) OVER (PARTITION BY marketplace, root_category_id ORDER BY asin) - row_count) / %s
+                    ) AS chunk_no
+                  FROM (
+                    SELECT marketplace, root_category_id, asin, COUNT(*) AS row_count
+                    FROM db_junglescout_amazon.tb_sales_estimates_weekly_v2
+                    PARTITION ({partition_name})
+                    FORCE INDEX ({ASIN_INDEX_NAME}){asin_filter}
+                    GROUP BY marketplace, root_category_id, asin
+                  ) AS asins
+                ) AS numbered
+                GROUP BY marketplace, root_category_id, chunk_no
+                ORDER BY marketplace, root_category_id, chunk_no
+                """,
+                (max(1, chunk_rows), *params),
+            )
+            return [tuple(row) for row in cursor.fetchall()]
+
+
+def get_plan_hash(chunks: list) -> str:
+    """
+    分块计划的摘要, 计划不变时断点才有效.
+    """
+    plan = json.dumps(chunks, default=str, ensure_ascii=False)
+    return hashlib.md5(plan.encode("utf-8")).hexdigest()
+
+
+def run_chunked_transform(
+    job_name: str,
+    chunks: list,
+    build_sql: Callable[[object], tuple[str, tuple]],
+    pool_name: str = POOL_TRANSFORM,
+) -> int:
+    """
+    逐块执行转换, 每块与断点在同一事务中提交; 最后一块提交时删除断点.
+
+    :param job_name: 任务名, 断点的键, 例如 tb_data_week p0.
+    :param chunks: 分块计划, plan_week_chunks 或 plan_product_chunks 的返回值.
+    :param build_sql: 块 -> (INSERT ... SELECT 语句, 参数).
+    :param pool_name: 连接池名称.
+    :return: 受影响的行数之和.
+    """
+    plan_hash = get_plan_hash(chunks)
+    rowcount = 0
+    with get_connection(pool_name) as connection:
+        with connection.cursor() as cursor:
+            cursor.execute(SQL_SELECT_TRANSFORM_CHECKPOINT, (job_name,))
+            checkpoint = cursor.fetchone()
+            committed_chunks = 0
+            if checkpoint is not None:
+                if checkpoint[0] == plan_hash:
+                    committed_chunks = checkpoint[1]
+                else:
+                    print(f"checkpoint of {job_name=} is stale, restart from 0")
+            print(f"start chunked {job_name=} chunks={len(chunks)} {committed_chunks=}")
+
+            for chunk_index, chunk in enumerate(chunks):
+                if chunk_index < committed_chunks:
+                    continue
+                cursor.execute(*build_sql(chunk))
+                rowcount += max(cursor.rowcount, 0)
+                if chunk_index < len(chunks) - 1:
+                    cursor.execute(
+                        SQL_UPSERT_TRANSFORM_CHECKPOINT,
+                        (job_name, plan_hash, chunk_index + 1),
+                    )
+                else:
+                    cursor.execute(SQL_DELETE_TRANSFORM_CHECKPOINT, (job_name,))
+                # 每块单独提交, 事务大小与行锁持有时间以块为上限
+                connection.commit()
+    return rowcount
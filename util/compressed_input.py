@@ -0,0 +1,46 @@
+"""
+模块名称: 压缩分区文件读取
+描述: 以流的方式读取 .csv / .csv.gz / .csv.zst 分区文件, 边读边解压, 不落地临时文件.
+安装了 zstandard 时支持 .csv.zst.
+"""
+
+import gzip
+import io
+from typing import BinaryIO
+
+try:
+    import zstandard
+except ImportError:  # zstandard 为可选依赖
+    zstandard = None
+
+# 扫描器收集的分区文件后缀
+PARTITION_FILE_FORMATS = (".csv", ".csv.gz", ".csv.zst")
+COMPRESSED_SUFFIXES = (".gz", ".zst")
+READ_BUFFER_SIZE = 1024 * 1024
+
+
+def is_compressed(file_path: str) -> bool:
+    """
+    是否为压缩文件 (只能经流式输入加载, 不能直接交给 LOAD DATA).
+    """
+    return file_path.endswith(COMPRESSED_SUFFIXES)
+
+
+def open_partition_file(file_path: str) -> BinaryIO:
+    """
+    以二进制模式打开分区文件, 压缩文件返回解压后的字节流, 支持逐行迭代.
+
+    :param file_path: 文件路径.
+    :return: 二进制文件对象.
+    :raises RuntimeError: 读取 .zst 文件但没有安装 zstandard.
+    """
+    if file_path.endswith(".gz"):
+        return gzip.open(file_path, "rb")
+    if file_path.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError(f"zstandard is required to read {file_path}")
+        reader = zstandard.ZstdDecompressor().stream_reader(
+            open(file_path, "rb"), closefd=True
+        )
+        return io.BufferedReader(reader, buffer_size=READ_BUFFER_SIZE)
+    return open(file_path, "rb", buffering=READ_BUFFER_SIZE)
@@ -0,0 +1,279 @@
+"""
+模块名称: 延迟建索引的批量加载
+描述: 大批量回填时先记录并删除表的主键与二级索引, 以批量会话参数加载, 加载结束后把数据沿临时索引
+按主键区间分批 INSERT IGNORE 复制到带主键的同构表并换入 (每批单独提交, 顺带清理重复行),
+再用一条 ALTER TABLE 重建其余索引. 索引定义在删除之前写入状态文件, 中途被中断时下次启动会先按状态文件
+恢复索引. 每个阶段打印耗时.
+"""
+
+import json
+import os
+import time
+from contextlib import contextmanager
+
+from util.mysql_pool import POOL_TRANSFORM, get_connection
+from util.partition_scanner import DEFAULT_CACHE_DIR
+
+# 加载连接池的批量会话变量 (合并到 SESSION_VARIABLES 之后)
+BULK_LOAD_SESSION_VARIABLES = {
+    "unique_checks": "0",
+    "foreign_key_checks": "0",
+}
+PRIMARY_INDEX_NAME = "PRIMARY"
+# 清理重复行时临时加在原表主键字段上的非唯一索引, 按主键区间分批复制
+DEDUP_INDEX_NAME = "idx_deferred_dedup"
+DEDUP_BATCH_ROWS = 100000
+
+SQL_SELECT_INDEXES = """
+    SELECT INDEX_NAME, NON_UNIQUE, COLUMN_NAME, SUB_PART
+    FROM information_schema.STATISTICS
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+    ORDER BY INDEX_NAME, SEQ_IN_INDEX
+"""
+
+
+def _quote_identifier(name: str) -> str:
+    return f"`{name}`"
+
+
+def _index_column_sql(column: dict) -> str:
+    column_sql = _quote_identifier(column["name"])
+    if column["sub_part"]:
+        column_sql += f"({column['sub_part']})"
+    return column_sql
+
+
+class DeferredIndexLoad:
+    """
+    某个表的延迟建索引加载. 用法:
+
+        deferred_index = DeferredIndexLoad("tb_sales_estimates_weekly_v2")
+        deferred_index.recover()
+        with deferred_index.deferred():
+            ...  # 批量加载
+    """
+
+    def __init__(
+        self,
+        table_name: str,
+        state_path: str | None = None,
+        pool_name: str = POOL_TRANSFORM,
+        dedup_batch_rows: int = DEDUP_BATCH_ROWS,
+    ):
+        """
+        :param table_name: 表名.
+        :param state_path: 状态文件路径, 默认位于 DEFAULT_CACHE_DIR.
+        :param pool_name: 执行 DDL 使用的连接池.
+        :param dedup_batch_rows: 清理重复行时每批复制读取的行数.
+        """
+        self.table_name = table_name
+        self.state_path = state_path or os.path.join(
+            DEFAULT_CACHE_DIR, f"deferred_index_{table_name}.json"
+        )
+        self.pool_name = pool_name
+        self.dedup_batch_rows = dedup_batch_rows
+        self.timings: dict[str, float] = {}
+
+    @contextmanager
+    def _phase(self, name: str):
+        start_time = time.time()
+        print(f"{self.table_name} {name} started")
+        try:
+            yield
+        finally:
+            self.timings[name] = time.time() - start_time
+            print(f"{self.table_name} {name} done in {self.timings[name]:.2f} seconds")
+
+    def _load_state(self) -> dict | None:
+        if not os.path.exists(self.state_path):
+            return None
+        with open(self.state_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_state(self, state: dict) -> None:
+        os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.state_path)
+
+    def get_index_definitions(self) -> dict[str, dict]:
+        """
+        读取表当前的主键与二级索引定义.
+
+        :return: {索引名: {"unique": bool, "columns": [{"name", "sub_part"}]}}.
+        """
+        indexes: dict[str, dict] = {}
+        with get_connection(self.pool_name) as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(SQL_SELECT_INDEXES, (self.table_name,))
+                for index_name, non_unique, column_name, sub_part in cursor.fetchall():
+                    index = indexes.setdefault(
+                        index_name, {"unique": not non_unique, "columns": []}
+                    )
+                    index["columns"].append({"name": column_name, "sub_part": sub_part})
+        return indexes
+
+    def drop_indexes(self) -> None:
+        """
+        记录索引定义后删除主键与二级索引. 状态文件先于 DDL 落盘.
+        """
+        indexes = self.get_index_definitions()
+        if not indexes:
+            print(f"{self.table_name} has no indexes to defer")
+            return
+        self._save_state({"table_name": self.table_name, "indexes": indexes})
+        drop_clauses = [
+            "DROP PRIMARY KEY"
+            if index_name == PRIMARY_INDEX_NAME
+            else f"DROP INDEX {_quote_identifier(index_name)}"
+            for index_name in indexes
+        ]
+        with self._phase("drop indexes"):
+            with get_connection(self.pool_name) as connection:
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f"ALTER TABLE {self.table_name} {', '.join(drop_clauses)}"
+                    )
+
+    def _dedup_table_names(self) -> tuple[str, str]:
+        return f"{self.table_name}__dedup", f"{self.table_name}__dedup_old"
+
+    def resolve_duplicates(self, primary_key_columns: list[dict]) -> int:
+        """
+        以集合方式清理主键重复的行并恢复主键: 先在原表的主键字段上建一个非唯一索引, 再建一张带主键的
+        同构表, 沿索引按主键区间分批 INSERT IGNORE 复制 (每组只保留一行, 与 LOAD DATA LOCAL 忽略重复行的
+        语义一致), 每批单独提交, undo 日志以批为上限; 最后用 RENAME TABLE 原子换入.
+
+        :param primary_key_columns: drop_indexes 记录的主键字段 [{"name", "sub_part"}].
+        :return: 删除的行数.
+        """
+        dedup_table, old_table = self._dedup_table_names()
+        key_sql = ", ".join(_index_column_sql(column) for column in primary_key_columns)
+        key_names = [_quote_identifier(column["name"]) for column in primary_key_columns]
+        key_columns = ", ".join(key_names)
+        has_dedup_index = DEDUP_INDEX_NAME in self.get_index_definitions()
+        with self._phase("resolve duplicates"):
+            with get_connection(self.pool_name) as connection:
+                with connection.cursor() as cursor:
+                    # 上次中断在复制途中时残留的副本直接丢弃
+                    cursor.execute(f"DROP TABLE IF EXISTS {dedup_table}")
+                    cursor.execute(f"CREATE TABLE {dedup_table} LIKE {self.table_name}")
+                    cursor.execute(
+                        f"ALTER TABLE {dedup_table} "
+                        + (
+                            f"DROP INDEX {_quote_identifier(DEDUP_INDEX_NAME)}, "
+                            if has_dedup_index
+                            else ""
+                        )
+                        + f"ADD PRIMARY KEY ({key_sql})"
+                    )
+                    if not has_dedup_index:
+                        cursor.execute(
+                            f"ALTER TABLE {self.table_name} "
+                            f"ADD INDEX {_quote_identifier(DEDUP_INDEX_NAME)} ({key_sql})"
+                        )
+                    cursor.execute(f"SELECT COUNT(*) FROM {self.table_name}")
+                    total_rows = cursor.fetchone()[0]
+
+                    kept_rows = 0
+                    last_key = None
+                    while True:
+                        # 从上一批复制到的最大主键之后继续, 同一主键的剩余行本就是重复行
+                        key_filter = (
+                            f"WHERE ({key_columns}) > ({', '.join(['%s'] * len(last_key))})"
+                            if last_key
+                            else ""
+                        )
+                        cursor.execute(
+                            f"INSERT IGNORE INTO {dedup_table} "
+                            f"SELECT * FROM {self.table_name} "
+                            f"FORCE INDEX ({_quote_identifier(DEDUP_INDEX_NAME)}) "
+                            f"{key_filter} ORDER BY {key_columns} LIMIT %s",
+                            (*(last_key or ()), self.dedup_batch_rows),
+                        )
+                        copied_rows = cursor.rowcount
+                        connection.commit()
+                        if copied_rows <= 0:
+                            break
+                        kept_rows += copied_rows
+                        cursor.execute(
+                            f"SELECT {key_columns} FROM {dedup_table} "
+                            f"ORDER BY {', '.join(f'{name} DESC' for name in key_names)} LIMIT 1"
+                        )
+                        last_key = tuple(cursor.fetchone())
+
+                    cursor.execute(
+                        f"RENAME TABLE {self.table_name} TO {old_table}, "
+                        f"{dedup_table} TO {self.table_name}"
+                    )
+                    cursor.execute(f"DROP TABLE {old_table}")
+        deleted = total_rows - kept_rows
+        print(f"{self.table_name} {total_rows=} {deleted=}")
+        return deleted
+
+    def rebuild_indexes(self, indexes: dict[str, dict]) -> None:
+        """
+        用一条 ALTER TABLE 重建缺失的索引 (已存在的跳过, 可重复执行).
+
+        :param indexes: drop_indexes 记录的索引定义.
+        """
+        # 上次中断在换入之后、删除旧表之前时, 旧表仍残留
+        with get_connection(self.pool_name) as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(f"DROP TABLE IF EXISTS {self._dedup_table_names()[1]}")
+        existing = self.get_index_definitions()
+        missing = {name: index for name, index in indexes.items() if name not in existing}
+        primary_index = missing.pop(PRIMARY_INDEX_NAME, None)
+        if primary_index is not None:
+            self.resolve_duplicates(primary_index["columns"])
+        add_clauses = []
+        for index_name, index in missing.items():
+            columns_sql = ", ".join(_index_column_sql(column) for column in index["columns"])
+            if index["unique"]:
+                add_clauses.append(
+                    f"ADD UNIQUE INDEX {_quote_identifier(index_name)} ({columns_sql})"
+                )
+            else:
+                add_clauses.append(
+                    f"ADD INDEX {_quote_identifier(index_name)} ({columns_sql})"
+                )
+        if add_clauses:
+            with self._phase("rebuild indexes"):
+                with get_connection(self.pool_name) as connection:
+                    with connection.cursor() as cursor:
+                        cursor.execute(
+                            f"ALTER TABLE {self.table_name} {', '.join(add_clauses)}"
+                        )
+        os.remove(self.state_path)
+
+    def recover(self) -> bool:
+        """
+        上次运行在重建索引之前被中断时, 按状态文件恢复索引.
+
+        :return: 是否执行了恢复.
+        """
+        state = self._load_state()
+        if state is None:
+            return False
+        print(f"{self.table_name} was interrupted with indexes dropped, restoring")
+        self.rebuild_indexes(state["indexes"])
+        return True
+
+    @contextmanager
+    def deferred(self):
+        """
+        删除索引 → 加载 → 清理重复行并重建索引. 加载抛出异常时同样重建索引.
+        """
+        self.recover()
+        self.drop_indexes()
+        try:
+            with self._phase("load"):
+                yield self
+        finally:
+            state = self._load_state()
+            if state is not None:
+                self.rebuild_indexes(state["indexes"])
+            print(f"{self.table_name} deferred index timings: {self.timings}")
@@ -0,0 +1,89 @@
+"""
+模块名称: 大文件分块
+描述: 用 mmap 扫描换行符, 把大 CSV 文件切成按记录边界对齐的字节区间, 每块单独 LOAD DATA 并提交.
+切分点若落在引号内 (字段含换行), 顺延到下一个换行符. 每块的数据按记录追加分区列后流式输出.
+"""
+
+import mmap
+import os
+from typing import Iterator
+
+from util.infile_stream import iter_records_with_suffix
+
+DEFAULT_CHUNK_BYTES = 256 * 1024 * 1024
+QUOTE_COUNT_WINDOW = 8 * 1024 * 1024
+READ_BUFFER_SIZE = 1024 * 1024
+
+
+def _count_quotes(mm: mmap.mmap, start: int, end: int) -> int:
+    # 分窗口计数, 避免一次复制整块
+    count = 0
+    for offset in range(start, end, QUOTE_COUNT_WINDOW):
+        count += mm[offset : min(end, offset + QUOTE_COUNT_WINDOW)].count(b'"')
+    return count
+
+
+def find_chunk_boundaries(
+    file_path: str, chunk_bytes: int = DEFAULT_CHUNK_BYTES
+) -> list[tuple[int, int]]:
+    """
+    计算数据区 (不含头部) 的分块边界, 每块以完整记录结束.
+
+    :param file_path: 文件路径.
+    :param chunk_bytes: 每块的目标大小.
+    :return: [(起始偏移, 结束偏移)], 结束偏移不含.
+    """
+    file_size = os.path.getsize(file_path)
+    if file_size == 0:
+        return []
+    with open(file_path, "rb") as f, mmap.mmap(
+        f.fileno(), 0, access=mmap.ACCESS_READ
+    ) as mm:
+        # 头部不含换行, 首个换行之后即数据区
+        header_end = mm.find(b"\n")
+        start = file_size if header_end < 0 else header_end + 1
+        boundaries = []
+        while start < file_size:
+            end = min(file_size, start + chunk_bytes)
+            if end < file_size:
+                newline = mm.find(b"\n", end - 1)
+                quotes = _count_quotes(mm, start, newline) if newline >= 0 else 0
+                # 引号个数为奇数说明换行在字段内, 继续找下一个换行
+                while newline >= 0 and quotes % 2 == 1:
+                    next_newline = mm.find(b"\n", newline + 1)
+                    if next_newline >= 0:
+                        quotes += _count_quotes(mm, newline, next_newline)
+                    newline = next_newline
+                end = file_size if newline < 0 else newline + 1
+            boundaries.append((start, end))
+            start = end
+    return boundaries
+
+
+def _iter_range_lines(file_path: str, start: int, end: int) -> Iterator[bytes]:
+    with open(file_path, "rb", buffering=READ_BUFFER_SIZE) as f:
+        f.seek(start)
+        position = start
+        while position < end:
+            line = f.readline()
+            if not line:
+                break
+            position += len(line)
+            yield line
+
+
+def iter_chunk_records(
+    file_path: str, start: int, end: int, suffix: bytes = b""
+) -> Iterator[bytes]:
+    """
+    读取一个分块内的记录, 每条末尾追加 suffix, 可直接交给 fifo_infile.
+
+    :param file_path: 文件路径.
+    :param start: 起始偏移 (记录边界).
+    :param end: 结束偏移 (记录边界).
+    :param suffix: 追加的分区列.
+    :return: 记录迭代器.
+    """
+    return iter_records_with_suffix(
+        _iter_range_lines(file_path, start, end), suffix, skip_header=False
+    )
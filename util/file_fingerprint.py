@@ -0,0 +1,49 @@
+"""
+模块名称: 文件内容指纹
+描述: 流式计算文件内容哈希, 用于发现上游原地改写的分区文件.
+安装了 xxhash 时使用 xxh3_128, 否则回退到标准库的 blake2b.
+"""
+
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import xxhash
+except ImportError:  # xxhash 为可选依赖
+    xxhash = None
+
+HASH_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+def _new_hasher():
+    if xxhash is not None:
+        return xxhash.xxh3_128()
+    return hashlib.blake2b(digest_size=16)
+
+
+def compute_content_hash(file_path: str) -> str:
+    """
+    流式计算单个文件的内容哈希.
+
+    :param file_path: 文件路径.
+    :return: 32 位十六进制哈希.
+    """
+    hasher = _new_hasher()
+    with open(file_path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def compute_content_hashes(file_paths: list[str], max_workers: int = 4) -> dict[str, str]:
+    """
+    并行计算多个文件的内容哈希 (哈希计算和文件读取都会释放 GIL).
+
+    :param file_paths: 文件路径列表.
+    :param max_workers: 线程数.
+    :return: {文件路径: 哈希}.
+    """
+    if not file_paths:
+        return {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return dict(zip(file_paths, executor.map(compute_content_hash, file_paths)))
@@ -1,3 +1,7 @@
+import re
+from typing import Callable
+
+
 def extract_partition_items(partitioned_path: str, return_type: int = 0) -> list[str]:
     """
     从分区路径中提取分区字段或分区值。
@@ -29,3 +33,93 @@ def extract_ordered_partition_k_v_pairs_from_path(partitioned_path: str) -> list
         if "=" in segment
         for k, v in [segment.split("=")]
     ]
+
+
+# 分区谓词, 例如 "marketplace in (us, de)", "year >= 2024", "week between 10 and 20"
+_PREDICATE_IN_PATTERN = re.compile(r"^\s*(\w+)\s+in\s*\((.*)\)\s*$", re.IGNORECASE)
+_PREDICATE_BETWEEN_PATTERN = re.compile(
+    r"^\s*(\w+)\s+between\s+(\S+)\s+and\s+(\S+)\s*$", re.IGNORECASE
+)
+_PREDICATE_COMPARE_PATTERN = re.compile(r"^\s*(\w+)\s*(>=|<=|!=|=|>|<)\s*(\S+)\s*$")
+
+
+def _comparable_partition_value(value: str) -> tuple:
+    """
+    将分区值转换为可比较的键: 数值按数值比较 (week=09 与 9 相等), 否则按字符串比较.
+    """
+    value = value.strip().strip("'\"")
+    try:
+        return (0, float(value))
+    except ValueError:
+        return (1, value)
+
+
+def parse_partition_predicate(expression: str) -> tuple[str, Callable[[str], bool]]:
+    """
+    解析单个分区谓词表达式。
+
+    :param expression: 谓词表达式, 支持 in / between / >= / <= / > / < / = / !=。
+    :return: (分区字段名, 判断分区值是否满足谓词的函数)。
+    :raises ValueError: 当表达式无法解析时抛出。
+    """
+    if match := _PREDICATE_IN_PATTERN.match(expression):
+        key, values = match.group(1), match.group(2)
+        allowed = {_comparable_partition_value(v) for v in values.split(",") if v.strip()}
+        return key, lambda value: _comparable_partition_value(value) in allowed
+
+    if match := _PREDICATE_BETWEEN_PATTERN.match(expression):
+        key = match.group(1)
+        low = _comparable_partition_value(match.group(2))
+        high = _comparable_partition_value(match.group(3))
+        return key, lambda value: low <= _comparable_partition_value(value) <= high
+
+    if match := _PREDICATE_COMPARE_PATTERN.match(expression):
+        key, operator, target = match.group(1), match.group(2), match.group(3)
+        target_value = _comparable_partition_value(target)
+        compare = {
+            ">=": lambda a, b: a >= b,
+            "<=": lambda a, b: a <= b,
+            ">": lambda a, b: a > b,
+            "<": lambda a, b: a < b,
+            "=": lambda a, b: a == b,
+            "!=": lambda a, b: a != b,
+        }[operator]
+        return key, lambda value: compare(_comparable_partition_value(value), target_value)
+
+    raise ValueError(f"Invalid partition predicate: {expression!r}")
+
+
+def parse_partition_predicates(
+    expressions: list[str] | None,
+) -> dict[str, list[Callable[[str], bool]]]:
+    """
+    解析多个分区谓词, 同一字段的多个谓词之间为 AND 关系。
+
+    :param expressions: 谓词表达式列表。
+    :return: {分区字段名: [判断函数, ...]}。
+    """
+    predicates: dict[str, list[Callable[[str], bool]]] = {}
+    for expression in expressions or []:
+        key, predicate = parse_partition_predicate(expression)
+        predicates.setdefault(key, []).append(predicate)
+    return predicates
+
+
+def partition_path_matches(
+    partitioned_path: str, predicates: dict[str, list[Callable[[str], bool]]]
+) -> bool:
+    """
+    判断分区路径 (或单个 key=value 目录名) 是否满足全部分区谓词。
+    路径中未出现的分区字段不参与判断。
+
+    :param partitioned_path: 包含分区信息的路径字符串。
+    :param predicates: parse_partition_predicates 的返回值。
+    :return: 是否满足。
+    """
+    if not predicates:
+        return True
+    for item in extract_ordered_partition_k_v_pairs_from_path(partitioned_path):
+        for key, value in item.items():
+            if not all(predicate(value) for predicate in predicates.get(key, ())):
+                return False
+    return True
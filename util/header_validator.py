@@ -0,0 +1,154 @@
+"""
+模块名称: CSV 头部快速校验
+描述: 只读取文件首行的原始字节解析 CSV 头部, 避免每个文件都构造一次 pandas 解析器.
+头部按 (path, size, mtime) 缓存到磁盘, 并按头部签名分组, 期望字段与实际字段的差异
+对每种不同的签名只计算一次.
+"""
+
+import csv
+import json
+import os
+import threading
+
+from model import base_model
+from util.compressed_input import open_partition_file
+from util.get_partition_info import extract_partition_items
+from util.load_plan import get_load_plan
+from util.partition_scanner import DEFAULT_CACHE_DIR
+
+HEADER_CACHE_VERSION = 1
+# 首行读取上限, 防止异常文件没有换行符时读入整个文件
+MAX_HEADER_BYTES = 1024 * 1024
+
+
+def read_csv_header(file_path: str) -> list[str]:
+    """
+    读取 CSV 文件首行并解析为字段列表, 压缩文件只解压到首行为止.
+
+    :param file_path: 文件路径.
+    :return: 头部字段列表.
+    """
+    with open_partition_file(file_path) as f:
+        first_line = f.readline(MAX_HEADER_BYTES)
+    text = first_line.decode("utf-8-sig").rstrip("\r\n")
+    return next(csv.reader([text]), [])
+
+
+class CsvHeaderValidator:
+    """
+    单个表的 CSV 头部校验器, 线程安全, 可供流水线的多个校验线程共享.
+    """
+
+    def __init__(
+        self,
+        table_path: str,
+        class_obj: base_model.BaseModel,
+        cache_path: str | None = None,
+    ):
+        """
+        :param table_path: 表的绝对路径.
+        :param class_obj: 具体的 ORM 类.
+        :param cache_path: 头部缓存文件路径, 默认位于 DEFAULT_CACHE_DIR.
+        """
+        self.table_path = table_path
+        self.class_obj = class_obj
+        self.cache_path = cache_path or os.path.join(
+            DEFAULT_CACHE_DIR, f"header_cache_{class_obj.__tablename__}.json"
+        )
+        self._lock = threading.Lock()
+        # {path: (size, mtime_ns, headers)}
+        self._header_cache: dict[str, tuple[int, int, tuple[str, ...]]] = {}
+        # {(headers, partition_fields): (missing_headers, extra_headers)}
+        self._signature_diffs: dict[tuple, tuple[set[str], set[str]]] = {}
+        self._load_cache()
+
+    def _load_cache(self) -> None:
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return
+        if cache.get("version") != HEADER_CACHE_VERSION:
+            return
+        signatures = [tuple(headers) for headers in cache["signatures"]]
+        self._header_cache = {
+            path: (size, mtime_ns, signatures[signature_index])
+            for path, (size, mtime_ns, signature_index) in cache["files"].items()
+        }
+
+    def save_cache(self) -> None:
+        """
+        将头部缓存写回磁盘, 相同的头部只保存一份.
+        """
+        with self._lock:
+            signature_index: dict[tuple[str, ...], int] = {}
+            files = {}
+            for path, (size, mtime_ns, headers) in self._header_cache.items():
+                index = signature_index.setdefault(headers, len(signature_index))
+                files[path] = [size, mtime_ns, index]
+            cache = {
+                "version": HEADER_CACHE_VERSION,
+                "signatures": [list(headers) for headers in signature_index],
+                "files": files,
+            }
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        tmp_path = f"{self.cache_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(cache, f, separators=(",", ":"))
+        os.replace(tmp_path, self.cache_path)
+
+    def _cached_headers(self, file_path: str, st: os.stat_result):
+        cached = self._header_cache.get(file_path)
+        if cached is not None and cached[:2] == (st.st_size, st.st_mtime_ns):
+            return cached[2]
+        return None
+
+    def _diff_for_signature(
+        self, headers: tuple[str, ...], partition_fields: tuple[str, ...]
+    ) -> tuple[set[str], set[str]]:
+        signature = (headers, partition_fields)
+        diff = self._signature_diffs.get(signature)
+        if diff is None:
+            expected_csv_headers = get_load_plan(
+                self.class_obj, partition_fields
+            ).expected_csv_headers
+            # 对比缺失和多余的字段
+            diff = (
+                set(expected_csv_headers) - set(headers),
+                set(headers) - set(expected_csv_headers),
+            )
+            with self._lock:
+                self._signature_diffs[signature] = diff
+        return diff
+
+    def _check(self, file_path: str, headers: tuple[str, ...]) -> bool:
+        partition_fields = tuple(
+            extract_partition_items(
+                partitioned_path=os.path.relpath(file_path, self.table_path),
+                return_type=0,
+            )
+        )
+        missing_headers, extra_headers = self._diff_for_signature(
+            headers, partition_fields
+        )
+        if missing_headers or extra_headers:
+            print(
+                f"header is error {file_path=} {extra_headers=} {missing_headers=} {headers=}"
+            )
+            return False
+        return True
+
+    def validate_file(self, file_path: str) -> bool:
+        """
+        校验单个文件的头部, 优先使用缓存.
+
+        :param file_path: 文件路径.
+        :return: 头部格式是否正确.
+        """
+        st = os.stat(file_path)
+        headers = self._cached_headers(file_path, st)
+        if headers is None:
+            headers = tuple(read_csv_header(file_path))
+            with self._lock:
+                self._header_cache[file_path] = (st.st_size, st.st_mtime_ns, headers)
+        return self._check(file_path, headers)
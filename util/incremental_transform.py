@@ -0,0 +1,284 @@
+"""
+模块名称: 增量转换
+描述: 从 tb_loaded_records 读取自某个转换任务上次成功以来加载过的 (marketplace, root_category_id, year, week)
+切片, 转换阶段只处理这些切片, 每日增量的转换开销与新数据量成正比, 而不是与全部历史成正比.
+每个任务的水位记录在 tb_transform_watermarks, 只在任务成功后推进; 失败或中断的任务下次运行时
+仍会拿到这些切片.
+"""
+
+from datetime import datetime
+
+from util.load_plan import LEDGER_PARTITION_DEFAULTS, LoadPlan
+from util.mysql_pool import POOL_LOAD, get_connection
+
+SLICE_FIELDS = tuple(LEDGER_PARTITION_DEFAULTS)
+
+SQL_SELECT_TRANSFORM_WATERMARKS = """
+    SELECT job_name, loaded_until FROM db_junglescout_amazon.tb_transform_watermarks
+"""
+
+SQL_UPSERT_TRANSFORM_WATERMARK = """
+    INSERT INTO db_junglescout_amazon.tb_transform_watermarks (job_name, loaded_until)
+    VALUES (%s, %s)
+    ON DUPLICATE KEY UPDATE loaded_until = VALUES(loaded_until);
+"""
+
+
+def get_server_time(pool_name: str = POOL_LOAD) -> datetime:
+    """
+    读取服务端当前时间, 作为本次运行的起点 (与 created_datetime 使用同一时钟).
+    """
+    with get_connection(pool_name) as connection:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT NOW()")
+            return cursor.fetchone()[0]
+
+
+def get_loaded_slices(
+    table_name: str, since: datetime, pool_name: str = POOL_LOAD
+) -> list[tuple] | None:
+    """
+    读取 since 之后加载过文件的切片.
+
+    :param table_name: 原始数据表名.
+    :param since: 转换任务的水位.
+    :param pool_name: 连接池名称.
+    :return: [(marketplace, root_category_id, year, week)];
+        若有文件的分区布局缺少某个切片字段 (台账中为默认值), 无法按切片限定, 返回 None.
+    """
+    with get_connection(pool_name) as connection:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT DISTINCT {", ".join(SLICE_FIELDS)}
+                FROM db_junglescout_amazon.tb_loaded_records
+                WHERE table_name = %s AND created_datetime >= %s
+                """,
+                (table_name, since),
+            )
+            slices = [tuple(row) for row in cursor.fetchall()]
+    defaults = tuple(str(value) for value in LEDGER_PARTITION_DEFAULTS.values())
+    for slice_values in slices:
+        if any(
+            str(value) == default for value, default in zip(slice_values, defaults)
+        ):
+            print(f"cannot restrict transform to slices, {slice_values=}")
+            return None
+    print(f"{len(slices)} slices of {table_name} loaded since {since}")
+    return slices
+
+
+def get_watermarks(pool_name: str = POOL_LOAD) -> dict[str, datetime]:
+    """
+    读取全部转换任务的水位.
+
+    :param pool_name: 连接池名称.
+    :return: {任务名: 水位}.
+    """
+    with get_connection(pool_name) as connection:
+        with connection.cursor() as cursor:
+            cursor.execute(SQL_SELECT_TRANSFORM_WATERMARKS)
+            return dict(cursor.fetchall())
+
+
+def get_job_slices(
+    table_name: str, job_names: list[str], pool_name: str = POOL_LOAD
+) -> dict[str, list[tuple] | None]:
+    """
+    每个转换任务需要处理的切片: 自该任务的水位以来加载过的切片. 水位相同的任务共用一次查询.
+
+    :param table_name: 原始数据表名.
+    :param job_names: 转换任务名.
+    :param pool_name: 连接池名称.
+    :return: {任务名: 切片}; 从未成功过 (没有水位) 或无法按切片限定的任务为 None, 即整个分区.
+    """
+    watermarks = get_watermarks(pool_name)
+    slices_since: dict[datetime, list[tuple] | None] = {}
+    job_slices = {}
+    for job_name in job_names:
+        since = watermarks.get(job_name)
+        if since is None:
+            job_slices[job_name] = None
+            continue
+        if since not in slices_since:
+            slices_since[since] = get_loaded_slices(table_name, since, pool_name)
+        job_slices[job_name] = slices_since[since]
+    return job_slices
+
+
+def get_exploded_slices(
+    table_name: str,
+    job_names: list[str],
+    exploded_since: datetime,
+    pool_name: str = POOL_LOAD,
+) -> dict[str, list[tuple]]:
+    """
+    每个 tb_data_week 转换任务可以跳过的切片: exploded_since 之后加载时已拆分卖家的切片中,
+    更早加载的文件都已被该任务转换过 (都在任务水位之前加载) 的切片. 切片中还有水位之后、
+    exploded_since 之前加载的文件时, 说明该任务上次转换失败或尚未运行, 仍需转换.
+
+    :param table_name: 原始数据表名.
+    :param job_names: tb_data_week 的转换任务名.
+    :param exploded_since: 本次加载的起点, 此后加载的文件在加载时拆分卖家.
+    :param pool_name: 连接池名称.
+    :return: {任务名: 可跳过的切片}.
+    """
+    exploded = get_loaded_slices(table_name, exploded_since, pool_name)
+    if not exploded:
+        return {job_name: [] for job_name in job_names}
+    watermarks = get_watermarks(pool_name)
+    slice_condition, slice_params = build_slice_condition(exploded)
+    pending_since: dict[datetime | None, set[tuple]] = {}
+    job_exploded = {}
+    for job_name in job_names:
+        since = watermarks.get(job_name)
+        if since not in pending_since:
+            # 没有水位时, 此前加载过文件的切片都不能跳过
+            with get_connection(pool_name) as connection:
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f"""
+                        SELECT DISTINCT {", ".join(SLICE_FIELDS)}
+                        FROM db_junglescout_amazon.tb_loaded_records
+                        WHERE table_name = %s AND created_datetime < %s
+                            {"AND created_datetime >= %s" if since is not None else ""}
+                            AND {slice_condition}
+                        """,
+                        (
+                            table_name,
+                            exploded_since,
+                            *((since,) if since is not None else ()),
+                            *slice_params,
+                        ),
+                    )
+                    pending_since[since] = {tuple(row) for row in cursor.fetchall()}
+        job_exploded[job_name] = [
+            slice_values
+            for slice_values in exploded
+            if slice_values not in pending_since[since]
+        ]
+    return job_exploded
+
+
+def advance_watermarks(
+    job_names: list[str], loaded_until: datetime, pool_name: str = POOL_LOAD
+) -> None:
+    """
+    推进成功任务的水位.
+
+    :param job_names: 成功的转换任务名.
+    :param loaded_until: 读取切片之前取得的服务端时间.
+    :param pool_name: 连接池名称.
+    """
+    if not job_names:
+        return
+    with get_connection(pool_name) as connection:
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                SQL_UPSERT_TRANSFORM_WATERMARK,
+                [(job_name, loaded_until) for job_name in job_names],
+            )
+        connection.commit()
+
+
+def get_partition_slices(
+    partition_name: str, pool_name: str = POOL_LOAD
+) -> list[tuple]:
+    """
+    读取原始数据一个分区中的全部切片.
+
+    :param partition_name: 分区名称.
+    :param pool_name: 连接池名称.
+    :return: [(marketplace, root_category_id, year, week)].
+    """
+    with get_connection(pool_name) as connection:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT DISTINCT {", ".join(SLICE_FIELDS)}
+                FROM db_junglescout_amazon.tb_sales_estimates_weekly_v2
+                PARTITION ({partition_name})
+                """
+            )
+            return [tuple(row) for row in cursor.fetchall()]
+
+
+def exclude_slices(
+    partition_name: str, slices: list[tuple] | None, excluded: list[tuple]
+) -> list[tuple] | None:
+    """
+    从转换范围中去掉已处理过的切片 (例如加载时已拆分卖家写入 tb_data_week 的切片).
+
+    :param partition_name: 分区名称.
+    :param slices: 转换范围, None 表示整个分区.
+    :param excluded: 需要去掉的切片.
+    :return: 剩余的切片; 没有需要去掉的切片时原样返回.
+    """
+    if not excluded:
+        return slices
+    if slices is None:
+        slices = get_partition_slices(partition_name)
+    excluded_set = set(excluded)
+    return [slice_values for slice_values in slices if slice_values not in excluded_set]
+
+
+def get_derived_deletes(
+    load_plan: LoadPlan, partition_values: tuple[str, ...]
+) -> list[tuple[str, tuple]]:
+    """
+    原始数据的一个分区被删除重载时, 需要一并删除的 tb_data_week 行 (转换阶段按切片重新生成).
+    只有分区正好对应一个切片时才能精确删除; tb_data_product 按 asin 汇总全部历史, 由转换阶段覆盖.
+
+    :param load_plan: 该分区的加载计划.
+    :param partition_values: 分区值.
+    :return: [(DELETE 语句, 参数)], 不涉及派生表时为空.
+    """
+    if load_plan.table_name != "tb_sales_estimates_weekly_v2" or set(
+        load_plan.partition_fields
+    ) != set(SLICE_FIELDS):
+        return []
+    return [
+        (
+            f"""
+            DELETE FROM db_junglescout_amazon.tb_data_week
+            WHERE {" AND ".join(f"{field} = %s" for field in SLICE_FIELDS)}
+            """,
+            load_plan.ledger_key(partition_values),
+        )
+    ]
+
+
+def build_slice_condition(slices: list[tuple]) -> tuple[str, tuple]:
+    """
+    生成按切片过滤的条件, 走 (marketplace, root_category_id, year, week) 主键前缀.
+
+    :param slices: get_loaded_slices 的返回值, 不能为空.
+    :return: (条件, 参数).
+    """
+    placeholders = "(" + ", ".join(["%s"] * len(SLICE_FIELDS)) + ")"
+    condition = (
+        f"({', '.join(SLICE_FIELDS)}) IN ({', '.join([placeholders] * len(slices))})"
+    )
+    return condition, tuple(value for slice_values in slices for value in slice_values)
+
+
+def build_asin_filter(
+    partition_name: str, slices: list[tuple] | None
+) -> tuple[str, tuple]:
+    """
+    tb_data_product 的挑选跨越全部历史周, 增量时只重算在新切片中出现过的 asin (仍读取其全部历史行).
+
+    :param partition_name: 分区名称.
+    :param slices: 切片, None 表示不过滤.
+    :return: (追加在 FROM ... PARTITION (pN) 之后的 WHERE 子句, 参数).
+    """
+    if slices is None:
+        return "", ()
+    slice_condition, params = build_slice_condition(slices)
+    asin_filter = f"""
+    WHERE (marketplace, root_category_id, asin) IN (
+      SELECT marketplace, root_category_id, asin
+      FROM db_junglescout_amazon.tb_sales_estimates_weekly_v2 PARTITION ({partition_name})
+      WHERE {slice_condition}
+    )"""
+    return asin_filter, params
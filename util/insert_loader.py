@@ -0,0 +1,191 @@
+"""
+模块名称: 批量 INSERT 加载引擎
+描述: 目标实例禁止 local_infile 时替代 LOAD DATA 的加载引擎. pandas 按块向量化解析 CSV
+(或 pyarrow 按行组读取 Parquet), 按 max_allowed_packet 自动切分为多行 INSERT;
+解析在后台线程进行, 与发送语句重叠. 重复主键的行被忽略, CSV 中的 \\N 写入 NULL,
+与 LOAD DATA LOCAL 的语义一致.
+"""
+
+import queue
+import threading
+from typing import Iterator
+
+import mysql.connector
+import pandas as pd
+
+from util.compressed_input import open_partition_file
+from util.load_plan import LoadPlan
+from util.mysql_pool import POOL_LOAD, get_connection
+from util.parquet_input import is_parquet, pq
+
+LOAD_ENGINE_LOAD_DATA = "load_data"
+LOAD_ENGINE_INSERT = "insert"
+LOAD_ENGINE_AUTO = "auto"
+DEFAULT_CHUNK_ROWS = 50000
+# 按字符数估算语句大小, 为多字节字符和转义留出余量
+PACKET_FILL_RATIO = 0.5
+# LOAD DATA 把 \N 读作 NULL
+CSV_NULL_VALUE = "\\N"
+# 每个值在 VALUES 中的额外开销: 引号和逗号
+VALUE_OVERHEAD_BYTES = 3
+PARSE_QUEUE_SIZE = 4
+_SENTINEL = object()
+
+
+def detect_load_engine(pool_name: str = POOL_LOAD) -> str:
+    """
+    检测目标实例是否允许 LOAD DATA LOCAL INFILE, 不允许时使用 INSERT 引擎.
+
+    :param pool_name: 连接池名称.
+    :return: LOAD_ENGINE_LOAD_DATA 或 LOAD_ENGINE_INSERT.
+    """
+    with get_connection(pool_name) as connection:
+        with connection.cursor() as cursor:
+            try:
+                cursor.execute("SET GLOBAL local_infile = 1")
+            except mysql.connector.Error as ex:
+                print(f"cannot enable local_infile: {ex}")
+            cursor.execute("SELECT @@GLOBAL.local_infile")
+            local_infile = cursor.fetchone()[0]
+    engine = LOAD_ENGINE_LOAD_DATA if int(local_infile) else LOAD_ENGINE_INSERT
+    print(f"load engine: {engine}")
+    return engine
+
+
+def get_max_allowed_packet(cursor) -> int:
+    cursor.execute("SELECT @@max_allowed_packet")
+    return int(cursor.fetchone()[0])
+
+
+def build_insert_sql(load_plan: LoadPlan, row_count: int) -> str:
+    """
+    多行 INSERT IGNORE 语句, 列顺序为 stream_columns (CSV 列 + 分区列).
+    """
+    column_count = len(load_plan.expected_csv_headers) + len(load_plan.partition_fields)
+    placeholders = "(" + ", ".join(["%s"] * column_count) + ")"
+    return (
+        f"INSERT IGNORE INTO {load_plan.table_name} ({load_plan.stream_columns}) VALUES "
+        + ", ".join([placeholders] * row_count)
+    )
+
+
+def iter_file_frames(
+    file_path: str, columns: list[str], chunk_rows: int = DEFAULT_CHUNK_ROWS
+) -> Iterator[pd.DataFrame]:
+    """
+    按块读取分区文件的指定列: CSV 全部为字符串 (\\N 为 None), Parquet 为原生类型 (null 为 None).
+    """
+    if is_parquet(file_path):
+        parquet_file = pq.ParquetFile(file_path)
+        for batch in parquet_file.iter_batches(batch_size=chunk_rows, columns=columns):
+            frame = batch.to_pandas().astype(object)
+            yield frame.where(frame.notna(), None)
+        return
+    with open_partition_file(file_path) as f:
+        # 全部按字符串读取, 类型转换交给 MySQL, 与 LOAD DATA 的行为一致
+        for frame in pd.read_csv(
+            f,
+            dtype=str,
+            keep_default_na=False,
+            na_filter=False,
+            usecols=columns,
+            chunksize=chunk_rows,
+        ):
+            frame = frame[columns]
+            yield frame.where(frame != CSV_NULL_VALUE, None)
+
+
+def iter_insert_batches(
+    file_path: str,
+    load_plan: LoadPlan,
+    partition_values: tuple[str, ...],
+    max_batch_bytes: int,
+    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+) -> Iterator[list[tuple]]:
+    """
+    按块解析文件, 按估算的语句大小切分为若干批行.
+
+    :param file_path: 文件路径.
+    :param load_plan: 加载计划.
+    :param partition_values: 追加在每行末尾的分区值.
+    :param max_batch_bytes: 每批行的估算大小上限.
+    :param chunk_rows: pandas 每次解析的行数.
+    :return: 行元组列表的迭代器.
+    """
+    columns = list(load_plan.expected_csv_headers)
+    for frame in iter_file_frames(file_path, columns, chunk_rows):
+        if frame.empty:
+            continue
+        # 向量化估算每行大小, 按累计大小分批
+        row_bytes = (
+            frame.apply(lambda column: column.astype(str).str.len()).sum(axis=1)
+            + VALUE_OVERHEAD_BYTES * (len(columns) + len(partition_values))
+            + sum(len(str(value)) for value in partition_values)
+        )
+        batch_ids = row_bytes.cumsum() // max_batch_bytes
+        frame = frame.assign(**dict(zip(load_plan.partition_fields, partition_values)))
+        rows = list(frame.itertuples(index=False, name=None))
+        batch_start = 0
+        for batch_size in batch_ids.groupby(batch_ids.values, sort=False).size():
+            yield rows[batch_start : batch_start + batch_size]
+            batch_start += batch_size
+
+
+def insert_files(
+    cursor,
+    load_plan: LoadPlan,
+    file_paths: list[str],
+    partition_values: tuple[str, ...],
+    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+) -> int:
+    """
+    以多行 INSERT 加载同一分区的若干文件, 解析线程与发送线程并行. 调用方负责提交事务.
+
+    :param cursor: 游标.
+    :param load_plan: 加载计划.
+    :param file_paths: 文件列表.
+    :param partition_values: 分区值.
+    :param chunk_rows: pandas 每次解析的行数.
+    :return: 发送的行数.
+    """
+    max_batch_bytes = int(get_max_allowed_packet(cursor) * PACKET_FILL_RATIO)
+    batches: queue.Queue = queue.Queue(maxsize=PARSE_QUEUE_SIZE)
+    errors: list[BaseException] = []
+    cancelled = threading.Event()
+
+    def parse() -> None:
+        try:
+            for file_path in file_paths:
+                for batch in iter_insert_batches(
+                    file_path, load_plan, partition_values, max_batch_bytes, chunk_rows
+                ):
+                    if cancelled.is_set():
+                        return
+                    batches.put(batch)
+        except BaseException as ex:
+            errors.append(ex)
+        finally:
+            batches.put(_SENTINEL)
+
+    parser = threading.Thread(target=parse, name="insert-parser", daemon=True)
+    parser.start()
+    sent_rows = 0
+    try:
+        while (batch := batches.get()) is not _SENTINEL:
+            cursor.execute(
+                build_insert_sql(load_plan, len(batch)),
+                [value for row in batch for value in row],
+            )
+            sent_rows += len(batch)
+    finally:
+        cancelled.set()
+        # 发送失败时清空队列, 让解析线程退出
+        while parser.is_alive():
+            try:
+                batches.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        parser.join()
+    if errors:
+        raise errors[0]
+    return sent_rows
@@ -0,0 +1,212 @@
+"""
+模块名称: 预编译加载计划
+描述: 每个 (ORM 类, 分区字段布局) 只计算一次列清单、SET 子句、LOAD DATA 语句和加载记录的键,
+校验器与加载器共享同一份计划, 单个文件的开销只剩参数绑定.
+"""
+
+from functools import lru_cache
+
+from model import base_model
+from util import sqlalchemy_orm_util
+from util.get_partition_info import extract_ordered_partition_k_v_pairs_from_path
+from util.infile_stream import quote_csv_value
+
+# tb_loaded_records 中记录分区信息的字段及其默认值
+LEDGER_PARTITION_DEFAULTS = {
+    "marketplace": 0,
+    "root_category_id": -1,
+    "year": 0,
+    "week": 0,
+}
+
+SQL_INSERT_LOADED_RECORD = """
+    INSERT INTO db_junglescout_amazon.tb_loaded_records (table_name, marketplace, root_category_id, year, week, file_name, relative_path, file_size, file_mtime_ns, content_hash)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        table_name =  VALUES(table_name),
+        marketplace =  VALUES(marketplace),
+        root_category_id = VALUES(root_category_id),
+        year = VALUES(year),
+        week = VALUES(week),
+        file_name = VALUES(file_name),
+        relative_path = VALUES(relative_path),
+        file_size = VALUES(file_size),
+        file_mtime_ns = VALUES(file_mtime_ns),
+        content_hash = VALUES(content_hash);
+"""
+
+# 服务端台账中文件的指纹, 用于发现其他进程已加载的文件
+SQL_SELECT_LOADED_FINGERPRINT = """
+    SELECT file_size, file_mtime_ns, content_hash
+    FROM db_junglescout_amazon.tb_loaded_records
+    WHERE table_name = %s AND relative_path = %s;
+"""
+
+# 大文件每提交一块, 在同一事务中推进断点
+SQL_UPSERT_CHUNK_CHECKPOINT = """
+    INSERT INTO db_junglescout_amazon.tb_loaded_chunks (table_name, relative_path, file_size, file_mtime_ns, committed_offset)
+    VALUES (%s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        file_size = VALUES(file_size),
+        file_mtime_ns = VALUES(file_mtime_ns),
+        committed_offset = VALUES(committed_offset);
+"""
+
+SQL_DELETE_CHUNK_CHECKPOINT = """
+    DELETE FROM db_junglescout_amazon.tb_loaded_chunks
+    WHERE table_name = %s AND relative_path = %s;
+"""
+
+
+class LoadPlan:
+    """
+    某个表在某种分区字段布局下的加载计划.
+    """
+
+    def __init__(
+        self, class_obj: base_model.BaseModel, partition_fields: tuple[str, ...]
+    ):
+        """
+        :param class_obj: 具体的 ORM 类.
+        :param partition_fields: 路径中按顺序出现的分区字段名.
+        """
+        self.class_obj = class_obj
+        self.table_name = class_obj.__tablename__
+        self.partition_fields = partition_fields
+
+        base_model_header = sqlalchemy_orm_util.get_abstract_class_fields(
+            base_model.BaseModel
+        )
+        self.class_headers: tuple[str, ...] = tuple(
+            sqlalchemy_orm_util.get_class_fields(class_obj)
+        )
+        # 从类字段定义中去除分区字段和基类字段后, 即 CSV 文件应有的头部
+        self.expected_csv_headers: tuple[str, ...] = tuple(
+            header
+            for header in self.class_headers
+            if header not in partition_fields and header not in base_model_header
+        )
+        self.columns = ", ".join(self.expected_csv_headers)
+        # 分区值通过参数绑定, 不再拼接进 SQL
+        self.set_clause = ", ".join(f"{field} = %s" for field in partition_fields)
+        self.sql_load_data = f"""
+            LOAD DATA LOCAL INFILE %s
+            INTO TABLE {self.table_name}
+            FIELDS TERMINATED BY ','
+            ENCLOSED BY '\"'
+            LINES TERMINATED BY '\\n'
+            IGNORE 1 ROWS
+            ({self.columns})
+            {f"SET {self.set_clause}" if self.set_clause else ""}
+        """
+        # 流式输入 (合并多个文件、解压等) 已去掉头部, 分区字段作为真实的列追加在每行末尾
+        self.stream_columns = ", ".join(
+            (*self.expected_csv_headers, *self.partition_fields)
+        )
+        self.sql_load_data_stream = self.load_data_stream_sql(self.table_name)
+
+    def load_data_stream_sql(self, table_name: str) -> str:
+        """
+        流式输入的 LOAD DATA 语句, 目标表可以是正式表或与其同列的暂存表.
+
+        :param table_name: 目标表名.
+        :return: 参数为管道路径的 LOAD DATA 语句.
+        """
+        return f"""
+            LOAD DATA LOCAL INFILE %s
+            INTO TABLE {table_name}
+            FIELDS TERMINATED BY ','
+            ENCLOSED BY '\"'
+            LINES TERMINATED BY '\\n'
+            ({self.stream_columns})
+        """
+
+    def load_params(self, file_path: str, partition_values: tuple[str, ...]) -> tuple:
+        """
+        绑定单个文件的 LOAD DATA 参数.
+
+        :param file_path: 待加载的文件路径.
+        :param partition_values: 与 partition_fields 对应的分区值.
+        :return: cursor.execute 的参数.
+        """
+        return (file_path, *partition_values)
+
+    def partition_suffix(self, partition_values: tuple[str, ...]) -> bytes:
+        """
+        流式输入中追加在每行末尾的分区列, 例如 b',"us","2024"'.
+        """
+        return b"".join(b"," + quote_csv_value(value) for value in partition_values)
+
+    def ledger_key(self, partition_values: tuple[str, ...]) -> tuple:
+        """
+        提取 tb_loaded_records 中的分区字段 (marketplace, root_category_id, year, week).
+
+        :param partition_values: 与 partition_fields 对应的分区值.
+        :return: 分区字段元组, 路径中没有的字段取默认值.
+        """
+        partition_kv = dict(zip(self.partition_fields, partition_values))
+        return tuple(
+            partition_kv.get(field, default)
+            for field, default in LEDGER_PARTITION_DEFAULTS.items()
+        )
+
+    def ledger_params(
+        self,
+        partition_values: tuple[str, ...],
+        file_name: str,
+        relative_path: str,
+        fingerprint: tuple = (None, None, None),
+    ) -> tuple:
+        """
+        绑定 SQL_INSERT_LOADED_RECORD 的参数.
+
+        :param fingerprint: (file_size, file_mtime_ns, content_hash).
+        """
+        return (
+            self.table_name,
+            *self.ledger_key(partition_values),
+            file_name,
+            relative_path,
+            *fingerprint,
+        )
+
+    def delete_partition_sql(self) -> str:
+        """
+        删除某个分区 (即 SET 子句中的分区字段取值) 全部数据的语句, 参数为 partition_values.
+
+        :raises ValueError: 没有分区字段时抛出, 避免误删整表.
+        """
+        if not self.partition_fields:
+            raise ValueError(f"{self.table_name} has no partition fields to delete by")
+        where_clause = " AND ".join(f"{field} = %s" for field in self.partition_fields)
+        return f"DELETE FROM {self.table_name} WHERE {where_clause}"
+
+
+@lru_cache(maxsize=None)
+def get_load_plan(
+    class_obj: base_model.BaseModel, partition_fields: tuple[str, ...]
+) -> LoadPlan:
+    """
+    获取 (ORM 类, 分区字段布局) 对应的加载计划, 同一布局只构建一次.
+
+    :param class_obj: 具体的 ORM 类.
+    :param partition_fields: 路径中按顺序出现的分区字段名.
+    :return: 加载计划.
+    """
+    return LoadPlan(class_obj, partition_fields)
+
+
+def get_file_load_plan(
+    class_obj: base_model.BaseModel, relative_path: str
+) -> tuple[LoadPlan, tuple[str, ...]]:
+    """
+    根据文件相对于表目录的路径获取加载计划与分区值.
+
+    :param class_obj: 具体的 ORM 类.
+    :param relative_path: 文件相对于表目录的路径.
+    :return: (加载计划, 分区值元组).
+    """
+    partition_kv = extract_ordered_partition_k_v_pairs_from_path(relative_path)
+    partition_fields = tuple(k for item in partition_kv for k in item)
+    partition_values = tuple(v for item in partition_kv for v in item.values())
+    return get_load_plan(class_obj, partition_fields), partition_values
@@ -0,0 +1,476 @@
+"""
+模块名称: 已加载文件台账
+描述: 以文件相对于表目录的完整分区路径为键记录已加载文件. 服务端 tb_loaded_records
+以 (table_name, relative_path) 为主键并支持按分区前缀过滤, 本地维护一个 SQLite 镜像,
+按 created_datetime 水位增量同步, "哪些文件还没加载" 变为每个文件一次主键查找.
+台账行被删除时 tb_loaded_records_purges 中的计数递增, 同步时计数变化或服务端最大 created_datetime
+回退到镜像水位之前都说明镜像过期, 重建镜像.
+未记录 relative_path 的历史行在迁移主键时以 legacy_ledger_key 补齐.
+"""
+
+import os
+import sqlite3
+import threading
+
+from model import base_model
+from util.load_plan import LEDGER_PARTITION_DEFAULTS, LoadPlan, get_file_load_plan
+from util.mysql_pool import POOL_LOAD, get_connection
+from util.partition_scanner import DEFAULT_CACHE_DIR
+
+DEFAULT_MIRROR_PATH = os.path.join(DEFAULT_CACHE_DIR, "loaded_ledger.sqlite3")
+# 增量同步时回看的秒数, 覆盖水位附近尚未提交的并发写入
+SYNC_OVERLAP_SECONDS = 600
+SYNC_FETCH_SIZE = 10000
+
+# 主键改为 (table_name, relative_path) 前, 为历史行补上与 legacy_ledger_key 相同的键
+SQL_BACKFILL_LEGACY_RELATIVE_PATH = """
+    UPDATE db_junglescout_amazon.tb_loaded_records
+    SET relative_path = CONCAT(
+        CHAR(0 USING utf8mb4), 'legacy', CHAR(0 USING utf8mb4),
+        CONCAT_WS('|', marketplace, root_category_id, year, week, file_name)
+    )
+    WHERE relative_path = ''
+"""
+
+
+def legacy_ledger_key(ledger_key: tuple, file_name: str) -> str:
+    """
+    未记录 relative_path 的历史台账行的键, 由分区字段和文件名拼成.
+
+    :param ledger_key: (marketplace, root_category_id, year, week).
+    :param file_name: 文件名.
+    :return: 镜像中使用的键.
+    """
+    return legacy_ledger_prefix(ledger_key) + str(file_name)
+
+
+def legacy_ledger_prefix(ledger_key: tuple) -> str:
+    """
+    同一分区的历史台账键的公共前缀.
+
+    :param ledger_key: (marketplace, root_category_id, year, week).
+    """
+    return "\0legacy\0" + "".join(f"{item}|" for item in ledger_key)
+
+
+def escape_like(value: str) -> str:
+    """
+    转义 LIKE 模式中的通配符.
+    """
+    return value.replace("\\", "\\\\").replace("%", r"\%").replace("_", r"\_")
+
+
+def get_file_ledger_keys(
+    class_obj: base_model.BaseModel, relative_path: str
+) -> tuple[str, str]:
+    """
+    计算文件在台账中的键.
+
+    :param class_obj: 具体的 ORM 类.
+    :param relative_path: 文件相对于表目录的路径.
+    :return: (relative_path, 历史台账键).
+    """
+    load_plan, partition_values = get_file_load_plan(class_obj, relative_path)
+    return relative_path, legacy_ledger_key(
+        load_plan.ledger_key(partition_values), os.path.basename(relative_path)
+    )
+
+
+class LoadedLedger:
+    """
+    单个表的已加载文件台账, 线程安全.
+    """
+
+    def __init__(
+        self,
+        table_name: str,
+        mirror_path: str = DEFAULT_MIRROR_PATH,
+        pool_name: str = POOL_LOAD,
+    ):
+        """
+        :param table_name: 目标表名.
+        :param mirror_path: 本地 SQLite 镜像路径.
+        :param pool_name: 访问服务端台账使用的连接池.
+        """
+        self.table_name = table_name
+        self.pool_name = pool_name
+        self._lock = threading.Lock()
+        # 分区失效后即将重新加载的文件的已知指纹 {relative_path: 指纹}, 重新加载时免去再算哈希
+        self._known_fingerprints: dict[str, tuple] = {}
+        os.makedirs(os.path.dirname(mirror_path), exist_ok=True)
+        self._mirror = sqlite3.connect(mirror_path, check_same_thread=False)
+        self._mirror.executescript(
+            """
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+            CREATE TABLE IF NOT EXISTS loaded_files (
+                table_name TEXT NOT NULL,
+                relative_path TEXT NOT NULL,
+                file_size INTEGER,
+                file_mtime_ns INTEGER,
+                content_hash TEXT,
+                PRIMARY KEY (table_name, relative_path)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS sync_state (
+                table_name TEXT NOT NULL,
+                prefix TEXT NOT NULL,
+                synced_until TEXT,
+                PRIMARY KEY (table_name, prefix)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS purge_state (
+                table_name TEXT NOT NULL PRIMARY KEY,
+                purge_count INTEGER NOT NULL
+            ) WITHOUT ROWID;
+            """
+        )
+        # 旧版本镜像没有指纹字段, 补齐
+        mirror_columns = {
+            row[1] for row in self._mirror.execute("PRAGMA table_info(loaded_files)")
+        }
+        for column, column_type in (
+            ("file_size", "INTEGER"),
+            ("file_mtime_ns", "INTEGER"),
+            ("content_hash", "TEXT"),
+        ):
+            if column not in mirror_columns:
+                self._mirror.execute(
+                    f"ALTER TABLE loaded_files ADD COLUMN {column} {column_type}"
+                )
+
+    def _reset_mirror(self) -> None:
+        with self._lock, self._mirror:
+            self._mirror.execute(
+                "DELETE FROM loaded_files WHERE table_name = ?", (self.table_name,)
+            )
+            self._mirror.execute(
+                "DELETE FROM sync_state WHERE table_name = ?", (self.table_name,)
+            )
+
+    def _is_mirror_stale(self, cursor) -> bool:
+        """
+        判断本地镜像是否过期: 服务端台账的删除计数变化, 或最大 created_datetime 回退到镜像水位之前
+        (未递增计数的手工清理). 两者都是主键/索引查找.
+
+        :param cursor: 服务端连接的游标.
+        """
+        cursor.execute(
+            "SELECT purge_count FROM db_junglescout_amazon.tb_loaded_records_purges WHERE table_name = %s",
+            (self.table_name,),
+        )
+        row = cursor.fetchone()
+        server_purge_count = row[0] if row else 0
+        cursor.execute(
+            "SELECT MAX(created_datetime) FROM db_junglescout_amazon.tb_loaded_records WHERE table_name = %s",
+            (self.table_name,),
+        )
+        server_max = cursor.fetchone()[0]
+        with self._lock:
+            row = self._mirror.execute(
+                "SELECT purge_count FROM purge_state WHERE table_name = ?",
+                (self.table_name,),
+            ).fetchone()
+            mirror_purge_count = row[0] if row else None
+            mirror_max = self._mirror.execute(
+                "SELECT MAX(synced_until) FROM sync_state WHERE table_name = ?",
+                (self.table_name,),
+            ).fetchone()[0]
+        if mirror_purge_count != server_purge_count:
+            self._set_purge_count(server_purge_count)
+            # 镜像尚未记录计数 (首次同步) 时以服务端当前计数为准
+            return mirror_purge_count is not None
+        return mirror_max is not None and (
+            server_max is None or str(server_max) < mirror_max
+        )
+
+    def _set_purge_count(self, purge_count: int) -> None:
+        with self._lock, self._mirror:
+            self._mirror.execute(
+                "INSERT OR REPLACE INTO purge_state (table_name, purge_count) VALUES (?, ?)",
+                (self.table_name, purge_count),
+            )
+
+    def sync(self, prefix: str = "") -> int:
+        """
+        从服务端增量同步台账到本地镜像.
+
+        :param prefix: 分区路径前缀, 例如 "marketplace=us/", 只同步该前缀下的记录.
+        :return: 本次同步的行数.
+        """
+        with get_connection(self.pool_name) as connection:
+            with connection.cursor() as cursor:
+                # 服务端台账有行被删除时, 本地镜像需要重建
+                if self._is_mirror_stale(cursor):
+                    print(f"ledger mirror of {self.table_name} is stale, rebuilding")
+                    self._reset_mirror()
+
+                with self._lock:
+                    synced_until = self._mirror.execute(
+                        "SELECT synced_until FROM sync_state WHERE table_name = ? AND prefix = ?",
+                        (self.table_name, prefix),
+                    ).fetchone()
+                sql_select = """
+                    SELECT relative_path, created_datetime, file_size, file_mtime_ns, content_hash
+                    FROM db_junglescout_amazon.tb_loaded_records
+                    WHERE table_name = %s
+                """
+                params: list = [self.table_name]
+                if prefix:
+                    # 前缀匹配可以走 (table_name, relative_path) 主键
+                    sql_select += " AND relative_path LIKE %s"
+                    params.append(escape_like(prefix) + "%")
+                if synced_until and synced_until[0]:
+                    sql_select += (
+                        " AND created_datetime >= %s - INTERVAL %s SECOND"
+                    )
+                    params.extend([synced_until[0], SYNC_OVERLAP_SECONDS])
+                cursor.execute(sql_select, params)
+
+                synced_rows = 0
+                max_created_datetime = synced_until[0] if synced_until else None
+                while rows := cursor.fetchmany(SYNC_FETCH_SIZE):
+                    with self._lock, self._mirror:
+                        self._mirror.executemany(
+                            "INSERT OR REPLACE INTO loaded_files (table_name, relative_path, file_size, file_mtime_ns, content_hash) VALUES (?, ?, ?, ?, ?)",
+                            (
+                                (self.table_name, row[0], *row[2:])
+                                for row in rows
+                            ),
+                        )
+                    synced_rows += len(rows)
+                    batch_max = str(max(row[1] for row in rows))
+                    if max_created_datetime is None or batch_max > max_created_datetime:
+                        max_created_datetime = batch_max
+
+        with self._lock, self._mirror:
+            self._mirror.execute(
+                "INSERT OR REPLACE INTO sync_state (table_name, prefix, synced_until) VALUES (?, ?, ?)",
+                (self.table_name, prefix, max_created_datetime),
+            )
+        print(f"ledger {self.table_name} synced {synced_rows} rows, {prefix=}")
+        return synced_rows
+
+    def count(self) -> int:
+        """
+        本地镜像中的记录数.
+        """
+        with self._lock:
+            return self._mirror.execute(
+                "SELECT COUNT(*) FROM loaded_files WHERE table_name = ?",
+                (self.table_name,),
+            ).fetchone()[0]
+
+    def get_fingerprint(
+        self, relative_path: str, legacy_key: str | None = None
+    ) -> tuple | None:
+        """
+        获取文件加载时记录的指纹.
+
+        :param relative_path: 文件相对于表目录的路径.
+        :param legacy_key: 历史台账键.
+        :return: (file_size, file_mtime_ns, content_hash), 未加载时返回 None.
+        """
+        with self._lock:
+            for key in (relative_path, legacy_key):
+                if key is None:
+                    continue
+                row = self._mirror.execute(
+                    "SELECT file_size, file_mtime_ns, content_hash FROM loaded_files WHERE table_name = ? AND relative_path = ?",
+                    (self.table_name, key),
+                ).fetchone()
+                if row is not None:
+                    return row
+        return None
+
+    def get_known_content_hash(
+        self, relative_path: str, legacy_key: str | None, st: os.stat_result
+    ) -> str | None:
+        """
+        文件的 size/mtime 与台账 (或分区失效前记下的) 指纹一致时, 返回其中的内容哈希.
+
+        :param relative_path: 文件相对于表目录的路径.
+        :param legacy_key: 历史台账键.
+        :param st: 文件当前的 stat 结果.
+        :return: 内容哈希, 没有可复用的哈希时为 None.
+        """
+        fingerprint = self.get_fingerprint(relative_path, legacy_key)
+        if fingerprint is None:
+            with self._lock:
+                fingerprint = self._known_fingerprints.get(relative_path)
+        if fingerprint is not None and fingerprint[:2] == (st.st_size, st.st_mtime_ns):
+            return fingerprint[2]
+        return None
+
+    def remember_fingerprint(self, relative_path: str, fingerprint: tuple) -> None:
+        """
+        记下刚算过哈希但尚未加载的文件的指纹, 供加载时复用.
+
+        :param relative_path: 文件相对于表目录的路径.
+        :param fingerprint: (file_size, file_mtime_ns, content_hash).
+        """
+        with self._lock:
+            self._known_fingerprints[relative_path] = fingerprint
+
+    def invalidate_partition(
+        self,
+        load_plan: LoadPlan,
+        partition_values: tuple[str, ...],
+        relative_paths: list[str],
+        derived_deletes: list[tuple[str, tuple]] | None = None,
+    ) -> None:
+        """
+        删除某个分区的全部数据、该分区的全部台账记录 (包括同一个表其他格式目录下同一分区的文件) 及派生表中
+        对应的行, 同一事务提交. 之后这些文件会被视为未加载, 在各自的目录下次扫描时重新加载, 转换阶段重新生成派生行.
+
+        :param load_plan: 该分区的加载计划.
+        :param partition_values: 分区值.
+        :param relative_paths: 该分区目录下全部文件的相对路径.
+        :param derived_deletes: 同一事务中执行的派生表清理语句 [(SQL, 参数)].
+        """
+        partition_dir = os.path.dirname(relative_paths[0])
+        dir_pattern = escape_like(f"{partition_dir}/" if partition_dir else "")
+        ledger_key = load_plan.ledger_key(partition_values)
+        # 分区路径中只有台账分区字段时, 历史行可按台账分区字段前缀匹配; 否则只能按文件名匹配本目录的文件
+        if set(load_plan.partition_fields) <= set(LEDGER_PARTITION_DEFAULTS):
+            legacy_condition = "relative_path LIKE %s"
+            legacy_params = [escape_like(legacy_ledger_prefix(ledger_key)) + "%"]
+        else:
+            legacy_condition = f"relative_path IN ({', '.join(['%s'] * len(relative_paths))})"
+            legacy_params = [
+                legacy_ledger_key(ledger_key, os.path.basename(path))
+                for path in relative_paths
+            ]
+        with get_connection(self.pool_name) as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"""
+                    SELECT relative_path FROM db_junglescout_amazon.tb_loaded_records
+                    WHERE table_name = %s
+                        AND (
+                            (relative_path LIKE %s AND relative_path NOT LIKE %s)
+                            OR {legacy_condition}
+                        )
+                    FOR UPDATE
+                    """,
+                    (self.table_name, f"{dir_pattern}%", f"{dir_pattern}%/%", *legacy_params),
+                )
+                ledger_keys = [row[0] for row in cursor.fetchall()]
+                cursor.execute(load_plan.delete_partition_sql(), partition_values)
+                deleted_rows = cursor.rowcount
+                for sql, params in derived_deletes or []:
+                    cursor.execute(sql, params)
+                purge_count = None
+                if ledger_keys:
+                    cursor.execute(
+                        f"""
+                        DELETE FROM db_junglescout_amazon.tb_loaded_records
+                        WHERE table_name = %s
+                            AND relative_path IN ({", ".join(["%s"] * len(ledger_keys))})
+                        """,
+                        (self.table_name, *ledger_keys),
+                    )
+                    # 通知其他客户端的镜像过期
+                    cursor.execute(
+                        """
+                        INSERT INTO db_junglescout_amazon.tb_loaded_records_purges (table_name, purge_count)
+                        VALUES (%s, 1)
+                        ON DUPLICATE KEY UPDATE purge_count = purge_count + 1
+                        """,
+                        (self.table_name,),
+                    )
+                    cursor.execute(
+                        "SELECT purge_count FROM db_junglescout_amazon.tb_loaded_records_purges WHERE table_name = %s",
+                        (self.table_name,),
+                    )
+                    purge_count = cursor.fetchone()[0]
+                connection.commit()
+        with self._lock, self._mirror:
+            # 内容未变的文件随分区一起重新加载, 保留其指纹
+            for relative_path in relative_paths:
+                fingerprint = self._mirror.execute(
+                    "SELECT file_size, file_mtime_ns, content_hash FROM loaded_files WHERE table_name = ? AND relative_path = ? AND content_hash IS NOT NULL",
+                    (self.table_name, relative_path),
+                ).fetchone()
+                if fingerprint is not None:
+                    self._known_fingerprints.setdefault(relative_path, fingerprint)
+            self._mirror.executemany(
+                "DELETE FROM loaded_files WHERE table_name = ? AND relative_path = ?",
+                ((self.table_name, key) for key in {*ledger_keys, *relative_paths}),
+            )
+            if purge_count is not None:
+                # 本地镜像已同步删除; 期间有其他客户端的删除时计数对不上, 下次同步照常重建
+                self._mirror.execute(
+                    "UPDATE purge_state SET purge_count = ? WHERE table_name = ? AND purge_count = ?",
+                    (purge_count, self.table_name, purge_count - 1),
+                )
+        print(
+            f"invalidated partition {dict(zip(load_plan.partition_fields, partition_values))} of {self.table_name}, {deleted_rows=} ledger_rows={len(ledger_keys)}"
+        )
+
+    def refresh_fingerprint(self, relative_path: str, fingerprint: tuple) -> None:
+        """
+        文件内容未变只是 size/mtime 变化时, 在服务端台账与本地镜像中刷新指纹, 下次不再计算内容哈希.
+
+        :param relative_path: 文件相对于表目录的路径.
+        :param fingerprint: (file_size, file_mtime_ns, content_hash).
+        """
+        with get_connection(self.pool_name) as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    """
+                    UPDATE db_junglescout_amazon.tb_loaded_records
+                    SET file_size = %s, file_mtime_ns = %s
+                    WHERE table_name = %s AND relative_path = %s
+                    """,
+                    (*fingerprint[:2], self.table_name, relative_path),
+                )
+                connection.commit()
+        self.mark_loaded(relative_path, fingerprint=fingerprint)
+
+    def get_chunk_checkpoint(self, relative_path: str) -> tuple[int, int, int] | None:
+        """
+        读取大文件分块加载的断点 (直接查服务端, 只在加载大文件时调用).
+
+        :param relative_path: 文件相对于表目录的路径.
+        :return: (file_size, file_mtime_ns, committed_offset), 没有断点时为 None.
+        """
+        with get_connection(self.pool_name) as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    """
+                    SELECT file_size, file_mtime_ns, committed_offset
+                    FROM db_junglescout_amazon.tb_loaded_chunks
+                    WHERE table_name = %s AND relative_path = %s
+                    """,
+                    (self.table_name, relative_path),
+                )
+                row = cursor.fetchone()
+        return tuple(row) if row else None
+
+    def mark_loaded(
+        self,
+        relative_path: str,
+        legacy_key: str | None = None,
+        fingerprint: tuple = (None, None, None),
+    ) -> None:
+        """
+        服务端台账提交后, 同步写入本地镜像.
+
+        :param relative_path: 文件相对于表目录的路径.
+        :param legacy_key: 历史台账键, 文件重新加载后镜像中以 relative_path 代替.
+        :param fingerprint: (file_size, file_mtime_ns, content_hash).
+        """
+        with self._lock, self._mirror:
+            self._known_fingerprints.pop(relative_path, None)
+            if legacy_key is not None:
+                self._mirror.execute(
+                    "DELETE FROM loaded_files WHERE table_name = ? AND relative_path = ?",
+                    (self.table_name, legacy_key),
+                )
+            self._mirror.execute(
+                "INSERT OR REPLACE INTO loaded_files (table_name, relative_path, file_size, file_mtime_ns, content_hash) VALUES (?, ?, ?, ?, ?)",
+                (self.table_name, relative_path, *fingerprint),
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._mirror.close()
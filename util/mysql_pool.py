@@ -0,0 +1,142 @@
+"""
+模块名称: MySQL 连接池
+描述: 加载与转换阶段共享的连接池, 取代每个文件/分区新建一次 mysql.connector.connect.
+借出连接时做健康检查 (断线自动重连), 会话变量通过连接配置的 init_command 在建立 (及重连) 连接时设置,
+归还时不重置会话, 池满时阻塞等待而不是直接报错, 池大小按并发 worker 数配置.
+"""
+
+import threading
+from contextlib import contextmanager
+
+from mysql.connector import pooling
+
+from config.config import DB_CONFIG  # 引入配置
+
+POOL_LOAD = "load"
+POOL_TRANSFORM = "transform"
+
+# 每个连接池的会话变量, 值为 SQL 字面量
+SESSION_VARIABLES = {
+    POOL_LOAD: {"sql_mode": "''"},
+    POOL_TRANSFORM: {"sql_mode": "''"},  # 清除 SQL 模式
+}
+DEFAULT_POOL_SIZE = 4
+
+_pools: dict[str, pooling.MySQLConnectionPool] = {}
+_pool_slots: dict[str, threading.BoundedSemaphore] = {}
+# {连接池名称: 建立连接时设置的会话变量}
+_session_variables: dict[str, dict[str, str]] = {}
+# {连接池名称: 借出中的连接的 connection_id}
+_active_connection_ids: dict[str, set[int]] = {}
+_lock = threading.Lock()
+
+
+def init_pool(
+    pool_name: str,
+    pool_size: int = DEFAULT_POOL_SIZE,
+    db_config: dict = DB_CONFIG,
+    session_variables: dict[str, str] | None = None,
+) -> None:
+    """
+    创建 (或按新的大小重建) 连接池.
+
+    :param pool_name: 连接池名称, 如 POOL_LOAD / POOL_TRANSFORM.
+    :param pool_size: 连接数, 一般为该阶段的 worker 数, 上限为 mysql.connector 的 32.
+    :param db_config: MySQL 连接配置.
+    :param session_variables: 会话变量 {变量名: SQL 字面量}, 默认取 SESSION_VARIABLES.
+    """
+    pool_size = max(1, min(pool_size, pooling.CNX_POOL_MAXSIZE))
+    if session_variables is None:
+        session_variables = SESSION_VARIABLES.get(pool_name, {})
+    init_command = (
+        {"init_command": build_init_command(session_variables)}
+        if session_variables
+        else {}
+    )
+    with _lock:
+        _pools[pool_name] = pooling.MySQLConnectionPool(
+            pool_name=pool_name,
+            pool_size=pool_size,
+            # 不重置会话, init_command 设置的会话变量在连接的整个生命周期内有效
+            pool_reset_session=False,
+            allow_local_infile=True,
+            **init_command,
+            **db_config,
+        )
+        _pool_slots[pool_name] = threading.BoundedSemaphore(pool_size)
+        _session_variables[pool_name] = dict(session_variables)
+        _active_connection_ids.setdefault(pool_name, set())
+    print(f"connection pool {pool_name} created, {pool_size=}")
+
+
+def build_init_command(session_variables: dict[str, str]) -> str:
+    """
+    把会话变量合并为一条 SET 语句, 作为连接的 init_command.
+
+    :param session_variables: {变量名: SQL 字面量}.
+    :return: 例如 SET SESSION sql_mode = '', unique_checks = 0.
+    """
+    return "SET SESSION " + ", ".join(
+        f"{name} = {value}" for name, value in session_variables.items()
+    )
+
+
+def get_session_variables(pool_name: str = POOL_LOAD) -> dict[str, str]:
+    """
+    连接池实际使用的会话变量, 其他客户端 (如 aiomysql) 的连接据此设置相同的会话.
+
+    :param pool_name: 连接池名称, 未初始化时返回 SESSION_VARIABLES 中的默认值.
+    :return: {变量名: SQL 字面量}.
+    """
+    with _lock:
+        return dict(
+            _session_variables.get(pool_name, SESSION_VARIABLES.get(pool_name, {}))
+        )
+
+
+def get_active_connection_ids(pool_name: str = POOL_LOAD) -> set[int]:
+    """
+    连接池中当前借出的连接的 connection_id (即 processlist id), 用于只观察本进程的会话.
+
+    :param pool_name: 连接池名称.
+    :return: connection_id 集合.
+    """
+    with _lock:
+        return set(_active_connection_ids.get(pool_name, ()))
+
+
+@contextmanager
+def get_connection(pool_name: str = POOL_LOAD):
+    """
+    从连接池借出一个健康的连接, 退出时归还; 异常时先回滚.
+
+    :param pool_name: 连接池名称, 未初始化时按默认大小创建.
+    :return: 连接上下文.
+    """
+    if pool_name not in _pools:
+        init_pool(pool_name)
+    slots = _pool_slots[pool_name]
+    slots.acquire()
+    try:
+        connection = _pools[pool_name].get_connection()
+        try:
+            # 健康检查, 断线时自动重连 (重连时再次执行 init_command)
+            connection.ping(reconnect=True, attempts=3, delay=1)
+            connection_id = connection.connection_id
+            with _lock:
+                _active_connection_ids[pool_name].add(connection_id)
+            try:
+                yield connection
+            finally:
+                with _lock:
+                    _active_connection_ids[pool_name].discard(connection_id)
+        except BaseException:
+            try:
+                connection.rollback()
+            except Exception:
+                pass
+            raise
+        finally:
+            connection.close()  # 归还到连接池
+    finally:
+        slots.release()
@@ -0,0 +1,171 @@
+"""
+模块名称: Parquet 分区文件读取
+描述: format=parquet 的分区文件与 csv 布局相同. 校验只读取文件尾部的元数据 (schema), 不读数据;
+加载时按行组分批读取, 只投影 ORM 需要的列, 在 pyarrow 中向量化编码为 LOAD DATA 可识别的 CSV 字节,
+经命名管道流式写入 MySQL, 不会一次读入整个文件. 依赖可选的 pyarrow.
+"""
+
+import os
+import threading
+from typing import Iterator
+
+from sqlalchemy import Boolean, Date, DateTime, Integer, Numeric
+
+from model import base_model
+from util.get_partition_info import extract_partition_items
+from util.load_plan import get_load_plan
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+    _QUOTE = pa.scalar('"', pa.large_string())
+    _EMPTY = pa.scalar("", pa.large_string())
+except ImportError:  # pyarrow 为可选依赖, 只有 parquet 分区需要
+    pa = pc = pq = None
+
+PARQUET_FILE_FORMAT = ".parquet"
+PARQUET_BATCH_ROWS = 64 * 1024
+
+
+def is_parquet(file_path: str) -> bool:
+    return file_path.endswith(PARQUET_FILE_FORMAT)
+
+
+def _require_pyarrow() -> None:
+    if pa is None:
+        raise RuntimeError("pyarrow is required to read parquet partition files")
+
+
+def _is_compatible(column_type, arrow_type) -> bool:
+    """
+    Parquet 列类型能否写入 ORM 列. 字符串可由 MySQL 转换, 只拒绝明显不兼容的组合.
+    """
+    if pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type):
+        return True
+    if isinstance(column_type, (DateTime, Date)):
+        return pa.types.is_timestamp(arrow_type) or pa.types.is_date(arrow_type)
+    if isinstance(column_type, (Integer, Numeric, Boolean)):
+        return (
+            pa.types.is_integer(arrow_type)
+            or pa.types.is_floating(arrow_type)
+            or pa.types.is_decimal(arrow_type)
+            or pa.types.is_boolean(arrow_type)
+        )
+    return True
+
+
+class ParquetSchemaValidator:
+    """
+    单个表的 Parquet schema 校验器, 与 CsvHeaderValidator 用法一致.
+    多余的列在加载时被投影掉, 只有缺失列或类型不兼容才视为不通过.
+    """
+
+    def __init__(self, table_path: str, class_obj: base_model.BaseModel):
+        """
+        :param table_path: 表的绝对路径.
+        :param class_obj: 具体的 ORM 类.
+        """
+        _require_pyarrow()
+        self.table_path = table_path
+        self.class_obj = class_obj
+        self._lock = threading.Lock()
+        # {(((列名, 类型), ...), partition_fields): 是否通过}
+        self._signature_results: dict[tuple, bool] = {}
+
+    def _check_schema(
+        self, file_path: str, schema, partition_fields: tuple[str, ...]
+    ) -> bool:
+        expected_headers = get_load_plan(
+            self.class_obj, partition_fields
+        ).expected_csv_headers
+        columns = self.class_obj.__table__.columns
+        missing_columns = [
+            name for name in expected_headers if name not in schema.names
+        ]
+        incompatible_columns = [
+            (name, str(schema.field(name).type))
+            for name in expected_headers
+            if name in schema.names
+            and not _is_compatible(columns[name].type, schema.field(name).type)
+        ]
+        if missing_columns or incompatible_columns:
+            print(
+                f"schema is error {file_path=} {missing_columns=} {incompatible_columns=}"
+            )
+            return False
+        return True
+
+    def validate_file(self, file_path: str) -> bool:
+        """
+        校验单个文件的 schema, 只读取文件尾部的元数据.
+
+        :param file_path: 文件路径.
+        :return: schema 是否满足 ORM 定义.
+        """
+        schema = pq.read_schema(file_path)
+        partition_fields = tuple(
+            extract_partition_items(
+                partitioned_path=os.path.relpath(file_path, self.table_path),
+                return_type=0,
+            )
+        )
+        signature = (
+            tuple(zip(schema.names, map(str, schema.types))),
+            partition_fields,
+        )
+        with self._lock:
+            is_valid = self._signature_results.get(signature)
+        if is_valid is None:
+            is_valid = self._check_schema(file_path, schema, partition_fields)
+            with self._lock:
+                self._signature_results[signature] = is_valid
+        return is_valid
+
+
+def _encode_column(array) -> "pa.Array":
+    """
+    将一列编码为 LOAD DATA 字段: 转义反斜杠和双引号后用双引号包裹, null 编码为 \\N.
+    """
+    if pa.types.is_boolean(array.type):
+        array = array.cast(pa.int8())
+    elif pa.types.is_timestamp(array.type) and array.type.tz is not None:
+        array = array.cast(pa.timestamp(array.type.unit))
+    text = array.cast(pa.large_string())
+    text = pc.replace_substring(text, "\\", "\\\\")
+    text = pc.replace_substring(text, '"', '""')
+    text = pc.binary_join_element_wise(_QUOTE, text, _QUOTE, _EMPTY)
+    return pc.fill_null(text, pa.scalar("\\N", pa.large_string()))
+
+
+def iter_parquet_records(
+    file_path: str,
+    columns: tuple[str, ...],
+    suffix: bytes = b"",
+    batch_rows: int = PARQUET_BATCH_ROWS,
+) -> Iterator[bytes]:
+    """
+    按行组分批读取 Parquet 文件并编码为 CSV 字节块, 每行末尾追加 suffix (例如分区字段).
+
+    :param file_path: 文件路径.
+    :param columns: 需要投影的列, 顺序即 CSV 中的列顺序.
+    :param suffix: 追加在每行末尾的字节.
+    :param batch_rows: 每批行数.
+    :return: 字节块迭代器, 每块包含若干完整的行.
+    """
+    _require_pyarrow()
+    line_end = pa.scalar((suffix + b"\n").decode("utf-8"), pa.large_string())
+    separator = pa.scalar(",", pa.large_string())
+    parquet_file = pq.ParquetFile(file_path)
+    for batch in parquet_file.iter_batches(
+        batch_size=batch_rows, columns=list(columns)
+    ):
+        if batch.num_rows == 0:
+            continue
+        fields = [_encode_column(batch.column(name)) for name in columns]
+        rows = pc.binary_join_element_wise(*fields, separator)
+        rows = pc.binary_join_element_wise(rows, line_end, _EMPTY)
+        # 行与行之间首尾相接, 直接取字符串数组的数据缓冲区
+        offsets = rows.offsets
+        start, end = offsets[0].as_py(), offsets[-1].as_py()
+        yield rows.buffers()[2][start:end].to_pybytes()
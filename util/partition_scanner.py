@@ -0,0 +1,222 @@
+"""
+模块名称: 分区目录增量扫描
+描述: 基于 os.scandir 并发扫描 /xxx=xxx/xxx=xxx/ 分区目录树, 并在磁盘上维护目录 mtime
+与文件 (size, mtime, inode) 的清单缓存. 目录 mtime 未变化时直接复用清单中的文件列表,
+不再重新列目录, 重跑时只需列出新增或变化的目录.
+"""
+
+import hashlib
+import json
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Iterator
+
+from util.get_partition_info import partition_path_matches
+
+# 清单缓存默认目录, 位于项目根目录下
+DEFAULT_CACHE_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache"
+)
+MANIFEST_VERSION = 1
+
+
+def get_manifest_path(table_path: str, cache_dir: str = DEFAULT_CACHE_DIR) -> str:
+    """
+    根据表的绝对路径生成清单缓存文件路径.
+
+    :param table_path: 表的绝对路径.
+    :param cache_dir: 缓存目录.
+    :return: 清单文件路径.
+    """
+    digest = hashlib.md5(os.path.abspath(table_path).encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir, f"manifest_{digest}.json")
+
+
+def load_manifest(manifest_path: str) -> dict:
+    """
+    读取清单缓存, 文件不存在或版本不一致时返回空清单.
+
+    :param manifest_path: 清单文件路径.
+    :return: 清单字典, 形如 {"version": 1, "dirs": {rel_dir: {...}}}.
+    """
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {"version": MANIFEST_VERSION, "dirs": {}}
+    if manifest.get("version") != MANIFEST_VERSION:
+        return {"version": MANIFEST_VERSION, "dirs": {}}
+    return manifest
+
+
+def save_manifest(manifest_path: str, manifest: dict) -> None:
+    """
+    原子写入清单缓存 (先写临时文件再替换).
+
+    :param manifest_path: 清单文件路径.
+    :param manifest: 清单字典.
+    """
+    os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, separators=(",", ":"))
+    os.replace(tmp_path, manifest_path)
+
+
+def _scan_one_dir(
+    abs_dir: str,
+    dir_mtime_ns: int,
+    cached: dict | None,
+    required_format: str | tuple[str, ...],
+    stat_files: bool = False,
+) -> dict:
+    """
+    扫描单个目录. 目录 mtime 与清单一致时直接复用清单.
+    原地改写文件不会改变目录 mtime, stat_files 为 True 时对清单中的文件逐个重新 stat.
+
+    :return: {"mtime_ns": int, "files": {name: [size, mtime_ns, ino]}, "subdirs": {name: mtime_ns}}.
+    """
+    if cached is not None and cached.get("mtime_ns") == dir_mtime_ns:
+        files = cached["files"]
+        if stat_files:
+            files = {}
+            for name in cached["files"]:
+                try:
+                    st = os.stat(os.path.join(abs_dir, name))
+                except FileNotFoundError:
+                    continue
+                files[name] = [st.st_size, st.st_mtime_ns, st.st_ino]
+        # 子目录自身的 mtime 需要重新获取, 以判断更深层是否有变化
+        subdirs = {}
+        for name in cached["subdirs"]:
+            try:
+                subdirs[name] = os.stat(os.path.join(abs_dir, name)).st_mtime_ns
+            except FileNotFoundError:
+                continue
+        return {"mtime_ns": dir_mtime_ns, "files": files, "subdirs": subdirs}
+
+    files = {}
+    subdirs = {}
+    with os.scandir(abs_dir) as it:
+        for entry in it:
+            if entry.is_dir(follow_symlinks=True):
+                subdirs[entry.name] = entry.stat().st_mtime_ns
+            elif entry.name.endswith(required_format):
+                st = entry.stat()
+                files[entry.name] = [st.st_size, st.st_mtime_ns, st.st_ino]
+    return {"mtime_ns": dir_mtime_ns, "files": files, "subdirs": subdirs}
+
+
+def iter_partition_files(
+    table_path: str,
+    required_format: str | tuple[str, ...] = ".csv",
+    manifest_path: str | None = None,
+    max_workers: int = 8,
+    predicates: dict[str, list[Callable[[str], bool]]] | None = None,
+    stat_files: bool = False,
+) -> Iterator[tuple[str, bool]]:
+    """
+    并发扫描分区目录树, 逐个产出文件. 完整遍历结束后更新清单缓存.
+
+    :param table_path: 表的绝对路径.
+    :param required_format: 文件后缀, 多种后缀时传元组, 如 (".csv", ".csv.gz").
+    :param manifest_path: 清单文件路径, 默认按表路径生成.
+    :param max_workers: 并发扫描线程数.
+    :param predicates: 分区谓词 (见 get_partition_info.parse_partition_predicates),
+        不满足的 key=value 目录不再向下遍历.
+    :param stat_files: 是否对未变化目录中的文件重新 stat, 以发现原地改写; 默认复用清单中的文件 stat.
+    :return: (文件绝对路径, 是否为新增或变化的文件) 迭代器, 同一目录的文件连续产出.
+    """
+    if manifest_path is None:
+        manifest_path = get_manifest_path(table_path)
+    manifest = load_manifest(manifest_path)
+    formats = (
+        [required_format]
+        if isinstance(required_format, str)
+        else list(required_format)
+    )
+    # 清单只记录匹配后缀的文件, 后缀集合变化时整表重新列目录
+    old_dirs = manifest["dirs"] if manifest.get("formats", [".csv"]) == formats else {}
+    new_dirs: dict[str, dict] = {}
+
+    try:
+        root_mtime_ns = os.stat(table_path).st_mtime_ns
+    except FileNotFoundError:
+        print(f"table path not found {table_path=}")
+        return
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {
+            executor.submit(
+                _scan_one_dir,
+                table_path,
+                root_mtime_ns,
+                old_dirs.get("."),
+                required_format,
+                stat_files,
+            ): "."
+        }
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                rel_dir = pending.pop(future)
+                result = future.result()
+                new_dirs[rel_dir] = {
+                    "mtime_ns": result["mtime_ns"],
+                    "files": result["files"],
+                    "subdirs": sorted(result["subdirs"]),
+                }
+                abs_dir = os.path.join(table_path, rel_dir)
+                old_files = old_dirs.get(rel_dir, {}).get("files", {})
+                for name, file_stat in result["files"].items():
+                    yield os.path.normpath(os.path.join(abs_dir, name)), (
+                        old_files.get(name) != file_stat
+                    )
+
+                # 子目录按层级继续提交, 顶层分区目录之间天然并发
+                for name, mtime_ns in result["subdirs"].items():
+                    sub_rel = os.path.normpath(os.path.join(rel_dir, name))
+                    if not partition_path_matches(name, predicates):
+                        continue
+                    future = executor.submit(
+                        _scan_one_dir,
+                        os.path.join(table_path, sub_rel),
+                        mtime_ns,
+                        old_dirs.get(sub_rel),
+                        required_format,
+                        stat_files,
+                    )
+                    pending[future] = sub_rel
+
+    save_manifest(
+        manifest_path,
+        {
+            "version": MANIFEST_VERSION,
+            "formats": formats,
+            "dirs": merge_manifest_dirs(old_dirs, new_dirs),
+        },
+    )
+
+
+def merge_manifest_dirs(old_dirs: dict, new_dirs: dict) -> dict:
+    """
+    合并新旧清单: 本次遍历的目录以新结果为准, 被谓词剪枝的子树沿用旧清单,
+    只去掉已不存在的目录 (从根目录沿 subdirs 不可达的条目).
+
+    :param old_dirs: 上次的清单目录.
+    :param new_dirs: 本次遍历的目录.
+    :return: 合并后的清单目录.
+    """
+    merged = {**old_dirs, **new_dirs}
+    reachable = {}
+    pending = ["."] if "." in merged else []
+    while pending:
+        rel_dir = pending.pop()
+        entry = merged[rel_dir]
+        reachable[rel_dir] = entry
+        for name in entry["subdirs"]:
+            sub_rel = os.path.normpath(os.path.join(rel_dir, name))
+            if sub_rel in merged and sub_rel not in reachable:
+                pending.append(sub_rel)
+    return reachable
+
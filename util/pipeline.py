@@ -0,0 +1,142 @@
+"""
+模块名称: 流式发现→校验→加载流水线
+描述: 发现、校验、加载三个阶段分别运行在独立线程中, 阶段之间通过有界队列衔接.
+文件一经发现即进入校验, 校验通过即进入加载, 队列写满时上游阻塞等待 (背压).
+strict 模式下保留原有"整表校验通过才加载"的语义: 校验与发现仍并行, 但加载要等全部校验通过后才开始.
+可选的分批阶段把同一分区的文件合并为一批交给加载阶段 (小文件合并加载).
+"""
+
+import queue
+import threading
+from typing import Callable, Iterable
+
+_SENTINEL = object()
+
+
+def run_streaming_pipeline(
+    source: Iterable[str],
+    validate_fn: Callable[[str], bool],
+    load_fn: Callable[[str], bool],
+    queue_size: int = 1000,
+    validate_workers: int = 1,
+    load_workers: int = 1,
+    strict: bool = False,
+    batch_size: int = 1,
+    batch_key_fn: Callable[[str], str] | None = None,
+) -> dict:
+    """
+    运行流式流水线.
+
+    :param source: 待处理文件迭代器 (发现阶段), 例如 partition_scanner.iter_partition_files 的产出.
+    :param validate_fn: 单文件校验函数, 返回是否通过, 抛出异常视为不通过.
+    :param load_fn: 单文件加载函数, 返回是否成功.
+    :param queue_size: 每个阶段队列的容量上限.
+    :param validate_workers: 校验线程数.
+    :param load_workers: 加载线程数.
+    :param strict: 是否全部校验通过后才开始加载.
+    :param batch_size: 大于 1 时把 batch_key_fn 相同的文件合并为一批, load_fn 接收文件列表.
+    :param batch_key_fn: 分批的键, 例如文件所在目录 (同一分区).
+    :return: {"discovered", "valid", "invalid", "loaded", "load_failed"} 计数,
+        以及 "all_valid" (是否全部校验通过).
+    """
+    validate_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+    batch_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+    load_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+    batching = batch_size > 1
+    stats = {"discovered": 0, "valid": 0, "invalid": 0, "loaded": 0, "load_failed": 0}
+    stats_lock = threading.Lock()
+    strict_validated: list[str] = []
+    errors: list[BaseException] = []
+
+    def count(key: str) -> None:
+        with stats_lock:
+            stats[key] += 1
+
+    def discover() -> None:
+        try:
+            for file_path in source:
+                count("discovered")
+                validate_queue.put(file_path)
+        except BaseException as ex:
+            errors.append(ex)
+        finally:
+            for _ in range(validate_workers):
+                validate_queue.put(_SENTINEL)
+
+    def validate() -> None:
+        while (file_path := validate_queue.get()) is not _SENTINEL:
+            try:
+                is_valid = validate_fn(file_path)
+            except Exception as ex:
+                print(f"Error validating {file_path}: {ex}")
+                is_valid = False
+            if not is_valid:
+                count("invalid")
+                continue
+            count("valid")
+            if strict:
+                with stats_lock:
+                    strict_validated.append(file_path)
+            elif batching:
+                batch_queue.put(file_path)
+            else:
+                load_queue.put(file_path)
+
+    def make_batches() -> None:
+        # 发现阶段按目录连续产出, 多个校验线程只会轻微打乱顺序,
+        # 同时未满的批次数超过校验线程数时, 最早的批次已不会再有新文件, 直接下发
+        pending: dict[str, list[str]] = {}
+        while (file_path := batch_queue.get()) is not _SENTINEL:
+            key = batch_key_fn(file_path) if batch_key_fn else ""
+            batch = pending.setdefault(key, [])
+            batch.append(file_path)
+            if len(batch) >= batch_size:
+                load_queue.put(pending.pop(key))
+            while len(pending) > validate_workers:
+                load_queue.put(pending.pop(next(iter(pending))))
+        for batch in pending.values():
+            load_queue.put(batch)
+
+    def load() -> None:
+        while (item := load_queue.get()) is not _SENTINEL:
+            item_count = len(item) if batching else 1
+            try:
+                is_loaded = load_fn(item)
+            except Exception as ex:
+                print(f"Error loading {item}: {ex}")
+                is_loaded = False
+            with stats_lock:
+                stats["loaded" if is_loaded else "load_failed"] += item_count
+
+    discover_thread = threading.Thread(target=discover, name="discover", daemon=True)
+    validate_threads = [
+        threading.Thread(target=validate, name=f"validate-{i}", daemon=True)
+        for i in range(validate_workers)
+    ]
+    batch_thread = threading.Thread(target=make_batches, name="batch", daemon=True)
+    load_threads = [
+        threading.Thread(target=load, name=f"load-{i}", daemon=True)
+        for i in range(load_workers)
+    ]
+    for thread in [discover_thread, *validate_threads, batch_thread, *load_threads]:
+        thread.start()
+
+    discover_thread.join()
+    for thread in validate_threads:
+        thread.join()
+
+    all_valid = stats["invalid"] == 0 and not errors
+    if strict and all_valid:
+        # 整表校验通过后再统一加载
+        for file_path in sorted(strict_validated):
+            (batch_queue if batching else load_queue).put(file_path)
+    batch_queue.put(_SENTINEL)
+    batch_thread.join()
+    for _ in range(load_workers):
+        load_queue.put(_SENTINEL)
+    for thread in load_threads:
+        thread.join()
+
+    if errors:
+        print(f"Error discovering files: {errors[0]}")
+    return {**stats, "all_valid": all_valid}
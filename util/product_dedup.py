@@ -0,0 +1,267 @@
+"""
+模块名称: 客户端商品去重
+描述: 取代 tb_data_product 转换中的 ROW_NUMBER() 窗口. 服务端只做无序的顺序扫描,
+客户端按 (marketplace, root_category_id, asin) 在哈希表中只保留排序最靠前的一行
+(与 ORDER BY breadcrumb_path_category_ids DESC, seller_id_mode DESC, image_url DESC 相同),
+超出内存上限时把哈希表按键排序写入磁盘有序段, 最后多路归并取每个键的最优行.
+最优行按卖家拆分、按 | 拆出 category_id0..6 后, 由调用方批量 LOAD DATA.
+"""
+
+import heapq
+import pickle
+import tempfile
+from itertools import groupby
+from operator import itemgetter
+from typing import Callable, Iterable, Iterator
+
+DEFAULT_DEDUP_MEMORY_BYTES = 256 * 1024 * 1024
+# 每个键在内存中除字段本身外的大致开销 (字典槽位、键元组、行元组、排序键)
+ENTRY_OVERHEAD_BYTES = 400
+SPILL_BUFFER_SIZE = 1024 * 1024
+DEDUP_FETCH_SIZE = 10000
+CATEGORY_LEVELS = 7
+
+# 从 tb_sales_estimates_weekly_v2 读取的列, 顺序即行元组的顺序
+PRODUCT_SOURCE_FIELDS = (
+    "created_datetime",
+    "modified_datetime",
+    "marketplace",
+    "root_category_id",
+    "asin",
+    "brand",
+    "name",
+    "image_url",
+    "breadcrumb_path_category_ids",
+    "first_date_available",
+    "seller_id_mode",
+    "seller_types",
+)
+# 写入 tb_data_product 的列, 与 SQL 转换的 INSERT 列清单一致
+DATA_PRODUCT_FIELDS = (
+    "marketplace",
+    "root_category_id",
+    "asin",
+    "seller_id",
+    "brand",
+    "name",
+    "image_url",
+    "category_path",
+    "category_name",
+    *(f"category_id{level}" for level in range(CATEGORY_LEVELS)),
+    "first_date_available",
+    "seller_num",
+    "seller_types",
+    "data_type",
+    "created_datetime",
+    "modified_datetime",
+)
+_FIELD_INDEX = {field: index for index, field in enumerate(PRODUCT_SOURCE_FIELDS)}
+_KEY_INDEXES = tuple(
+    _FIELD_INDEX[field] for field in ("marketplace", "root_category_id", "asin")
+)
+_ORDER_INDEXES = tuple(
+    _FIELD_INDEX[field]
+    for field in ("breadcrumb_path_category_ids", "seller_id_mode", "image_url")
+)
+
+
+def product_key(row: tuple) -> tuple:
+    return tuple(row[index] for index in _KEY_INDEXES)
+
+
+def product_order(row: tuple) -> tuple:
+    """
+    行的排序键, 越大越靠前. DESC 排序时 NULL 在最后, 因此 NULL 小于任何字符串;
+    Python 按码点比较字符串, 与 utf8mb4_0900_bin 的字节序一致.
+    """
+    return tuple(
+        (row[index] is not None, row[index] or "") for index in _ORDER_INDEXES
+    )
+
+
+def _row_bytes(row: tuple) -> int:
+    return ENTRY_OVERHEAD_BYTES + sum(
+        len(value) for value in row if isinstance(value, str)
+    )
+
+
+def _write_run(entries: dict, spill_dir: str) -> str:
+    fd, run_path = tempfile.mkstemp(prefix="best_", dir=spill_dir)
+    with open(fd, "wb", buffering=SPILL_BUFFER_SIZE) as f:
+        for key in sorted(entries):
+            pickle.dump((key, *entries[key]), f, pickle.HIGHEST_PROTOCOL)
+    return run_path
+
+
+def _read_run(run_path: str) -> Iterator[tuple]:
+    with open(run_path, "rb", buffering=SPILL_BUFFER_SIZE) as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
+
+
+class BestRowReducer:
+    """
+    内存有上限的 "每个键只保留最优行" 归约器. 用法:
+
+        with BestRowReducer(product_key, product_order) as reducer:
+            for row in rows:
+                reducer.add(row)
+            for row in reducer.iter_best():
+                ...
+    """
+
+    def __init__(
+        self,
+        key_fn: Callable[[tuple], tuple],
+        order_fn: Callable[[tuple], tuple],
+        max_memory_bytes: int = DEFAULT_DEDUP_MEMORY_BYTES,
+        spill_dir: str | None = None,
+    ):
+        """
+        :param key_fn: 行 -> 去重键.
+        :param order_fn: 行 -> 排序键, 同一个键保留排序键最大的行.
+        :param max_memory_bytes: 哈希表的估算内存上限, 超出后写入有序段.
+        :param spill_dir: 有序段所在目录, 默认为系统临时目录.
+        """
+        self.key_fn = key_fn
+        self.order_fn = order_fn
+        self.max_memory_bytes = max_memory_bytes
+        self.spill_dir = spill_dir
+        # {键: (排序键, 行)}
+        self._entries: dict[tuple, tuple] = {}
+        self._memory_bytes = 0
+        self._run_dir: tempfile.TemporaryDirectory | None = None
+        self._run_paths: list[str] = []
+
+    def __enter__(self) -> "BestRowReducer":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def add(self, row: tuple) -> None:
+        key = self.key_fn(row)
+        order = self.order_fn(row)
+        current = self._entries.get(key)
+        if current is None:
+            self._memory_bytes += _row_bytes(row)
+        elif order > current[0]:
+            self._memory_bytes += _row_bytes(row) - _row_bytes(current[1])
+        else:
+            return
+        self._entries[key] = (order, row)
+        if self._memory_bytes >= self.max_memory_bytes:
+            self._spill()
+
+    def add_all(self, rows: Iterable[tuple]) -> None:
+        for row in rows:
+            self.add(row)
+
+    def _spill(self) -> None:
+        if self._run_dir is None:
+            self._run_dir = tempfile.TemporaryDirectory(
+                prefix="dedup_", dir=self.spill_dir
+            )
+        self._run_paths.append(_write_run(self._entries, self._run_dir.name))
+        self._entries, self._memory_bytes = {}, 0
+
+    def iter_best(self) -> Iterator[tuple]:
+        """
+        按键的顺序产出每个键的最优行. 有序段之间同一个键可能出现多次, 归并时取排序键最大的一行.
+        """
+        if not self._run_paths:
+            for key in sorted(self._entries):
+                yield self._entries[key][1]
+            return
+        print(f"product dedup spilled {len(self._run_paths)} runs")
+        in_memory = (
+            (key, *self._entries[key]) for key in sorted(self._entries)
+        )
+        merged = heapq.merge(
+            *(_read_run(run_path) for run_path in self._run_paths),
+            in_memory,
+            key=itemgetter(0),
+        )
+        for _, entries in groupby(merged, key=itemgetter(0)):
+            yield max(entries, key=itemgetter(1))[2]
+
+    def close(self) -> None:
+        self._entries = {}
+        if self._run_dir is not None:
+            self._run_dir.cleanup()
+            self._run_dir = None
+        self._run_paths = []
+
+
+def split_sellers(seller_id_mode: str | None) -> tuple[list[str | None], int | None]:
+    """
+    与递归 CTE 相同的卖家拆分: 剩余部分为空时停止, 末尾的一个 | 不产生额外的卖家但计入卖家数.
+
+    :return: (卖家列表, 卖家数), NULL 时为 ([None], None).
+    """
+    if seller_id_mode is None:
+        return [None], None
+    seller_ids = seller_id_mode.split("|")
+    seller_num = len(seller_ids)
+    if seller_num > 1 and seller_ids[-1] == "":
+        seller_ids.pop()
+    return seller_ids, seller_num
+
+
+def split_categories(breadcrumb: str | None) -> list[str | None]:
+    """
+    拆出 category_id0..6, 层级不足的为 NULL. 与 SUBSTRING_INDEX 一致, 超过 7 级的部分忽略.
+    """
+    if breadcrumb is None:
+        return [None] * CATEGORY_LEVELS
+    levels = breadcrumb.split("|")[:CATEGORY_LEVELS]
+    return levels + [None] * (CATEGORY_LEVELS - len(levels))
+
+
+def iter_product_rows(best_row: tuple) -> Iterator[tuple]:
+    """
+    把一个键的最优行展开为 tb_data_product 的行 (每个卖家一行), 列顺序为 DATA_PRODUCT_FIELDS.
+    """
+    row = dict(zip(PRODUCT_SOURCE_FIELDS, best_row))
+    breadcrumb = row["breadcrumb_path_category_ids"]
+    categories = split_categories(breadcrumb)
+    seller_ids, seller_num = split_sellers(row["seller_id_mode"])
+    for seller_id in seller_ids:
+        yield (
+            row["marketplace"],
+            row["root_category_id"],
+            row["asin"],
+            seller_id,
+            row["brand"],
+            row["name"],
+            row["image_url"],
+            None if breadcrumb is None else breadcrumb.replace("|", " > "),
+            categories[0],
+            *categories,
+            row["first_date_available"],
+            seller_num,
+            row["seller_types"],
+            0,
+            row["created_datetime"],
+            row["modified_datetime"],
+        )
+
+
+def _encode_value(value) -> bytes:
+    # 取自数据库的值需转义反斜杠, 否则 LOAD DATA 会再次解释转义序列
+    if value is None:
+        return b"\\N"
+    text = str(value).replace("\\", "\\\\").replace('"', '""')
+    return f'"{text}"'.encode("utf-8")
+
+
+def iter_product_records(best_rows: Iterable[tuple]) -> Iterator[bytes]:
+    """
+    把最优行编码为 LOAD DATA 可识别的 CSV 记录, 列顺序为 DATA_PRODUCT_FIELDS.
+    """
+    for best_row in best_rows:
+        for product_row in iter_product_rows(best_row):
+            yield b",".join(map(_encode_value, product_row)) + b"\n"
@@ -0,0 +1,240 @@
+"""
+模块名称: 加载时拆分卖家
+描述: 加载 tb_sales_estimates_weekly_v2 的同时生成 tb_data_week 的行, 取代 WITH RECURSIVE SplitSellerId.
+pandas 按块读取同一批文件, 向量化地按 | 拆分 seller_id_mode (每个卖家一行), 经命名管道流式 LOAD DATA
+到会话临时表 (同一批文件中按 tb_data_week 主键重复的行只保留最先出现的一行, 与原始表的 LOAD DATA
+跳过重复键一致); 按卖家数均摊的指标在 LOAD DATA 的 SET 子句中以 DECIMAL 计算, 与 SQL 转换的取值、舍入和
+行指纹一致. 再以与 SQL 转换相同的 ON DUPLICATE KEY UPDATE 合并到 tb_data_week, 重新加载的文件会
+更新已有的行. 与原始数据同一事务提交.
+"""
+
+from typing import Iterator
+
+import pandas as pd
+
+from util.infile_stream import fifo_infile
+from util.insert_loader import DEFAULT_CHUNK_ROWS, iter_file_frames
+from util.load_plan import LoadPlan
+from util.transform_engine import (
+    DATA_WEEK_FINGERPRINT_FIELDS,
+    SQL_DATA_WEEK_ON_DUPLICATE,
+    fingerprint_sql,
+)
+
+WEEK_TABLE_NAME = "db_junglescout_amazon.tb_data_week"
+WEEK_STAGING_TABLE = "tmp_data_week_explode"
+WEEK_KEY_FIELDS = (
+    "marketplace",
+    "root_category_id",
+    "year",
+    "week",
+    "start_date",
+    "end_date",
+    "asin",
+)
+WEEK_ATTRIBUTE_FIELDS = (
+    "is_available",
+    "category_rank",
+    "subcategory_rank",
+    "price",
+    "review_count",
+    "ratings",
+)
+WEEK_METRIC_FIELDS = (
+    "revenue",
+    "revenue_1p",
+    "revenue_3p",
+    "sales",
+    "sales_1p",
+    "sales_3p",
+)
+WEEK_PRIMARY_KEY_FIELDS = (*WEEK_KEY_FIELDS, "seller_id")
+SELLER_FIELD = "seller_id_mode"
+NULL_FIELD = "\\N"
+# 管道中每行的列顺序, 指标与卖家数读入用户变量
+WEEK_STREAM_COLUMNS = (
+    *WEEK_KEY_FIELDS,
+    "seller_id",
+    *WEEK_ATTRIBUTE_FIELDS,
+    *WEEK_METRIC_FIELDS,
+    "seller_num",
+)
+# 与 SQL 转换相同的指纹: 属性列取装载后的值, 指标按 SQL 转换的 DECIMAL 表达式 (均摊前不舍入) 参与
+_METRIC_SQL = {
+    field: f"CAST(@{field} AS DECIMAL(20, 2)) / CAST(@seller_num AS UNSIGNED)"
+    for field in WEEK_METRIC_FIELDS
+}
+_METRIC_ORG_SQL = {
+    f"{field}_org": f"CAST(@{field} AS DECIMAL(20, 2))" for field in WEEK_METRIC_FIELDS
+}
+_WEEK_FINGERPRINT_SQL = fingerprint_sql(
+    tuple(
+        _METRIC_SQL.get(field) or _METRIC_ORG_SQL.get(field) or field
+        for field in DATA_WEEK_FINGERPRINT_FIELDS
+    )
+)
+
+# 临时表不能分区, 不能 LIKE 分区表, 按列建表; 不建主键, 重复键在合并时处理
+_WEEK_STAGING_COLUMNS = ", ".join(
+    (
+        *WEEK_KEY_FIELDS,
+        "seller_id",
+        *WEEK_ATTRIBUTE_FIELDS,
+        *WEEK_METRIC_FIELDS,
+        *(f"{field}_org" for field in WEEK_METRIC_FIELDS),
+        "created_datetime",
+        "modified_datetime",
+        "row_fingerprint",
+    )
+)
+SQL_CREATE_WEEK_STAGING = f"""
+    CREATE TEMPORARY TABLE {WEEK_STAGING_TABLE}
+    SELECT {_WEEK_STAGING_COLUMNS} FROM {WEEK_TABLE_NAME} LIMIT 0
+"""
+
+SQL_LOAD_DATA_WEEK = f"""
+    LOAD DATA LOCAL INFILE %s
+    INTO TABLE {WEEK_STAGING_TABLE}
+    FIELDS TERMINATED BY ','
+    ENCLOSED BY '\"'
+    LINES TERMINATED BY '\\n'
+    ({", ".join(WEEK_KEY_FIELDS)}, seller_id, {", ".join(WEEK_ATTRIBUTE_FIELDS)},
+     {", ".join(f"@{field}" for field in WEEK_METRIC_FIELDS)}, @seller_num)
+    SET
+    {", ".join(f"{field} = {_METRIC_SQL[field]}" for field in WEEK_METRIC_FIELDS)},
+    {", ".join(f"{field}_org = @{field}" for field in WEEK_METRIC_FIELDS)},
+    row_fingerprint = {_WEEK_FINGERPRINT_SQL}
+"""
+
+SQL_MERGE_WEEK_STAGING = f"""
+    INSERT INTO {WEEK_TABLE_NAME} ({_WEEK_STAGING_COLUMNS})
+    SELECT {_WEEK_STAGING_COLUMNS} FROM {WEEK_STAGING_TABLE}
+    {SQL_DATA_WEEK_ON_DUPLICATE}
+"""
+
+
+def get_source_columns(load_plan: LoadPlan) -> list[str]:
+    """
+    生成 tb_data_week 所需的、来自文件本身 (而非分区路径) 的列.
+    """
+    return [
+        field
+        for field in (
+            *WEEK_KEY_FIELDS,
+            *WEEK_ATTRIBUTE_FIELDS,
+            *WEEK_METRIC_FIELDS,
+            SELLER_FIELD,
+        )
+        if field in load_plan.expected_csv_headers
+    ]
+
+
+def explode_sellers(frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    按 | 拆分 seller_id_mode, 每个卖家一行, 并附上卖家数 seller_num.
+    与递归 CTE 一致: 剩余部分为空时递归停止, 所以末尾的一个 | 不产生额外的行, 但计入 seller_num;
+    seller_id_mode 为 NULL 时产生一行空卖家, seller_num 为 NULL (指标随之为 NULL).
+
+    :param frame: 字符串列的数据块, NULL 为 \\N.
+    :return: 拆分后的数据块, 包含 seller_id 与 seller_num 列.
+    """
+    frame = frame.reset_index(drop=True)
+    sellers = frame[SELLER_FIELD]
+    is_null = sellers == NULL_FIELD
+    sellers = sellers.mask(is_null, "")
+    seller_num = (sellers.str.count(r"\|") + 1).astype(str).mask(is_null, NULL_FIELD)
+    seller_ids = sellers.str.replace(r"\|$", "", regex=True).str.split("|")
+    return (
+        frame.drop(columns=SELLER_FIELD)
+        .assign(seller_id=seller_ids, seller_num=seller_num)
+        .explode("seller_id")
+    )
+
+
+def drop_duplicate_week_rows(frame: pd.DataFrame, seen_keys: set[str]) -> pd.DataFrame:
+    """
+    按 tb_data_week 主键去重, 保留最先出现的行. 临时表合并时 ON DUPLICATE KEY UPDATE 会让后出现的行覆盖先出现的,
+    而原始表的 LOAD DATA 保留先出现的, 所以在写入管道前去重.
+
+    :param frame: explode_sellers 的返回值.
+    :param seen_keys: 同一批文件此前的数据块中出现过的主键, 原地更新.
+    :return: 去重后的数据块.
+    """
+    keys = frame[WEEK_PRIMARY_KEY_FIELDS[0]]
+    for field in WEEK_PRIMARY_KEY_FIELDS[1:]:
+        keys = keys + "\x1f" + frame[field]
+    is_first = ~keys.duplicated() & ~keys.isin(seen_keys)
+    seen_keys.update(keys[is_first])
+    # explode 之后索引有重复, 按位置过滤
+    return frame[is_first.to_numpy()]
+
+
+def encode_frame(frame: pd.DataFrame, columns: tuple[str, ...]) -> bytes:
+    """
+    按列向量化编码为 LOAD DATA 可识别的 CSV 字节, \\N 原样输出为 NULL.
+    """
+    encoded = None
+    for column in columns:
+        values = frame[column]
+        quoted = ('"' + values.str.replace('"', '""', regex=False) + '"').mask(
+            values == NULL_FIELD, NULL_FIELD
+        )
+        encoded = quoted if encoded is None else encoded + "," + quoted
+    return ("\n".join(encoded) + "\n").encode("utf-8")
+
+
+def iter_week_records(
+    file_paths: list[str],
+    load_plan: LoadPlan,
+    partition_values: tuple[str, ...],
+    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+) -> Iterator[bytes]:
+    """
+    读取同一分区的文件, 产出 tb_data_week 的 CSV 字节块, 可直接交给 fifo_infile.
+
+    :param file_paths: 同一分区目录下的文件列表.
+    :param load_plan: tb_sales_estimates_weekly_v2 的加载计划.
+    :param partition_values: 分区值, 补齐文件中没有的键列.
+    :param chunk_rows: 每次读取的行数.
+    :return: 字节块迭代器.
+    """
+    source_columns = get_source_columns(load_plan)
+    partition_kv = dict(zip(load_plan.partition_fields, partition_values))
+    seen_keys: set[str] = set()
+    for file_path in file_paths:
+        for frame in iter_file_frames(file_path, source_columns, chunk_rows):
+            if frame.empty:
+                continue
+            # Parquet 读出的是原生类型, 统一转为字符串, null 编码为 \N
+            frame = frame.astype(object).where(frame.notna(), NULL_FIELD).astype(str)
+            frame = frame.assign(**partition_kv)
+            frame = drop_duplicate_week_rows(explode_sellers(frame), seen_keys)
+            if not frame.empty:
+                yield encode_frame(frame, WEEK_STREAM_COLUMNS)
+
+
+def load_week_records(
+    cursor,
+    file_paths: list[str],
+    load_plan: LoadPlan,
+    partition_values: tuple[str, ...],
+) -> int:
+    """
+    在调用方的事务中把同一分区文件拆分卖家后的行合并到 tb_data_week, 由调用方提交.
+
+    :param cursor: 加载连接的游标.
+    :param file_paths: 同一分区目录下的文件列表.
+    :param load_plan: tb_sales_estimates_weekly_v2 的加载计划.
+    :param partition_values: 分区值.
+    :return: 合并时受影响的行数.
+    """
+    cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS {WEEK_STAGING_TABLE}")
+    cursor.execute(SQL_CREATE_WEEK_STAGING)
+    with fifo_infile(
+        iter_week_records(file_paths, load_plan, partition_values)
+    ) as infile_path:
+        cursor.execute(SQL_LOAD_DATA_WEEK, (infile_path,))
+    cursor.execute(SQL_MERGE_WEEK_STAGING)
+    rowcount = cursor.rowcount
+    cursor.execute(f"DROP TEMPORARY TABLE {WEEK_STAGING_TABLE}")
+    return rowcount
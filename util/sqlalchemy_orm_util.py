@@ -1,8 +1,9 @@
 from typing import Type
 
-from sqlalchemy import Column, create_engine, inspect
+from sqlalchemy import Column, create_engine, inspect, text
 from sqlalchemy.ext.declarative import DeclarativeMeta
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.schema import CreateColumn, CreateIndex
 
 from config.config import DB_CONFIG  # 引入配置
 
@@ -48,3 +49,48 @@ def get_class_fields(cls: type) -> list[str]:
     :return: 字段名列表.
     """
     return [column.name for column in inspect(cls).c]
+
+
+def ensure_table_schema(
+    class_obj: DeclarativeMeta,
+    db_config=DB_CONFIG,
+    primary_key_migrations: tuple[str, ...] = (),
+) -> None:
+    """
+    为已存在的表补齐 ORM 中新增的字段和索引, 主键与 ORM 不一致时重建主键 (create_all 不会修改已存在的表).
+
+    :param class_obj: 具体的 ORM 类.
+    :param primary_key_migrations: 重建主键前执行的 SQL, 例如为旧行补齐新主键字段.
+    """
+    engine = create_engine(
+        f"mysql+mysqlconnector://{db_config['user']}:{db_config['password']}@{db_config['host']}/{db_config['database']}"
+    )
+    table = class_obj.__table__
+    inspector = inspect(engine)
+    existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+    existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+    existing_primary_key = inspector.get_pk_constraint(table.name)["constrained_columns"]
+    primary_key = [column.name for column in table.primary_key.columns]
+
+    with engine.begin() as connection:
+        for column in table.columns:
+            if column.name not in existing_columns:
+                column_ddl = CreateColumn(column).compile(dialect=engine.dialect)
+                connection.execute(
+                    text(f"ALTER TABLE {table.name} ADD COLUMN {column_ddl}")
+                )
+                print(f"Column {table.name}.{column.name} added.")
+        if existing_primary_key != primary_key:
+            for sql in primary_key_migrations:
+                connection.execute(text(sql))
+            connection.execute(
+                text(
+                    f"ALTER TABLE {table.name} DROP PRIMARY KEY, ADD PRIMARY KEY ({', '.join(primary_key)})"
+                )
+            )
+            print(f"Primary key of {table.name} changed to {primary_key}.")
+        for index in table.indexes:
+            if index.name not in existing_indexes:
+                connection.execute(CreateIndex(index))
+                print(f"Index {table.name}.{index.name} added.")
+    engine.dispose()
@@ -0,0 +1,111 @@
+"""
+模块名称: 暂存表加载
+描述: 先把一批文件 LOAD DATA 到没有主键、没有分区的暂存表, 再用一条按主键排序的
+INSERT ... SELECT 合并进正式表. 正式表只做一次有序的索引维护, 加载到一半的批次只存在于暂存表中,
+对读取正式表的查询不可见. 每个加载线程独占一张暂存表.
+"""
+
+import queue
+from contextlib import contextmanager
+
+from model import base_model
+from util.load_plan import LoadPlan
+from util.mysql_pool import POOL_LOAD, get_connection
+
+STAGING_TABLE_SUFFIX = "_staging"
+
+
+def get_primary_key_fields(class_obj: base_model.BaseModel) -> list[str]:
+    """
+    获取 ORM 类的主键字段 (按主键定义顺序).
+    """
+    return [column.name for column in class_obj.__table__.primary_key.columns]
+
+
+def build_merge_sql(load_plan: LoadPlan, staging_table: str) -> str:
+    """
+    从暂存表合并到正式表的语句. 与 LOAD DATA LOCAL 一致, 主键重复的行被忽略;
+    按主键排序插入, 使 B+ 树按顺序追加而不是随机分裂.
+
+    :param load_plan: 加载计划.
+    :param staging_table: 暂存表名.
+    :return: INSERT ... SELECT 语句.
+    """
+    order_by = ", ".join(get_primary_key_fields(load_plan.class_obj))
+    return f"""
+        INSERT IGNORE INTO {load_plan.table_name} ({load_plan.stream_columns})
+        SELECT {load_plan.stream_columns}
+        FROM {staging_table}
+        {f"ORDER BY {order_by}" if order_by else ""}
+    """
+
+
+class StagingTables:
+    """
+    某个正式表的一组暂存表, 数量与加载线程数一致, 借出后独占使用.
+    """
+
+    def __init__(self, table_name: str, size: int = 1, pool_name: str = POOL_LOAD):
+        """
+        :param table_name: 正式表名.
+        :param size: 暂存表数量, 一般为加载线程数.
+        :param pool_name: 执行建表语句使用的连接池.
+        """
+        self.table_name = table_name
+        self.pool_name = pool_name
+        self.names = [
+            f"{table_name}{STAGING_TABLE_SUFFIX}_{i}" for i in range(max(1, size))
+        ]
+        self._available: queue.Queue = queue.Queue()
+
+    def create(self) -> None:
+        """
+        按正式表当前的列重建暂存表 (不复制主键、索引和分区), 同时清理上次中断留下的暂存数据.
+        """
+        with get_connection(self.pool_name) as connection:
+            with connection.cursor() as cursor:
+                for name in self.names:
+                    cursor.execute(f"DROP TABLE IF EXISTS {name}")
+                    cursor.execute(
+                        f"CREATE TABLE {name} ENGINE = InnoDB "
+                        f"SELECT * FROM {self.table_name} WHERE 1 = 0"
+                    )
+        for name in self.names:
+            self._available.put(name)
+        print(f"staging tables for {self.table_name} created: {len(self.names)}")
+
+    def drop(self) -> None:
+        """
+        删除全部暂存表.
+        """
+        with get_connection(self.pool_name) as connection:
+            with connection.cursor() as cursor:
+                for name in self.names:
+                    cursor.execute(f"DROP TABLE IF EXISTS {name}")
+
+    @contextmanager
+    def acquire(self):
+        """
+        借出一张已清空的暂存表, 退出时归还.
+
+        :return: 暂存表名上下文.
+        """
+        name = self._available.get()
+        try:
+            with get_connection(self.pool_name) as connection:
+                with connection.cursor() as cursor:
+                    cursor.execute(f"TRUNCATE TABLE {name}")
+            yield name
+        finally:
+            self._available.put(name)
+
+    @contextmanager
+    def running(self):
+        """
+        创建暂存表, 退出时删除.
+        """
+        self.create()
+        try:
+            yield self
+        finally:
+            self.drop()
@@ -0,0 +1,743 @@
+"""
+模块名称: 分区转换引擎
+描述: tb_data_product / tb_data_week 的分区转换语句生成器, 可插拔. recursive_cte 为原有实现
+(递归 CTE 逐段拆分 |, SUBSTRING_INDEX 链拆分类目); json_table 把 | 分隔的列表改写为 JSON 数组,
+卖家用 JSON_TABLE 横向展开, 类目层级用 JSON_EXTRACT 按下标读取, 不需要递归和临时表 (MySQL 8.0.4+).
+两者结果一致, 可用 benchmark/transform_engine_benchmark.py 在同一分区上对比耗时.
+每行附带值列的指纹 row_fingerprint, ON DUPLICATE KEY UPDATE 只改写指纹变化的行.
+"""
+
+from util.incremental_transform import build_asin_filter, build_slice_condition
+
+DATA_PRODUCT_TABLE = "db_junglescout_amazon.tb_data_product"
+DATA_WEEK_TABLE = "db_junglescout_amazon.tb_data_week"
+CATEGORY_LEVELS = 7
+
+FINGERPRINT_FIELD = "row_fingerprint"
+# 参与行指纹的值列 (不含主键与 created/modified_datetime)
+DATA_PRODUCT_FINGERPRINT_FIELDS = (
+    "brand",
+    "name",
+    "image_url",
+    "category_path",
+    "category_name",
+    *(f"category_id{level}" for level in range(CATEGORY_LEVELS)),
+    "first_date_available",
+    "seller_num",
+    "seller_types",
+    "data_type",
+)
+DATA_WEEK_FINGERPRINT_FIELDS = (
+    "is_available",
+    "category_rank",
+    "subcategory_rank",
+    "price",
+    "review_count",
+    "ratings",
+    "revenue",
+    "revenue_1p",
+    "revenue_3p",
+    "sales",
+    "sales_1p",
+    "sales_3p",
+    "revenue_org",
+    "revenue_1p_org",
+    "revenue_3p_org",
+    "sales_org",
+    "sales_1p_org",
+    "sales_3p_org",
+)
+
+
+def fingerprint_sql(expressions: tuple[str, ...]) -> str:
+    """
+    行指纹: 各值经 QUOTE 转为文本后以逗号连接, 取 MD5. QUOTE 区分 NULL 与字符串 'NULL' 并转义引号,
+    数值按文本参与, 因此字符串形式的类目 ID (SQL 转换) 与 BIGINT (客户端去重) 得到相同的指纹.
+
+    :param expressions: 按 *_FINGERPRINT_FIELDS 顺序排列的 SQL 表达式.
+    :return: SQL 表达式.
+    """
+    quoted = ", ".join(f"QUOTE({expression})" for expression in expressions)
+    return f"MD5(CONCAT_WS(',', {quoted}))"
+
+
+def build_on_duplicate_sql(update_fields: tuple[str, ...], table_name: str) -> str:
+    """
+    只在行指纹变化时更新的 ON DUPLICATE KEY UPDATE. 指纹相同的行各列赋回原值, 整行不变,
+    InnoDB 不产生写入 (也没有 redo、binlog), modified_datetime 也保持不变.
+    MySQL 按从左到右的顺序赋值, 后面的赋值读到的是前面赋值之后的列值, 所以 row_fingerprint 必须最后赋值.
+    升级前的行指纹为 NULL, 首次运行时各更新一次.
+
+    :param update_fields: 需要更新的列.
+    :param table_name: 目标表, 读取原值时用它限定列名, 避免与 SELECT 中的同名列冲突.
+    :return: ON DUPLICATE KEY UPDATE 子句.
+    """
+    unchanged = f"{table_name}.{FINGERPRINT_FIELD} <=> VALUES({FINGERPRINT_FIELD})"
+    assignments = [
+        f"  {field} = IF({unchanged}, {table_name}.{field}, VALUES({field}))"
+        for field in update_fields
+    ]
+    assignments.append(f"  {FINGERPRINT_FIELD} = VALUES({FINGERPRINT_FIELD})")
+    return "\nON DUPLICATE KEY UPDATE\n" + ",\n".join(assignments) + "\n"
+
+
+DATA_PRODUCT_UPDATE_FIELDS = (*DATA_PRODUCT_FINGERPRINT_FIELDS, "modified_datetime")
+DATA_WEEK_UPDATE_FIELDS = ("modified_datetime", *DATA_WEEK_FINGERPRINT_FIELDS)
+# tb_data_product 已有的行在指纹变化时按新值更新, SQL 转换与客户端去重共用
+SQL_DATA_PRODUCT_ON_DUPLICATE = build_on_duplicate_sql(
+    DATA_PRODUCT_UPDATE_FIELDS, DATA_PRODUCT_TABLE
+)
+# 加载时拆分卖家的 tb_data_week 行经临时表合并, 与 SQL 转换相同的更新规则
+SQL_DATA_WEEK_ON_DUPLICATE = build_on_duplicate_sql(
+    DATA_WEEK_UPDATE_FIELDS, DATA_WEEK_TABLE
+)
+# 转换语句的最终 SELECT 包在派生表 transformed 中, 在外层按列名计算指纹
+_TRANSFORMED_DATA_PRODUCT_FINGERPRINT = fingerprint_sql(
+    tuple(f"transformed.{field}" for field in DATA_PRODUCT_FINGERPRINT_FIELDS)
+)
+_TRANSFORMED_DATA_WEEK_FINGERPRINT = fingerprint_sql(
+    tuple(f"transformed.{field}" for field in DATA_WEEK_FINGERPRINT_FIELDS)
+)
+
+
+def build_week_filter(slices: list[tuple] | None) -> tuple[str, tuple]:
+    """
+    tb_data_week 增量转换的切片过滤, 追加在 FROM ... PARTITION (pN) 之后.
+
+    :param slices: 切片, None 表示不过滤.
+    :return: (WHERE 子句, 参数).
+    """
+    if slices is None:
+        return "", ()
+    slice_condition, params = build_slice_condition(slices)
+    return f"\n    WHERE {slice_condition}", params
+
+
+def build_asin_range_condition(asin_range: tuple) -> tuple[str, tuple]:
+    """
+    分块转换的 asin 区间条件, 走 (marketplace, root_category_id, asin) 二级索引的范围扫描.
+
+    :param asin_range: (marketplace, root_category_id, 起始 asin, 结束 asin), 闭区间.
+    :return: (条件, 参数).
+    """
+    marketplace, root_category_id, first_asin, last_asin = asin_range
+    condition = "marketplace = %s AND root_category_id = %s AND asin BETWEEN %s AND %s"
+    return condition, (marketplace, root_category_id, first_asin, last_asin)
+
+
+def build_product_filter(
+    partition_name: str, slices: list[tuple] | None, asin_range: tuple | None = None
+) -> tuple[str, tuple]:
+    """
+    tb_data_product 转换的过滤: 增量时的 asin 过滤, 分块时再限定 asin 区间.
+
+    :param partition_name: 分区名称.
+    :param slices: 切片, None 表示不过滤.
+    :param asin_range: asin 区间, None 表示不限定.
+    :return: (追加在 FROM ... PARTITION (pN) 之后的 WHERE 子句, 参数).
+    """
+    asin_filter, params = build_asin_filter(partition_name, slices)
+    if asin_range is None:
+        return asin_filter, params
+    range_condition, range_params = build_asin_range_condition(asin_range)
+    keyword = "AND" if asin_filter else "WHERE"
+    return f"{asin_filter}\n    {keyword} {range_condition}", (*params, *range_params)
+
+
+def json_array_sql(column: str) -> str:
+    """
+    把 | 分隔的列表改写为 JSON 字符串数组, 例如 'a|b' -> '["a","b"]'; NULL 仍为 NULL.
+    JSON_QUOTE 负责转义引号和反斜杠, | 不会被转义, 因此可以直接替换为 ",".
+    """
+    return f"""CONCAT('[', REPLACE(JSON_QUOTE({column}), '|', '","'), ']')"""
+
+
+class TransformEngine:
+    """
+    转换语句生成器的接口. 每个方法返回 (INSERT ... SELECT 语句, 参数), 由调用方执行.
+    """
+
+    name = ""
+
+    def build_data_product_sql(
+        self,
+        partition_name: str,
+        slices: list[tuple] | None = None,
+        target_table: str = DATA_PRODUCT_TABLE,
+        asin_range: tuple | None = None,
+    ) -> tuple[str, tuple]:
+        """
+        生成把一个分区的数据转换到 tb_data_product 的语句.
+
+        :param partition_name: 分区名称，例如 p0, p1 等。
+        :param slices: 只重算在这些 (marketplace, root_category_id, year, week) 切片中出现过的 asin
+            (仍按其全部历史行挑选), None 表示整个分区.
+        :param target_table: 目标表, 基准测试时为副本.
+        :param asin_range: 分块转换时只处理 (marketplace, root_category_id, 起始 asin, 结束 asin)
+            闭区间内的 asin, None 表示不限定.
+        :return: (INSERT ... SELECT 语句, 参数).
+        """
+        raise NotImplementedError
+
+    def build_data_week_sql(
+        self,
+        partition_name: str,
+        slices: list[tuple] | None = None,
+        target_table: str = DATA_WEEK_TABLE,
+    ) -> tuple[str, tuple]:
+        """
+        生成把一个分区的数据转换到 tb_data_week 的语句.
+
+        :param partition_name: 分区名称，例如 p0, p1 等。
+        :param slices: 只转换这些 (marketplace, root_category_id, year, week) 切片, None 表示整个分区.
+        :param target_table: 目标表, 基准测试时为副本.
+        :return: (INSERT ... SELECT 语句, 参数).
+        """
+        raise NotImplementedError
+
+
+class RecursiveCteEngine(TransformEngine):
+    """
+    原有实现: WITH RECURSIVE SplitSellerId 逐段拆分卖家.
+    """
+
+    name = "recursive_cte"
+
+    def build_data_product_sql(
+        self,
+        partition_name: str,
+        slices: list[tuple] | None = None,
+        target_table: str = DATA_PRODUCT_TABLE,
+        asin_range: tuple | None = None,
+    ) -> tuple[str, tuple]:
+        asin_filter, params = build_product_filter(partition_name, slices, asin_range)
+        sql_insert = f"""
+        INSERT INTO {target_table} (
+  marketplace,
+  root_category_id,
+  asin,
+  seller_id,
+  brand,
+  name,
+  image_url,
+  category_path,
+  category_name,
+  category_id0,
+  category_id1,
+  category_id2,
+  category_id3,
+  category_id4,
+  category_id5,
+  category_id6,
+  first_date_available,
+  seller_num,
+  seller_types,
+  data_type,
+  created_datetime,
+  modified_datetime,
+  row_fingerprint
+)
+WITH RECURSIVE SplitSellerId AS (
+  SELECT 
+    created_datetime,
+    modified_datetime,
+    marketplace,
+    root_category_id,
+    asin,
+    brand,
+    name,
+    image_url, 
+    breadcrumb_path_category_ids, 
+    first_date_available,
+    SUBSTRING_INDEX(seller_id_mode, '|', 1) AS seller_id,
+    SUBSTRING(seller_id_mode, LENGTH(SUBSTRING_INDEX(seller_id_mode, '|', 1)) + 2) AS remaining_sellers,
+    seller_types,
+    (LENGTH(seller_id_mode) - LENGTH(REPLACE(seller_id_mode, '|', '')) + 1) AS seller_num
+  FROM (
+    SELECT
+      created_datetime,
+      modified_datetime,
+      marketplace,
+      root_category_id,
+    YEAR,
+    week,
+      asin,
+      brand,
+      name,
+      image_url, 
+      breadcrumb_path_category_ids,  
+    first_date_available,
+      seller_id_mode,
+      seller_types,
+      ROW_NUMBER() OVER (PARTITION BY marketplace, root_category_id, asin ORDER BY breadcrumb_path_category_ids DESC, seller_id_mode DESC, image_url DESC) AS rn
+    FROM
+      db_junglescout_amazon.tb_sales_estimates_weekly_v2 
+    PARTITION ({partition_name}){asin_filter}
+    
+      
+  ) AS RandomSelection
+  WHERE rn = 1
+  
+  UNION ALL
+
+  SELECT 
+    created_datetime,
+    modified_datetime,
+    marketplace,
+    root_category_id,
+    asin,
+    brand,
+    name,
+    image_url,
+    breadcrumb_path_category_ids, 
+    first_date_available,
+    SUBSTRING_INDEX(remaining_sellers, '|', 1) AS seller_id,
+    SUBSTRING(remaining_sellers, LENGTH(SUBSTRING_INDEX(remaining_sellers, '|', 1)) + 2) AS remaining_sellers,
+    seller_types,
+    seller_num
+  FROM 
+    SplitSellerId
+  WHERE 
+    remaining_sellers != ''
+)
+
+SELECT transformed.*, {_TRANSFORMED_DATA_PRODUCT_FINGERPRINT} AS row_fingerprint
+FROM (
+SELECT 
+  marketplace,
+  root_category_id,
+  asin,
+  seller_id,
+  brand,
+  name,
+  image_url, 
+  REPLACE(breadcrumb_path_category_ids, '|', ' > ') AS category_path,
+  SUBSTRING_INDEX(breadcrumb_path_category_ids, '|', 1) AS category_name,
+  SUBSTRING_INDEX(breadcrumb_path_category_ids, '|', 1) AS category_id0,
+  CASE WHEN LENGTH(breadcrumb_path_category_ids) - LENGTH(REPLACE(breadcrumb_path_category_ids, '|', '')) >= 1
+       THEN SUBSTRING_INDEX(SUBSTRING_INDEX(breadcrumb_path_category_ids, '|', 2), '|', -1) END AS category_id1,
+  CASE WHEN LENGTH(breadcrumb_path_category_ids) - LENGTH(REPLACE(breadcrumb_path_category_ids, '|', '')) >= 2
+       THEN SUBSTRING_INDEX(SUBSTRING_INDEX(breadcrumb_path_category_ids, '|', 3), '|', -1) END AS category_id2,
+  CASE WHEN LENGTH(breadcrumb_path_category_ids) - LENGTH(REPLACE(breadcrumb_path_category_ids, '|', '')) >= 3
+       THEN SUBSTRING_INDEX(SUBSTRING_INDEX(breadcrumb_path_category_ids, '|', 4), '|', -1) END AS category_id3,
+  CASE WHEN LENGTH(breadcrumb_path_category_ids) - LENGTH(REPLACE(breadcrumb_path_category_ids, '|', '')) >= 4
+       THEN SUBSTRING_INDEX(SUBSTRING_INDEX(breadcrumb_path_category_ids, '|', 5), '|', -1) END AS category_id4,
+  CASE WHEN LENGTH(breadcrumb_path_category_ids) - LENGTH(REPLACE(breadcrumb_path_category_ids, '|', '')) >= 5
+       THEN SUBSTRING_INDEX(SUBSTRING_INDEX(breadcrumb_path_category_ids, '|', 6), '|', -1) END AS category_id5,
+  CASE WHEN LENGTH(breadcrumb_path_category_ids) - LENGTH(REPLACE(breadcrumb_path_category_ids, '|', '')) >= 6
+       THEN SUBSTRING_INDEX(SUBSTRING_INDEX(breadcrumb_path_category_ids, '|', 7), '|', -1) END AS category_id6,
+  first_date_available,
+  seller_num,
+  seller_types,
+  '0' as data_type,
+  created_datetime,
+  modified_datetime
+FROM 
+  SplitSellerId
+) AS transformed
+{build_on_duplicate_sql(DATA_PRODUCT_UPDATE_FIELDS, target_table)};
+        """
+        return sql_insert, params
+
+    def build_data_week_sql(
+        self,
+        partition_name: str,
+        slices: list[tuple] | None = None,
+        target_table: str = DATA_WEEK_TABLE,
+    ) -> tuple[str, tuple]:
+        slice_filter, params = build_week_filter(slices)
+        sql_insert = f"""
+INSERT INTO {target_table} (
+  created_datetime,
+  modified_datetime,
+  marketplace,
+  root_category_id,
+  year,
+  week,
+  start_date,
+  end_date,
+  asin,
+  seller_id,
+  is_available,
+  category_rank,
+  subcategory_rank,
+  price,
+  review_count,
+  ratings,
+  revenue,
+  revenue_1p,
+  revenue_3p,
+  sales,
+  sales_1p,
+  sales_3p,
+  revenue_org,
+  revenue_1p_org,
+  revenue_3p_org,
+  sales_org,
+  sales_1p_org,
+  sales_3p_org,
+  row_fingerprint
+)
+WITH RECURSIVE SplitSellerId AS (
+  SELECT
+    created_datetime,
+    modified_datetime,
+    marketplace,
+    root_category_id,
+    year,
+    week,
+    start_date,
+    end_date,
+    is_available,
+    category_rank,
+    subcategory_rank,
+    price,
+    review_count,
+    ratings,
+    revenue,
+    revenue_1p,
+    revenue_3p,
+    sales,
+    sales_1p,
+    sales_3p,
+    SUBSTRING_INDEX(seller_id_mode, '|', 1) AS seller_id,
+    SUBSTRING(seller_id_mode, LENGTH(SUBSTRING_INDEX(seller_id_mode, '|', 1)) + 2) AS remaining_sellers,
+    asin,
+    (LENGTH(seller_id_mode) - LENGTH(REPLACE(seller_id_mode, '|', '')) + 1) AS seller_num
+  FROM (
+    SELECT
+      created_datetime,
+      modified_datetime,
+      marketplace,
+      root_category_id,
+      year,
+      week,
+      start_date,
+      end_date,
+      asin,
+      is_available,
+      category_rank,
+      subcategory_rank,
+      price,
+      review_count,
+      ratings,
+      revenue,
+      revenue_1p,
+      revenue_3p,
+      sales,
+      sales_1p,
+      sales_3p,
+      seller_id_mode
+    FROM
+      db_junglescout_amazon.tb_sales_estimates_weekly_v2
+      PARTITION ({partition_name}){slice_filter}
+  ) AS RandomSelection
+  UNION ALL
+  SELECT
+    created_datetime,
+    modified_datetime,
+    marketplace,
+    root_category_id,
+    year,
+    week,
+    start_date,
+    end_date,
+    is_available,
+    category_rank,
+    subcategory_rank,
+    price,
+    review_count,
+    ratings,
+    revenue,
+    revenue_1p,
+    revenue_3p,
+    sales,
+    sales_1p,
+    sales_3p,
+    SUBSTRING_INDEX(remaining_sellers, '|', 1) AS seller_id,
+    SUBSTRING(remaining_sellers, LENGTH(SUBSTRING_INDEX(remaining_sellers, '|', 1)) + 2) AS remaining_sellers,
+    asin,
+    seller_num
+  FROM
+    SplitSellerId
+  WHERE
+    remaining_sellers != ''
+)
+
+
+SELECT transformed.*, {_TRANSFORMED_DATA_WEEK_FINGERPRINT} AS row_fingerprint
+FROM (
+SELECT
+  created_datetime,
+  modified_datetime,
+  marketplace,
+  root_category_id,
+  year,
+  week,
+  start_date,
+  end_date,
+  asin,
+  seller_id,
+  is_available,
+  category_rank,
+  subcategory_rank,
+  price,
+  review_count,
+  ratings,
+  revenue / seller_num AS revenue,
+  revenue_1p / seller_num AS revenue_1p,
+  revenue_3p / seller_num AS revenue_3p,
+  sales / seller_num AS sales,
+  sales_1p / seller_num AS sales_1p,
+  sales_3p / seller_num AS sales_3p,
+  revenue AS revenue_org,
+  revenue_1p AS revenue_1p_org,
+  revenue_3p AS revenue_3p_org,
+  sales AS sales_org,
+  sales_1p AS sales_1p_org,
+  sales_3p AS sales_3p_org
+FROM
+  SplitSellerId
+) AS transformed
+{build_on_duplicate_sql(DATA_WEEK_UPDATE_FIELDS, target_table)};
+        """
+        return sql_insert, params
+
+
+class JsonTableEngine(TransformEngine):
+    """
+    JSON_TABLE 实现: 每行的卖家列表一次展开, 类目层级按下标读取.
+    与递归 CTE 一致: 末尾的一个 | 不产生额外的卖家 (递归在剩余部分为空时停止), 但计入 seller_num;
+    seller_id_mode 为 NULL 时保留一行 (LEFT JOIN), 卖家与 seller_num 为 NULL.
+    """
+
+    name = "json_table"
+
+    # 剔除末尾空段展开出的卖家
+    _TRAILING_EMPTY_SELLER = """
+  AND NOT COALESCE(
+    sellers.seller_ord > 1 AND sellers.seller_ord = src.seller_num AND sellers.seller_id = '',
+    FALSE
+  )"""
+
+    def build_data_product_sql(
+        self,
+        partition_name: str,
+        slices: list[tuple] | None = None,
+        target_table: str = DATA_PRODUCT_TABLE,
+        asin_range: tuple | None = None,
+    ) -> tuple[str, tuple]:
+        asin_filter, params = build_product_filter(partition_name, slices, asin_range)
+        category_columns = ",\n".join(
+            f"  JSON_UNQUOTE(JSON_EXTRACT(src.categories, '$[{level}]')) AS category_id{level}"
+            for level in range(CATEGORY_LEVELS)
+        )
+        sql_insert = f"""
+INSERT INTO {target_table} (
+  marketplace,
+  root_category_id,
+  asin,
+  seller_id,
+  brand,
+  name,
+  image_url,
+  category_path,
+  category_name,
+  category_id0,
+  category_id1,
+  category_id2,
+  category_id3,
+  category_id4,
+  category_id5,
+  category_id6,
+  first_date_available,
+  seller_num,
+  seller_types,
+  data_type,
+  created_datetime,
+  modified_datetime,
+  row_fingerprint
+)
+SELECT transformed.*, {_TRANSFORMED_DATA_PRODUCT_FINGERPRINT} AS row_fingerprint
+FROM (
+SELECT
+  src.marketplace,
+  src.root_category_id,
+  src.asin,
+  sellers.seller_id,
+  src.brand,
+  src.name,
+  src.image_url,
+  REPLACE(src.breadcrumb_path_category_ids, '|', ' > ') AS category_path,
+  JSON_UNQUOTE(JSON_EXTRACT(src.categories, '$[0]')) AS category_name,
+{category_columns},
+  src.first_date_available,
+  src.seller_num,
+  src.seller_types,
+  '0' AS data_type,
+  src.created_datetime,
+  src.modified_datetime
+FROM (
+  SELECT
+    picked.*,
+    {json_array_sql("picked.seller_id_mode")} AS sellers,
+    JSON_LENGTH({json_array_sql("picked.seller_id_mode")}) AS seller_num,
+    {json_array_sql("picked.breadcrumb_path_category_ids")} AS categories
+  FROM (
+    SELECT
+      created_datetime,
+      modified_datetime,
+      marketplace,
+      root_category_id,
+      asin,
+      brand,
+      name,
+      image_url,
+      breadcrumb_path_category_ids,
+      first_date_available,
+      seller_id_mode,
+      seller_types,
+      ROW_NUMBER() OVER (PARTITION BY marketplace, root_category_id, asin ORDER BY breadcrumb_path_category_ids DESC, seller_id_mode DESC, image_url DESC) AS rn
+    FROM
+      db_junglescout_amazon.tb_sales_estimates_weekly_v2
+    PARTITION ({partition_name}){asin_filter}
+  ) AS picked
+  WHERE picked.rn = 1
+) AS src
+LEFT JOIN JSON_TABLE(
+  src.sellers, '$[*]' COLUMNS (seller_ord FOR ORDINALITY, seller_id VARCHAR(1000) PATH '$')
+) AS sellers ON TRUE
+WHERE TRUE{self._TRAILING_EMPTY_SELLER}
+) AS transformed
+{build_on_duplicate_sql(DATA_PRODUCT_UPDATE_FIELDS, target_table)};
+        """
+        return sql_insert, params
+
+    def build_data_week_sql(
+        self,
+        partition_name: str,
+        slices: list[tuple] | None = None,
+        target_table: str = DATA_WEEK_TABLE,
+    ) -> tuple[str, tuple]:
+        slice_filter, params = build_week_filter(slices)
+        sql_insert = f"""
+INSERT INTO {target_table} (
+  created_datetime,
+  modified_datetime,
+  marketplace,
+  root_category_id,
+  year,
+  week,
+  start_date,
+  end_date,
+  asin,
+  seller_id,
+  is_available,
+  category_rank,
+  subcategory_rank,
+  price,
+  review_count,
+  ratings,
+  revenue,
+  revenue_1p,
+  revenue_3p,
+  sales,
+  sales_1p,
+  sales_3p,
+  revenue_org,
+  revenue_1p_org,
+  revenue_3p_org,
+  sales_org,
+  sales_1p_org,
+  sales_3p_org,
+  row_fingerprint
+)
+SELECT transformed.*, {_TRANSFORMED_DATA_WEEK_FINGERPRINT} AS row_fingerprint
+FROM (
+SELECT
+  src.created_datetime,
+  src.modified_datetime,
+  src.marketplace,
+  src.root_category_id,
+  src.year,
+  src.week,
+  src.start_date,
+  src.end_date,
+  src.asin,
+  sellers.seller_id,
+  src.is_available,
+  src.category_rank,
+  src.subcategory_rank,
+  src.price,
+  src.review_count,
+  src.ratings,
+  src.revenue / src.seller_num AS revenue,
+  src.revenue_1p / src.seller_num AS revenue_1p,
+  src.revenue_3p / src.seller_num AS revenue_3p,
+  src.sales / src.seller_num AS sales,
+  src.sales_1p / src.seller_num AS sales_1p,
+  src.sales_3p / src.seller_num AS sales_3p,
+  src.revenue AS revenue_org,
+  src.revenue_1p AS revenue_1p_org,
+  src.revenue_3p AS revenue_3p_org,
+  src.sales AS sales_org,
+  src.sales_1p AS sales_1p_org,
+  src.sales_3p AS sales_3p_org
+FROM (
+  SELECT
+    raw.*,
+    {json_array_sql("raw.seller_id_mode")} AS sellers,
+    JSON_LENGTH({json_array_sql("raw.seller_id_mode")}) AS seller_num
+  FROM (
+    SELECT
+      created_datetime,
+      modified_datetime,
+      marketplace,
+      root_category_id,
+      year,
+      week,
+      start_date,
+      end_date,
+      asin,
+      is_available,
+      category_rank,
+      subcategory_rank,
+      price,
+      review_count,
+      ratings,
+      revenue,
+      revenue_1p,
+      revenue_3p,
+      sales,
+      sales_1p,
+      sales_3p,
+      seller_id_mode
+    FROM
+      db_junglescout_amazon.tb_sales_estimates_weekly_v2
+      PARTITION ({partition_name}){slice_filter}
+  ) AS raw
+) AS src
+LEFT JOIN JSON_TABLE(
+  src.sellers, '$[*]' COLUMNS (seller_ord FOR ORDINALITY, seller_id VARCHAR(1000) PATH '$')
+) AS sellers ON TRUE
+WHERE TRUE{self._TRAILING_EMPTY_SELLER}
+) AS transformed
+{build_on_duplicate_sql(DATA_WEEK_UPDATE_FIELDS, target_table)};
+        """
+        return sql_insert, params
+
+
+DEFAULT_TRANSFORM_ENGINE = RecursiveCteEngine.name
+TRANSFORM_ENGINES: dict[str, TransformEngine] = {
+    engine.name: engine for engine in (RecursiveCteEngine(), JsonTableEngine())
+}
+
+
+def get_transform_engine(name: str = DEFAULT_TRANSFORM_ENGINE) -> TransformEngine:
+    """
+    :param name: 引擎名, 见 TRANSFORM_ENGINES.
+    :return: 转换引擎.
+    """
+    if name not in TRANSFORM_ENGINES:
+        raise ValueError(f"unknown transform engine {name=}, {list(TRANSFORM_ENGINES)}")
+    return TRANSFORM_ENGINES[name]
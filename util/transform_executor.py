@@ -0,0 +1,112 @@
+"""
+模块名称: 分区转换并发执行器
+描述: 各 PARTITION (pN) 的转换互不依赖. 本模块在转换连接池上用线程池同时执行多个分区的转换,
+并发数即连接预算; tb_data_product 与 tb_data_week 的任务交错提交, 两张目标表的写入同时推进.
+记录每个任务的耗时、受影响行数和错误, 结束时打印汇总.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import chain, zip_longest
+from typing import Callable
+
+from tqdm import tqdm
+
+from util.mysql_pool import POOL_TRANSFORM, get_connection
+
+_MISSING = object()
+
+
+def execute_transform_sql(
+    sql: str, params: tuple = (), pool_name: str = POOL_TRANSFORM
+) -> int:
+    """
+    在一个事务中执行转换语句并提交.
+
+    :param sql: 转换语句, 例如 INSERT ... SELECT.
+    :param params: 语句参数.
+    :param pool_name: 连接池名称.
+    :return: 受影响的行数.
+    """
+    with get_connection(pool_name) as connection:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rowcount = cursor.rowcount
+        connection.commit()
+    return rowcount
+
+
+def interleave_jobs(*job_lists: list) -> list:
+    """
+    交错合并多个任务列表: [a0, b0, a1, b1, ...].
+    """
+    return [
+        job
+        for job in chain.from_iterable(zip_longest(*job_lists, fillvalue=_MISSING))
+        if job is not _MISSING
+    ]
+
+
+def _run_job(name: str, job_fn: Callable[[], int]) -> dict:
+    start_time = time.time()
+    result = {"name": name, "seconds": 0.0, "rowcount": None, "error": None}
+    try:
+        result["rowcount"] = job_fn()
+    except Exception as ex:
+        result["error"] = str(ex)
+    result["seconds"] = time.time() - start_time
+    return result
+
+
+def run_transform_jobs(
+    jobs: list[tuple[str, Callable[[], int]]],
+    workers: int = 1,
+    desc: str = "Transforming partitions",
+) -> list[dict]:
+    """
+    并发执行转换任务. 单个任务失败不影响其他任务.
+
+    :param jobs: [(任务名, 任务函数)], 任务函数返回受影响的行数, 抛出异常视为失败.
+    :param workers: 同时执行的任务数, 不应超过转换连接池的大小.
+    :param desc: 进度条描述.
+    :return: 每个任务的 {"name", "seconds", "rowcount", "error"}, 与 jobs 顺序一致.
+    """
+    results: list[dict | None] = [None] * len(jobs)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {
+            executor.submit(_run_job, name, job_fn): index
+            for index, (name, job_fn) in enumerate(jobs)
+        }
+        for future in tqdm(as_completed(futures), total=len(futures), desc=desc):
+            result = future.result()
+            results[futures[future]] = result
+            if result["error"] is None:
+                print(
+                    f"Done {result['name']} rowcount={result['rowcount']} in {result['seconds']:.2f} seconds"
+                )
+            else:
+                print(f"Error {result['name']}: {result['error']}")
+    return results
+
+
+def summarize_transform_results(results: list[dict]) -> dict:
+    """
+    汇总并打印转换结果.
+
+    :param results: run_transform_jobs 的返回值.
+    :return: {"jobs", "failed", "rowcount", "seconds"}, seconds 为各任务耗时之和.
+    """
+    failed = [result for result in results if result["error"] is not None]
+    summary = {
+        "jobs": len(results),
+        "failed": len(failed),
+        "rowcount": sum(result["rowcount"] or 0 for result in results),
+        "seconds": sum(result["seconds"] for result in results),
+    }
+    print(f"transform summary: {summary}")
+    slowest = sorted(results, key=lambda result: result["seconds"], reverse=True)[:5]
+    for result in slowest:
+        print(f"  slowest {result['name']}: {result['seconds']:.2f} seconds")
+    for result in failed:
+        print(f"  failed {result['name']}: {result['error']}")
+    return summary
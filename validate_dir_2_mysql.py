@@ -3,115 +3,420 @@
 描述: 该模块提供功能以校验 CSV 文件的头部并将其加载到 MySQL 数据库中。
 """
 
+import argparse
+import asyncio
 import os
+import sys
 import time
+from contextlib import nullcontext
+from functools import partial
+from itertools import groupby
 
 import mysql.connector
-import pandas as pd
-from tqdm import tqdm  # 导入 tqdm
 
 from config.config import DB_CONFIG  # 引入配置
 from model import base_model, mapping
 from model.server_108.db_junglescout_amazon import (
     TbDataProduct,
     TbDataWeek,
+    TbLoadedChunks,
     TbLoadedRecords,
+    TbLoadedRecordsPurges,
     TbSalesEstimatesWeeklyV2,
+    TbTransformChunks,
+    TbTransformWatermarks,
 )
-from util import sqlalchemy_orm_util
-from util.file_util import get_a_table_all_file_by_format
-from util.get_partition_info import (
-    extract_ordered_partition_k_v_pairs_from_path,
-    extract_partition_items,
+from util.adaptive_loader import RETRYABLE_LOCK_ERRNOS, AdaptiveLoadScheduler
+from util.async_orchestrator import (
+    AsyncMySQLPool,
+    get_nonempty_partitions,
+    retry_on_lock_errors,
+    run_async_pipeline,
+)
+from util.chunked_transform import (
+    plan_product_chunks,
+    plan_week_chunks,
+    run_chunked_transform,
+)
+from util.compressed_input import (
+    PARTITION_FILE_FORMATS,
+    is_compressed,
+    open_partition_file,
+)
+from util.deferred_index import BULK_LOAD_SESSION_VARIABLES, DeferredIndexLoad
+from util.external_sort import make_record_key_fn, sort_stream
+from util.file_fingerprint import compute_content_hashes
+from util.file_chunker import (
+    DEFAULT_CHUNK_BYTES,
+    find_chunk_boundaries,
+    iter_chunk_records,
+)
+from util.get_partition_info import parse_partition_predicates
+from util.header_validator import CsvHeaderValidator
+from util.incremental_transform import (
+    advance_watermarks,
+    build_asin_filter,
+    exclude_slices,
+    get_derived_deletes,
+    get_exploded_slices,
+    get_job_slices,
+    get_server_time,
+)
+from util.infile_stream import fifo_infile, iter_records_with_suffix
+from util.insert_loader import (
+    LOAD_ENGINE_AUTO,
+    LOAD_ENGINE_INSERT,
+    LOAD_ENGINE_LOAD_DATA,
+    detect_load_engine,
+    insert_files,
+)
+from util.load_plan import (
+    SQL_DELETE_CHUNK_CHECKPOINT,
+    SQL_INSERT_LOADED_RECORD,
+    SQL_SELECT_LOADED_FINGERPRINT,
+    SQL_UPSERT_CHUNK_CHECKPOINT,
+    get_file_load_plan,
+)
+from util.loaded_ledger import (
+    SQL_BACKFILL_LEGACY_RELATIVE_PATH,
+    LoadedLedger,
+    get_file_ledger_keys,
+)
+from util.mysql_pool import (
+    POOL_LOAD,
+    POOL_TRANSFORM,
+    SESSION_VARIABLES,
+    get_connection,
+    get_session_variables,
+    init_pool,
+)
+from util.parquet_input import (
+    PARQUET_FILE_FORMAT,
+    ParquetSchemaValidator,
+    is_parquet,
+    iter_parquet_records,
+)
+from util.partition_scanner import iter_partition_files
+from util.pipeline import run_streaming_pipeline
+from util.product_dedup import (
+    DATA_PRODUCT_FIELDS,
+    DEDUP_FETCH_SIZE,
+    DEFAULT_DEDUP_MEMORY_BYTES,
+    PRODUCT_SOURCE_FIELDS,
+    BestRowReducer,
+    iter_product_records,
+    product_key,
+    product_order,
+)
+from util.seller_explode import load_week_records
+from util.sqlalchemy_orm_util import create_table_if_not_exists, ensure_table_schema
+from util.staging_load import StagingTables, build_merge_sql
+from util.transform_engine import (
+    DATA_PRODUCT_FINGERPRINT_FIELDS,
+    DEFAULT_TRANSFORM_ENGINE,
+    SQL_DATA_PRODUCT_ON_DUPLICATE,
+    TRANSFORM_ENGINES,
+    fingerprint_sql,
+    get_transform_engine,
+)
+from util.transform_executor import (
+    execute_transform_sql,
+    interleave_jobs,
+    run_transform_jobs,
+    summarize_transform_results,
 )
-from util.sqlalchemy_orm_util import create_table_if_not_exists
 
 
-def validate_one_tb_partition_dir_csv_headers(
-    table_path: str, class_obj: base_model.BaseModel
-) -> tuple[bool, list[str]]:
+def select_files_to_load_in_dir(
+    scanned_files: list[tuple[str, bool]],
+    class_obj: base_model.BaseModel,
+    table_path: str,
+    ledger: LoadedLedger,
+) -> list[str]:
     """
-    校验单个表对应的 CSV 文件的头部.
+    从同一分区目录的文件中挑出需要加载的文件.
+    已加载文件的 size/mtime 有变化时比较内容哈希, 内容确实变化则删除该分区数据、派生的 tb_data_week 行和
+    该分区全部台账 (包括其他格式目录下的文件) 后整目录重新加载.
 
-    :param table_path: 表的绝对路径.
+    :param scanned_files: 同一目录下的 (文件路径, 扫描时是否变化) 列表.
     :param class_obj: 具体的 ORM 类.
-    :return: (是否所有 CSV 文件的头部格式正确, 所有文件列表).
+    :param table_path: 表的绝对路径.
+    :param ledger: 已加载文件台账.
+    :return: 需要加载的文件列表.
     """
-    # 获取 baseModel 的字段
-    base_model_header = sqlalchemy_orm_util.get_abstract_class_fields(
-        base_model.BaseModel
-    )
-    # 获取类的字段名称
-    class_headers = sqlalchemy_orm_util.get_class_fields(class_obj)
-    print(f"{class_obj.__tablename__=}")
-    this_table_all_csv_header_is_formatted = True
-
-    # 获取所有文件
-    all_files_for_a_table = get_a_table_all_file_by_format(table_path)
-    
-    # 从db_junglescout_amazon.tb_loaded_records 根据表名筛选获取已经加载的文件
-    # 使用mysql.connector连接数据库并查询已加载的记录
-    with mysql.connector.connect(**DB_CONFIG) as connection:
-        with connection.cursor() as cursor:
-            cursor.execute(f"SELECT file_name FROM db_junglescout_amazon.tb_loaded_records WHERE table_name = '{class_obj.__tablename__}'")
-            loaded_records = cursor.fetchall()
-    
-    loaded_file_names = [record[0] for record in loaded_records]
-    # 从all_files_for_a_table中去除已经加载的文件
-    files_to_process = [file for file in all_files_for_a_table if os.path.basename(file) not in loaded_file_names]
-    
-    # 打印去除前和去除后的文件数量
-    print(f"总文件数量: {len(all_files_for_a_table)}")
-    print(f"已加载文件数量: {len(loaded_file_names)}")
-    print(f"待处理文件数量: {len(files_to_process)}")
-    # 使用 tqdm 显示进度条
-    for file_path in tqdm(
-        files_to_process, desc=f"Processing files in {class_obj.__tablename__}"
-    ):
-        try:
-            # 只读取标题行
-            df = pd.read_csv(file_path, nrows=0)
-            a_csv_headers = df.columns.tolist()
+    files_to_load = []
+    changed_candidates = {}
+    for file_path, is_new in scanned_files:
+        relative_path = os.path.relpath(file_path, table_path)
+        fingerprint = ledger.get_fingerprint(
+            *get_file_ledger_keys(class_obj, relative_path)
+        )
+        if fingerprint is None:
+            files_to_load.append(file_path)
+            continue
+        file_size, file_mtime_ns, content_hash = fingerprint
+        # 历史记录没有指纹, 视为未变化
+        if not is_new or content_hash is None:
+            continue
+        st = os.stat(file_path)
+        if (st.st_size, st.st_mtime_ns) != (file_size, file_mtime_ns):
+            changed_candidates[file_path] = (st, content_hash)
+
+    if not changed_candidates:
+        return files_to_load
+
+    current_hashes = compute_content_hashes(list(changed_candidates))
+    changed_files = []
+    for file_path, (st, content_hash) in changed_candidates.items():
+        if current_hashes[file_path] != content_hash:
+            changed_files.append(file_path)
+            # 随后整目录重新加载, 加载时复用这里算好的哈希
+            ledger.remember_fingerprint(
+                os.path.relpath(file_path, table_path),
+                (st.st_size, st.st_mtime_ns, current_hashes[file_path]),
+            )
+        else:
+            # 只是 mtime 变化, 内容未变, 刷新台账指纹避免下次重复计算哈希
+            ledger.refresh_fingerprint(
+                os.path.relpath(file_path, table_path),
+                (st.st_size, st.st_mtime_ns, content_hash),
+            )
+    if not changed_files:
+        return files_to_load
 
-            # 提取分区字段
-            partition_fields = extract_partition_items(
-                partitioned_path=os.path.relpath(file_path, table_path), return_type=0
+    print(f"content changed {changed_files=}")
+    load_plan, partition_values = get_file_load_plan(
+        class_obj, os.path.relpath(changed_files[0], table_path)
+    )
+    all_files_in_dir = [file_path for file_path, _ in scanned_files]
+    ledger.invalidate_partition(
+        load_plan,
+        partition_values,
+        [os.path.relpath(file_path, table_path) for file_path in all_files_in_dir],
+        get_derived_deletes(load_plan, partition_values),
+    )
+    return all_files_in_dir
+
+
+def stream_one_tb_partition_dir_2_mysql(
+    table_path: str,
+    class_obj: base_model.BaseModel,
+    predicates: dict | None = None,
+    strict: bool = False,
+    queue_size: int = 1000,
+    load_workers: int = 1,
+    validate_workers: int = 4,
+    adaptive: bool = False,
+    coalesce_files: int = 0,
+    staging: bool = False,
+    file_format: str = "csv",
+    presort: bool = False,
+    chunk_bytes: int = 0,
+    load_engine: str = LOAD_ENGINE_LOAD_DATA,
+    explode_week: bool = False,
+    verify_files: bool = False,
+    async_connections: int = 0,
+    async_max_bytes: int = 0,
+) -> bool:
+    """
+    以流水线方式处理单个表: 文件一经发现即校验, 校验通过即加载.
+
+    :param table_path: 表的绝对路径.
+    :param class_obj: 具体的 ORM 类.
+    :param predicates: 分区谓词, 只遍历满足条件的分区目录.
+    :param strict: 是否保留"整表校验通过才加载"的语义.
+    :param queue_size: 阶段之间有界队列的容量.
+    :param load_workers: 加载线程数, adaptive 为 True 时为并发度上限.
+    :param validate_workers: 校验线程数 (读取文件头部, 命中缓存时只需一次 stat).
+    :param adaptive: 是否根据吞吐与锁等待自动调整加载并发度.
+    :param coalesce_files: 大于 1 时同一分区最多合并这么多个文件为一次 LOAD DATA.
+    :param staging: 是否先加载到暂存表再合并到正式表.
+    :param file_format: 分区文件格式, "csv" (含压缩) 或 "parquet".
+    :param presort: 是否在加载前把每个文件 (或每批文件) 按主键外部排序.
+    :param chunk_bytes: 大于 0 时超过该大小的未压缩 CSV 文件分块加载, 每块单独提交并记录断点.
+    :param load_engine: LOAD_ENGINE_LOAD_DATA 或 LOAD_ENGINE_INSERT (目标实例禁止 local_infile 时).
+    :param explode_week: 是否在加载的同一事务中拆分卖家并写入 tb_data_week (仅 LOAD DATA 引擎).
+    :param verify_files: 是否重新 stat 未变化目录中的文件, 以发现不改变目录 mtime 的原地改写.
+    :param async_connections: 大于 0 时改用 asyncio 流水线, 小文件以协程在这么多个 aiomysql 连接上加载.
+    :param async_max_bytes: 以协程加载的未压缩 CSV 文件的大小上限, 更大的文件仍在线程中加载.
+    :return: 是否所有 CSV 文件的头部 (Parquet 文件的 schema) 格式正确.
+    """
+    table_name = class_obj.__tablename__
+    print(f"{table_name=}")
+    ledger = LoadedLedger(table_name)
+    ledger.sync()
+    print(f"已加载文件数量: {ledger.count()}")
+
+    def discover():
+        scanned = iter_partition_files(
+            table_path,
+            required_format=(
+                PARQUET_FILE_FORMAT
+                if file_format == "parquet"
+                else PARTITION_FILE_FORMATS
+            ),
+            predicates=predicates,
+            stat_files=verify_files,
+        )
+        # 扫描器按目录连续产出文件, 一个目录即一个分区
+        for _, scanned_files in groupby(
+            scanned, key=lambda item: os.path.dirname(item[0])
+        ):
+            yield from select_files_to_load_in_dir(
+                list(scanned_files), class_obj, table_path, ledger
             )
-            # 从类字段定义中去除无关字段后
-            expected_csv_headers = [
-                header
-                for header in class_headers
-                if header not in partition_fields and header not in base_model_header
-            ]
-
-            # 对比缺失和多余的字段
-            missing_headers: set[str] = set(expected_csv_headers) - set(a_csv_headers)
-            extra_headers: set[str] = set(a_csv_headers) - set(expected_csv_headers)
-
-            if missing_headers:
-                print(f"csv  Missing headers: {missing_headers} {file_path=}")
-            if extra_headers:
-                print(f"csv  Extra headers: {extra_headers} {file_path=}")
-
-            # 如果有缺失或多余的字段，设置标记为 False
-            if missing_headers or extra_headers:
-                this_table_all_csv_header_is_formatted = False
-                print(
-                    f"header is error {file_path=} {extra_headers=} {missing_headers} {a_csv_headers=}"
-                )
 
-        except Exception as e:
-            print(f"Error reading {file_path}: {e}")
-            return False, files_to_process  # 发生错误，退出程序
+    create_table_if_not_exists(class_obj=class_obj, db_config=DB_CONFIG)
+    # Parquet 只读取尾部元数据校验 schema, 无需读数据
+    header_validator = (
+        ParquetSchemaValidator(table_path, class_obj)
+        if file_format == "parquet"
+        else CsvHeaderValidator(table_path, class_obj)
+    )
 
-    return this_table_all_csv_header_is_formatted, files_to_process
+    staging_tables = StagingTables(table_name, load_workers) if staging else None
 
+    def load_fn(item: str | list[str]) -> bool:
+        file_paths = item if isinstance(item, list) else [item]
+        if load_engine == LOAD_ENGINE_INSERT:
+            return load_files_by_insert_to_mysql(
+                file_paths, class_obj, table_path, ledger
+            )
+        # 压缩文件和 Parquet 文件只能经流式输入边解码边加载
+        if (
+            coalesce_files > 1
+            or staging_tables
+            or file_format == "parquet"
+            or presort
+            or explode_week
+            or any(map(is_compressed, file_paths))
+        ):
+            return load_files_coalesced_to_mysql(
+                file_paths,
+                class_obj,
+                table_path,
+                ledger,
+                staging_tables,
+                presort,
+                explode_week,
+            )
+        if chunk_bytes and os.path.getsize(item) > chunk_bytes:
+            return load_file_in_chunks_to_mysql(
+                item, class_obj, table_path, ledger, chunk_bytes
+            )
+        return load_file_to_mysql(item, class_obj, table_path, ledger)
+
+    # 逐个文件直接 LOAD DATA 的小文件才适合协程加载, 需要解码、合并或排序的文件仍走线程
+    use_async = async_connections > 0 and not (
+        load_engine != LOAD_ENGINE_LOAD_DATA
+        or coalesce_files > 1
+        or staging_tables
+        or file_format == "parquet"
+        or presort
+        or explode_week
+    )
+
+    def is_async_item(file_path: str) -> bool:
+        return (
+            not is_compressed(file_path)
+            and os.path.getsize(file_path) <= async_max_bytes
+        )
+
+    async def run_async(load_fn) -> dict:
+        pool = await AsyncMySQLPool.create(
+            async_connections, session_variables=get_session_variables(POOL_LOAD)
+        )
+        try:
+            return await run_async_pipeline(
+                source=discover(),
+                validate_fn=header_validator.validate_file,
+                load_fn=load_fn,
+                async_load_fn=partial(
+                    load_file_to_mysql_async,
+                    pool,
+                    class_obj=class_obj,
+                    table_path=table_path,
+                    ledger=ledger,
+                ),
+                is_async_item=is_async_item,
+                max_in_flight=queue_size,
+                validate_workers=validate_workers,
+                load_workers=load_workers,
+                strict=strict,
+            )
+        finally:
+            await pool.close()
+
+    scheduler = AdaptiveLoadScheduler(max_workers=load_workers) if adaptive else None
+    with (
+        scheduler.running() if scheduler else nullcontext()
+    ), staging_tables.running() if staging_tables else nullcontext():
+        if use_async:
+            stats = asyncio.run(
+                run_async(scheduler.wrap(load_fn) if scheduler else load_fn)
+            )
+        else:
+            stats = run_streaming_pipeline(
+                source=discover(),
+                validate_fn=header_validator.validate_file,
+                load_fn=scheduler.wrap(load_fn) if scheduler else load_fn,
+                queue_size=queue_size,
+                validate_workers=validate_workers,
+                load_workers=load_workers,  # 并发会锁表？默认 1, 可开启 adaptive 自动寻找
+                strict=strict,
+                batch_size=coalesce_files,
+                batch_key_fn=os.path.dirname,
+            )
+    if file_format == "csv":
+        header_validator.save_cache()
+    ledger.close()
+    print(f"{table_name=} {stats=}")
+    return stats["all_valid"]
+
+
+def get_file_fingerprints(
+    file_paths: list[str],
+    class_obj: base_model.BaseModel,
+    table_path: str,
+    ledger: LoadedLedger | None,
+) -> dict[str, tuple]:
+    """
+    计算待加载文件的指纹. size/mtime 与台账中的记录一致时复用记录的内容哈希, 只对变化的文件重新计算.
 
-from tqdm.contrib.concurrent import thread_map
+    :param file_paths: 文件列表.
+    :param class_obj: 具体的 ORM 类.
+    :param table_path: 表的绝对路径.
+    :param ledger: 已加载文件台账, 为 None 时全部重新计算.
+    :return: {文件路径: (file_size, file_mtime_ns, content_hash)}.
+    """
+    stats = {file_path: os.stat(file_path) for file_path in file_paths}
+    content_hashes = {}
+    if ledger is not None:
+        for file_path, st in stats.items():
+            content_hash = ledger.get_known_content_hash(
+                *get_file_ledger_keys(
+                    class_obj, os.path.relpath(file_path, table_path)
+                ),
+                st,
+            )
+            if content_hash is not None:
+                content_hashes[file_path] = content_hash
+    content_hashes.update(
+        compute_content_hashes(
+            [file_path for file_path in file_paths if file_path not in content_hashes]
+        )
+    )
+    return {
+        file_path: (st.st_size, st.st_mtime_ns, content_hashes[file_path])
+        for file_path, st in stats.items()
+    }
 
 
 def load_file_to_mysql(
-    file_path: str, class_obj: base_model.BaseModel, table_path: str
+    file_path: str,
+    class_obj: base_model.BaseModel,
+    table_path: str,
+    ledger: LoadedLedger | None = None,
 ) -> None:
     """
     加载单个 CSV 文件到数据库表中.
@@ -119,167 +424,445 @@ def load_file_to_mysql(
     :param file_path: 单个待加载的文件路径.
     :param class_obj: 具体的 ORM 类.
     :param table_path: 表的绝对路径.
+    :param ledger: 已加载文件台账, 加载成功后写入本地镜像.
     """
     try:
         print(f"start {file_path=}")
-        table_name = class_obj.__tablename__
-        base_model_header = sqlalchemy_orm_util.get_abstract_class_fields(
-            base_model.BaseModel
-        )
-        class_headers = sqlalchemy_orm_util.get_class_fields(class_obj)
-
-        # 提取分区字段
-        partition_fields = extract_partition_items(
-            partitioned_path=os.path.relpath(file_path, table_path), return_type=0
-        )
-        partition_kv = extract_ordered_partition_k_v_pairs_from_path(
-            partitioned_path=os.path.relpath(file_path, table_path)
-        )
-        expected_csv_headers = [
-            header
-            for header in class_headers
-            if header not in partition_fields and header not in base_model_header
-        ]
-
-        columns = ", ".join(expected_csv_headers)
-        a_list = [
-            f"{list(item.keys())[0]} = '{list(item.values())[0]}'"
-            for item in partition_kv
-        ]
-        set_clause = ", ".join(a_list)
-
-        # 初始化变量
-        marketplace = 0
-        root_category_id = -1
-        year = 0
-        week = 0
-
-        for item in partition_kv:
-            if "marketplace" in item:
-                marketplace = item["marketplace"]
-            elif "root_category_id" in item:
-                root_category_id = item["root_category_id"]
-            elif "year" in item:
-                year = item["year"]
-            elif "week" in item:
-                week = item["week"]
-
-        sql_load_data = f"""
-            LOAD DATA LOCAL INFILE %s
-            INTO TABLE {table_name}
-            FIELDS TERMINATED BY ',' 
-            ENCLOSED BY '\"' 
-            LINES TERMINATED BY '\n'
-            IGNORE 1 ROWS
-            ({columns})
-            SET {set_clause}
-        """
+        relative_path = os.path.relpath(file_path, table_path)
+        # 同一分区字段布局共享预编译的加载计划, 这里只做参数绑定
+        load_plan, partition_values = get_file_load_plan(class_obj, relative_path)
         file_name = os.path.basename(file_path)
+        fingerprint = get_file_fingerprints([file_path], class_obj, table_path, ledger)[
+            file_path
+        ]
 
-        with mysql.connector.connect(
-            **DB_CONFIG, allow_local_infile=True
-        ) as connection:
+        with get_connection(POOL_LOAD) as connection:
             with connection.cursor() as cursor:
-                cursor.execute(sql_load_data, (file_path,))
+                cursor.execute(
+                    load_plan.sql_load_data,
+                    load_plan.load_params(file_path, partition_values),
+                )
                 connection.commit()
 
-                sql_insert_record = f"""
-                    INSERT INTO db_junglescout_amazon.tb_loaded_records (table_name, marketplace, root_category_id, year, week, file_name)
-                    VALUES (%s, %s, %s, %s, %s, %s)
-                    ON DUPLICATE KEY UPDATE
-                        table_name =  VALUES(table_name),
-                        marketplace =  VALUES(marketplace),
-                        root_category_id = VALUES(root_category_id),
-                        year = VALUES(year),
-                        week = VALUES(week),
-                        file_name = VALUES(file_name);
-                """
                 cursor.execute(
-                    sql_insert_record,
-                    (table_name, marketplace, root_category_id, year, week, file_name),
+                    SQL_INSERT_LOADED_RECORD,
+                    load_plan.ledger_params(
+                        partition_values, file_name, relative_path, fingerprint
+                    ),
                 )
                 connection.commit()
 
+        if ledger is not None:
+            ledger.mark_loaded(
+                *get_file_ledger_keys(class_obj, relative_path), fingerprint
+            )
+
         print(f"Done {file_path=}")  # 执行加载逻辑
         return True  # 表示成功
+    except mysql.connector.Error as ex:
+        if ex.errno in RETRYABLE_LOCK_ERRNOS:
+            raise  # 死锁/锁等待超时交给调度器退避重试
+        print(f"{ex=}")
+        return False  # 表示失败
     except Exception as ex:
         print(f"{ex=}")
         return False  # 表示失败
 
 
-def add_pk_to_js_org_table():
-    with mysql.connector.connect(**DB_CONFIG) as connection:
-        with connection.cursor() as cursor:
-            sql_add_pk = """
-                ALTER TABLE db_junglescout_amazon.tb_sales_estimates_weekly_v2 
-                ADD CONSTRAINT tb_sales_estimates_weekly_v2_pk 
-                PRIMARY KEY (marketplace, root_category_id, `year`, week, start_date, end_date, asin)
-            """
-
-            start_time = time.time()  # 记录开始时间
-            try:
-                cursor.execute(sql_add_pk)
-                connection.commit()
-            except mysql.connector.Error as err:
-                print(f"Error: {err}")
-            else:
-                end_time = time.time()  # 记录结束时间
-                execution_time = end_time - start_time
-                print(
-                    f"Primary key added successfully in {execution_time:.2f} seconds."
+async def load_file_to_mysql_async(
+    pool: AsyncMySQLPool,
+    file_path: str,
+    class_obj: base_model.BaseModel,
+    table_path: str,
+    ledger: LoadedLedger,
+) -> bool:
+    """
+    以协程加载单个小 CSV 文件, 与 load_file_to_mysql 的区别:
+    先在服务端台账查询该文件是否已由其他进程以相同指纹加载过, 是则只更新本地镜像;
+    数据与台账在同一事务中提交; 死锁/锁等待超时时以 asyncio.sleep 退避重试, 不占用线程.
+
+    :param pool: 异步连接池.
+    :param file_path: 单个待加载的文件路径.
+    :param class_obj: 具体的 ORM 类.
+    :param table_path: 表的绝对路径.
+    :param ledger: 已加载文件台账.
+    :return: 是否成功.
+    """
+    relative_path = os.path.relpath(file_path, table_path)
+    load_plan, partition_values = get_file_load_plan(class_obj, relative_path)
+    file_name = os.path.basename(file_path)
+    fingerprint = (
+        await asyncio.to_thread(
+            get_file_fingerprints, [file_path], class_obj, table_path, ledger
+        )
+    )[file_path]
+
+    async def load() -> bool:
+        async with pool.acquire() as connection:
+            async with connection.cursor() as cursor:
+                await cursor.execute(
+                    SQL_SELECT_LOADED_FINGERPRINT,
+                    (class_obj.__tablename__, relative_path),
+                )
+                if await cursor.fetchone() == fingerprint:
+                    await connection.rollback()
+                    print(f"already loaded {file_path=}")
+                    return True
+                await cursor.execute(
+                    load_plan.sql_load_data,
+                    load_plan.load_params(file_path, partition_values),
+                )
+                await cursor.execute(
+                    SQL_INSERT_LOADED_RECORD,
+                    load_plan.ledger_params(
+                        partition_values, file_name, relative_path, fingerprint
+                    ),
                 )
+                await connection.commit()
+        print(f"Done {file_path=}")
+        return True
 
+    print(f"start {file_path=}")
+    try:
+        is_loaded = await retry_on_lock_errors(load, file_path)
+    except Exception as ex:
+        print(f"{ex=}")
+        return False
+    if is_loaded:
+        ledger.mark_loaded(
+            *get_file_ledger_keys(class_obj, relative_path), fingerprint
+        )
+    return is_loaded
 
-# 调用函数
 
+def load_file_in_chunks_to_mysql(
+    file_path: str,
+    class_obj: base_model.BaseModel,
+    table_path: str,
+    ledger: LoadedLedger,
+    chunk_bytes: int = DEFAULT_CHUNK_BYTES,
+) -> bool:
+    """
+    将大文件按记录边界切块, 每块单独 LOAD DATA 并与断点一起提交, 失败重试时从最后提交的块之后继续.
+    最后一块与台账记录同一事务提交, 随后删除断点.
 
-def load_partition_dir_2_mysql(
-    files_to_process: list[str], class_obj: base_model.BaseModel, table_path: str
-) -> None:
+    :param file_path: 待加载的文件路径.
+    :param class_obj: 具体的 ORM 类.
+    :param table_path: 表的绝对路径.
+    :param ledger: 已加载文件台账.
+    :param chunk_bytes: 每块的目标大小.
+    :return: 是否成功.
+    """
+    try:
+        relative_path = os.path.relpath(file_path, table_path)
+        load_plan, partition_values = get_file_load_plan(class_obj, relative_path)
+        suffix = load_plan.partition_suffix(partition_values)
+        st = os.stat(file_path)
+
+        committed_offset = 0
+        checkpoint = ledger.get_chunk_checkpoint(relative_path)
+        if checkpoint is not None:
+            if checkpoint[:2] == (st.st_size, st.st_mtime_ns):
+                committed_offset = checkpoint[2]
+            else:
+                # 文件在两次加载之间被改写, 从头加载, 已提交的行按主键去重
+                print(f"checkpoint of {relative_path=} is stale, restart from 0")
+
+        boundaries = find_chunk_boundaries(file_path, chunk_bytes)
+        print(
+            f"start chunked {file_path=} chunks={len(boundaries)} {committed_offset=}"
+        )
+        fingerprint = get_file_fingerprints([file_path], class_obj, table_path, ledger)[
+            file_path
+        ]
+        ledger_params = load_plan.ledger_params(
+            partition_values, os.path.basename(file_path), relative_path, fingerprint
+        )
+        with get_connection(POOL_LOAD) as connection:
+            with connection.cursor() as cursor:
+                for chunk_index, (start, end) in enumerate(boundaries):
+                    if end <= committed_offset:
+                        continue
+                    with fifo_infile(
+                        iter_chunk_records(file_path, start, end, suffix)
+                    ) as infile_path:
+                        cursor.execute(load_plan.sql_load_data_stream, (infile_path,))
+                    if chunk_index < len(boundaries) - 1:
+                        cursor.execute(
+                            SQL_UPSERT_CHUNK_CHECKPOINT,
+                            (load_plan.table_name, relative_path, *fingerprint[:2], end),
+                        )
+                    else:
+                        # 最后一块与台账记录同一事务提交, 断点随之删除
+                        cursor.execute(SQL_INSERT_LOADED_RECORD, ledger_params)
+                        cursor.execute(
+                            SQL_DELETE_CHUNK_CHECKPOINT,
+                            (load_plan.table_name, relative_path),
+                        )
+                    # 每块单独提交, 事务与 undo 日志大小以块为上限
+                    connection.commit()
+                    print(f"committed chunk {chunk_index + 1}/{len(boundaries)} {end=}")
+                if not boundaries:
+                    # 只有头部的文件
+                    cursor.execute(SQL_INSERT_LOADED_RECORD, ledger_params)
+                    connection.commit()
+
+        ledger.mark_loaded(*get_file_ledger_keys(class_obj, relative_path), fingerprint)
+        print(f"Done chunked {file_path=}")
+        return True
+    except mysql.connector.Error as ex:
+        if ex.errno in RETRYABLE_LOCK_ERRNOS:
+            raise  # 死锁/锁等待超时交给调度器退避重试, 重试时从断点继续
+        print(f"{ex=}")
+        return False
+    except Exception as ex:
+        print(f"{ex=}")
+        return False
+
+
+def load_files_by_insert_to_mysql(
+    file_paths: list[str],
+    class_obj: base_model.BaseModel,
+    table_path: str,
+    ledger: LoadedLedger | None = None,
+) -> bool:
     """
-    加载 CSV 文件到数据库表中.
+    INSERT 引擎: 以多行 INSERT 加载同一分区的一个或多个文件, 数据与台账同一事务提交.
+    用于禁止 local_infile 的目标实例.
 
-    :param files_to_process: 所有待加载的文件列表.
+    :param file_paths: 同一分区目录下的文件列表.
     :param class_obj: 具体的 ORM 类.
     :param table_path: 表的绝对路径.
+    :param ledger: 已加载文件台账, 提交后写入本地镜像.
+    :return: 是否成功.
     """
-    # 使用 tqdm 的并发加载
-    thread_map(
-        lambda file_path: load_file_to_mysql(file_path, class_obj, table_path),
-        files_to_process,
-        max_workers=1,  # 根据需要调整并发线程数 并发会锁表？
-        desc=f"Loading files into {class_obj.__tablename__}",
-    )
+    try:
+        print(f"start insert {len(file_paths)} files in {os.path.dirname(file_paths[0])}")
+        relative_paths = [os.path.relpath(path, table_path) for path in file_paths]
+        load_plan, partition_values = get_file_load_plan(class_obj, relative_paths[0])
+        fingerprints = get_file_fingerprints(file_paths, class_obj, table_path, ledger)
+
+        with get_connection(POOL_LOAD) as connection:
+            with connection.cursor() as cursor:
+                sent_rows = insert_files(
+                    cursor, load_plan, file_paths, partition_values
+                )
+                cursor.executemany(
+                    SQL_INSERT_LOADED_RECORD,
+                    [
+                        load_plan.ledger_params(
+                            partition_values,
+                            os.path.basename(file_path),
+                            relative_path,
+                            fingerprints[file_path],
+                        )
+                        for file_path, relative_path in zip(file_paths, relative_paths)
+                    ],
+                )
+                connection.commit()
+
+        if ledger is not None:
+            for file_path, relative_path in zip(file_paths, relative_paths):
+                ledger.mark_loaded(
+                    *get_file_ledger_keys(class_obj, relative_path),
+                    fingerprints[file_path],
+                )
+        print(f"Done insert {len(file_paths)} files {sent_rows=}")
+        return True
+    except mysql.connector.Error as ex:
+        if ex.errno in RETRYABLE_LOCK_ERRNOS:
+            raise  # 死锁/锁等待超时交给调度器退避重试
+        print(f"{ex=}")
+        return False
+    except Exception as ex:
+        print(f"{ex=}")
+        return False
+
+
+def load_files_coalesced_to_mysql(
+    file_paths: list[str],
+    class_obj: base_model.BaseModel,
+    table_path: str,
+    ledger: LoadedLedger | None = None,
+    staging_tables: StagingTables | None = None,
+    presort: bool = False,
+    explode_week: bool = False,
+) -> bool:
+    """
+    将同一分区的多个小 CSV 文件合并为一路流式输入, 用一条 LOAD DATA 加载,
+    并在同一事务中写入这批文件的台账记录. .csv.gz / .csv.zst 文件在写入管道时解压,
+    .parquet 文件按行组读取投影后的列并编码为 CSV.
+    指定暂存表时先加载到暂存表, 再按主键顺序一次性合并到正式表.
+
+    :param file_paths: 同一分区目录下的文件列表.
+    :param class_obj: 具体的 ORM 类.
+    :param table_path: 表的绝对路径.
+    :param ledger: 已加载文件台账, 提交后写入本地镜像.
+    :param staging_tables: 暂存表, 为 None 时直接加载到正式表.
+    :param presort: 是否按主键外部排序后再加载.
+    :param explode_week: 是否同时把拆分卖家后的行写入 tb_data_week.
+    :return: 是否成功.
+    """
+    try:
+        print(f"start coalesced {len(file_paths)} files in {os.path.dirname(file_paths[0])}")
+        relative_paths = [os.path.relpath(path, table_path) for path in file_paths]
+        load_plan, partition_values = get_file_load_plan(class_obj, relative_paths[0])
+        suffix = load_plan.partition_suffix(partition_values)
+        fingerprints = get_file_fingerprints(file_paths, class_obj, table_path, ledger)
+
+        def iter_chunks():
+            # 去掉每个文件的头部, 分区字段作为真实的列追加到每行末尾
+            for file_path in file_paths:
+                if is_parquet(file_path):
+                    yield from iter_parquet_records(
+                        file_path, load_plan.expected_csv_headers, suffix
+                    )
+                    continue
+                with open_partition_file(file_path) as f:
+                    yield from iter_records_with_suffix(f, suffix)
+
+        chunks = iter_chunks()
+        if presort:
+            # 按主键顺序到达时 InnoDB 顺序追加页, 页分裂最少
+            chunks = sort_stream(chunks, make_record_key_fn(load_plan))
+
+        with (
+            staging_tables.acquire() if staging_tables else nullcontext()
+        ) as staging_table, get_connection(POOL_LOAD) as connection:
+            with connection.cursor() as cursor:
+                with fifo_infile(chunks) as infile_path:
+                    cursor.execute(
+                        load_plan.load_data_stream_sql(
+                            staging_table or load_plan.table_name
+                        ),
+                        (infile_path,),
+                    )
+                if staging_table:
+                    # 暂存表对外不可见, 先提交释放 LOAD DATA 的 undo, 再有序合并
+                    connection.commit()
+                    cursor.execute(build_merge_sql(load_plan, staging_table))
+                if explode_week:
+                    # 同一事务合并到 tb_data_week, 这些切片无需再做递归 CTE 转换
+                    load_week_records(cursor, file_paths, load_plan, partition_values)
+                cursor.executemany(
+                    SQL_INSERT_LOADED_RECORD,
+                    [
+                        load_plan.ledger_params(
+                            partition_values,
+                            os.path.basename(file_path),
+                            relative_path,
+                            fingerprints[file_path],
+                        )
+                        for file_path, relative_path in zip(file_paths, relative_paths)
+                    ],
+                )
+                # 数据与台账同一事务提交
+                connection.commit()
+
+        if ledger is not None:
+            for file_path, relative_path in zip(file_paths, relative_paths):
+                ledger.mark_loaded(
+                    *get_file_ledger_keys(class_obj, relative_path),
+                    fingerprints[file_path],
+                )
+        print(f"Done coalesced {len(file_paths)} files")
+        return True
+    except mysql.connector.Error as ex:
+        if ex.errno in RETRYABLE_LOCK_ERRNOS:
+            raise  # 死锁/锁等待超时交给调度器退避重试
+        print(f"{ex=}")
+        return False
+    except Exception as ex:
+        print(f"{ex=}")
+        return False
 
 
 def validate_all_table_csv_headers(
     base_path: str = "/home/changliu/junglescout",
+    partition_filters: list[str] | None = None,
+    strict: bool = False,
+    load_workers: int = 1,
+    validate_workers: int = 4,
+    adaptive: bool = False,
+    coalesce_files: int = 0,
+    staging: bool = False,
+    defer_indexes: bool = False,
+    presort: bool = False,
+    chunk_bytes: int = 0,
+    load_engine: str = LOAD_ENGINE_LOAD_DATA,
+    explode_week: bool = False,
+    verify_files: bool = False,
+    async_connections: int = 0,
+    async_max_bytes: int = 0,
 ) -> bool:
     """
-    校验所有表对应的 CSV 文件的头部.
+    校验所有表对应的 CSV 文件的头部, 并以流水线方式加载校验通过的文件.
 
     :param base_path: 基础路径.
+    :param partition_filters: 分区谓词表达式列表, 例如 ["marketplace in (us, de)", "year >= 2024"].
+    :param strict: 是否整表校验通过才加载 (原有语义), 默认边校验边加载.
+    :param load_workers: 加载线程数.
+    :param validate_workers: 校验线程数.
+    :param adaptive: 是否自适应调整加载并发度 (load_workers 为上限).
+    :param coalesce_files: 同一分区合并加载的最大文件数, 0 表示逐个文件加载.
+    :param staging: 是否经暂存表加载.
+    :param defer_indexes: 是否删除索引后加载, 加载结束后一次性重建 (大批量回填).
+    :param presort: 是否按主键外部排序后再加载.
+    :param chunk_bytes: 大文件分块加载的块大小, 0 表示不分块.
+    :param load_engine: 加载引擎, LOAD DATA 或多行 INSERT.
+    :param explode_week: 加载 tb_sales_estimates_weekly_v2 时是否同时生成 tb_data_week 的行.
+    :param verify_files: 是否重新 stat 未变化目录中的文件 (默认复用清单缓存).
+    :param async_connections: 大于 0 时小文件以协程在这么多个 aiomysql 连接上加载, 0 表示不启用.
+    :param async_max_bytes: 以协程加载的文件大小上限.
     :return: 是否所有表的 CSV 文件头部格式正确.
     """
     all_table_is_ok = True
+    predicates = parse_partition_predicates(partition_filters)
 
     create_table_if_not_exists(class_obj=TbLoadedRecords, db_config=DB_CONFIG)
-    for relative_path, class_obj in mapping.TABLE_RELATIVE_PATH_CLASS_MAPPING.items():
-        table_name = class_obj.__tablename__
+    ensure_table_schema(
+        class_obj=TbLoadedRecords,
+        db_config=DB_CONFIG,
+        primary_key_migrations=(SQL_BACKFILL_LEGACY_RELATIVE_PATH,),
+    )
+    create_table_if_not_exists(class_obj=TbLoadedRecordsPurges, db_config=DB_CONFIG)
+    create_table_if_not_exists(class_obj=TbLoadedChunks, db_config=DB_CONFIG)
+    table_mappings = [
+        (file_format, relative_path, class_obj)
+        for file_format, table_mapping in mapping.FORMAT_TABLE_MAPPINGS.items()
+        for relative_path, class_obj in table_mapping.items()
+    ]
+    for file_format, relative_path, class_obj in table_mappings:
         table_path = os.path.join(base_path, relative_path)  # 构建绝对路径
-        this_table_all_csv_header_is_formatted, files_to_process = (
-            validate_one_tb_partition_dir_csv_headers(
-                table_path=table_path, class_obj=class_obj
+        if not os.path.isdir(table_path):
+            print(f"table path not found, skip {table_path=}")
+            continue
+        create_table_if_not_exists(class_obj=class_obj, db_config=DB_CONFIG)
+        deferred_index = DeferredIndexLoad(class_obj.__tablename__)
+        deferred_index.recover()  # 上次中断在删除索引之后时先恢复索引
+        with deferred_index.deferred() if defer_indexes else nullcontext():
+            this_table_all_csv_header_is_formatted = stream_one_tb_partition_dir_2_mysql(
+                table_path=table_path,
+                class_obj=class_obj,
+                predicates=predicates,
+                strict=strict,
+                load_workers=load_workers,
+                validate_workers=validate_workers,
+                adaptive=adaptive,
+                coalesce_files=coalesce_files,
+                staging=staging,
+                file_format=file_format,
+                presort=presort,
+                chunk_bytes=chunk_bytes,
+                load_engine=load_engine,
+                explode_week=explode_week and class_obj is TbSalesEstimatesWeeklyV2,
+                verify_files=verify_files,
+                async_connections=async_connections,
+                async_max_bytes=async_max_bytes,
             )
-        )
 
         if this_table_all_csv_header_is_formatted:
-            print(f"{table_name=} is ok to load")
-            create_table_if_not_exists(class_obj=class_obj, db_config=DB_CONFIG)
-            if files_to_process:  # 只有当有文件需要处理时才调用函数
-                load_partition_dir_2_mysql(files_to_process, class_obj, table_path)
-            else:
-                print(f"No new files to process for {table_name}")
+            print(f"{class_obj.__tablename__=} is ok to load")
         else:
             print(f"{class_obj.__tablename__=} is not ok to load")
             all_table_is_ok = False
@@ -287,352 +870,163 @@ def validate_all_table_csv_headers(
     return all_table_is_ok
 
 
-def load_partition_data_to_data_product(partition_name: str):
+def load_partition_data_to_data_product(
+    partition_name: str,
+    slices: list[tuple] | None = None,
+    engine: str = DEFAULT_TRANSFORM_ENGINE,
+    chunk_rows: int = 0,
+) -> int:
     """
     加载特定分区的数据到 MySQL 数据库中。
 
     :param partition_name: 分区名称，例如 p0, p1 等。
+    :param slices: 增量转换的切片, None 表示整个分区.
+    :param engine: 转换引擎名, 见 transform_engine.TRANSFORM_ENGINES.
+    :param chunk_rows: 大于 0 时按 asin 区间分块, 每块约 chunk_rows 行原始数据, 单独提交并记录断点.
+    :return: 受影响的行数.
     """
-    sql_insert = f"""
-        INSERT INTO db_junglescout_amazon.tb_data_product (
-  marketplace,
-  root_category_id,
-  asin,
-  seller_id,
-  brand,
-  name,
-  image_url,
-  category_path,
-  category_name,
-  category_id0,
-  category_id1,
-  category_id2,
-  category_id3,
-  category_id4,
-  category_id5,
-  category_id6,
-  first_date_available,
-  seller_num,
-  seller_types,
-  data_type,
-  created_datetime,
-  modified_datetime
-)
-WITH RECURSIVE SplitSellerId AS (
-  SELECT 
-    created_datetime,
-    modified_datetime,
-    marketplace,
-    root_category_id,
-    asin,
-    brand,
-    name,
-    image_url, 
-    breadcrumb_path_category_ids, 
-    first_date_available,
-    SUBSTRING_INDEX(seller_id_mode, '|', 1) AS seller_id,
-    SUBSTRING(seller_id_mode, LENGTH(SUBSTRING_INDEX(seller_id_mode, '|', 1)) + 2) AS remaining_sellers,
-    seller_types,
-    (LENGTH(seller_id_mode) - LENGTH(REPLACE(seller_id_mode, '|', '')) + 1) AS seller_num
-  FROM (
-    SELECT
-      created_datetime,
-      modified_datetime,
-      marketplace,
-      root_category_id,
-    YEAR,
-    week,
-      asin,
-      brand,
-      name,
-      image_url, 
-      breadcrumb_path_category_ids,  
-    first_date_available,
-      seller_id_mode,
-      seller_types,
-      ROW_NUMBER() OVER (PARTITION BY marketplace, root_category_id, asin ORDER BY breadcrumb_path_category_ids DESC, seller_id_mode DESC, image_url DESC) AS rn
-    FROM
-      db_junglescout_amazon.tb_sales_estimates_weekly_v2 
-    PARTITION ({partition_name})
-    
-      
-  ) AS RandomSelection
-  WHERE rn = 1
-  
-  UNION ALL
-
-  SELECT 
-    created_datetime,
-    modified_datetime,
-    marketplace,
-    root_category_id,
-    asin,
-    brand,
-    name,
-    image_url,
-    breadcrumb_path_category_ids, 
-    first_date_available,
-    SUBSTRING_INDEX(remaining_sellers, '|', 1) AS seller_id,
-    SUBSTRING(remaining_sellers, LENGTH(SUBSTRING_INDEX(remaining_sellers, '|', 1)) + 2) AS remaining_sellers,
-    seller_types,
-    seller_num
-  FROM 
-    SplitSellerId
-  WHERE 
-    remaining_sellers != ''
-)
+    transform_engine = get_transform_engine(engine)
+    # 连接池的会话初始化已清除 SQL 模式
+    if chunk_rows:
+        return run_chunked_transform(
+            f"tb_data_product {partition_name}",
+            plan_product_chunks(partition_name, slices, chunk_rows),
+            lambda asin_range: transform_engine.build_data_product_sql(
+                partition_name, slices, asin_range=asin_range
+            ),
+        )
+    return execute_transform_sql(
+        *transform_engine.build_data_product_sql(partition_name, slices)
+    )
 
-SELECT 
-  marketplace,
-  root_category_id,
-  asin,
-  seller_id,
-  brand,
-  name,
-  image_url, 
-  REPLACE(breadcrumb_path_category_ids, '|', ' > ') AS category_path,
-  SUBSTRING_INDEX(breadcrumb_path_category_ids, '|', 1) AS category_name,
-  SUBSTRING_INDEX(breadcrumb_path_category_ids, '|', 1) AS category_id_0,
-  CASE WHEN LENGTH(breadcrumb_path_category_ids) - LENGTH(REPLACE(breadcrumb_path_category_ids, '|', '')) >= 1
-       THEN SUBSTRING_INDEX(SUBSTRING_INDEX(breadcrumb_path_category_ids, '|', 2), '|', -1) END AS category_id_1,
-  CASE WHEN LENGTH(breadcrumb_path_category_ids) - LENGTH(REPLACE(breadcrumb_path_category_ids, '|', '')) >= 2
-       THEN SUBSTRING_INDEX(SUBSTRING_INDEX(breadcrumb_path_category_ids, '|', 3), '|', -1) END AS category_id_2,
-  CASE WHEN LENGTH(breadcrumb_path_category_ids) - LENGTH(REPLACE(breadcrumb_path_category_ids, '|', '')) >= 3
-       THEN SUBSTRING_INDEX(SUBSTRING_INDEX(breadcrumb_path_category_ids, '|', 4), '|', -1) END AS category_id_3,
-  CASE WHEN LENGTH(breadcrumb_path_category_ids) - LENGTH(REPLACE(breadcrumb_path_category_ids, '|', '')) >= 4
-       THEN SUBSTRING_INDEX(SUBSTRING_INDEX(breadcrumb_path_category_ids, '|', 5), '|', -1) END AS category_id_4,
-  CASE WHEN LENGTH(breadcrumb_path_category_ids) - LENGTH(REPLACE(breadcrumb_path_category_ids, '|', '')) >= 5
-       THEN SUBSTRING_INDEX(SUBSTRING_INDEX(breadcrumb_path_category_ids, '|', 6), '|', -1) END AS category_id_5,
-  CASE WHEN LENGTH(breadcrumb_path_category_ids) - LENGTH(REPLACE(breadcrumb_path_category_ids, '|', '')) >= 6
-       THEN SUBSTRING_INDEX(SUBSTRING_INDEX(breadcrumb_path_category_ids, '|', 7), '|', -1) END AS category_id_6,
-  first_date_available,
-  seller_num,
-  seller_types,
-  '0' as data_type,
-  created_datetime,
-  modified_datetime
-FROM 
-  SplitSellerId
-ON DUPLICATE KEY UPDATE
-  brand = VALUES(brand),
-  name = VALUES(name),
-  image_url = VALUES(image_url),
-  category_path = VALUES(category_path),
-  category_name = VALUES(category_name),
-  category_id0 = VALUES(category_id0),
-  category_id1 = VALUES(category_id1),
-  category_id2 = VALUES(category_id2),
-  category_id3 = VALUES(category_id3),
-  category_id4 = VALUES(category_id4),
-  category_id5 = VALUES(category_id5),
-  category_id6 = VALUES(category_id6),
-  first_date_available = VALUES(first_date_available),
-  seller_num = VALUES(seller_num),
-  seller_types = VALUES(seller_types),
-  data_type = VALUES(data_type),
-  modified_datetime = VALUES(modified_datetime);
-    """
-    try:
-        with mysql.connector.connect(**DB_CONFIG) as connection:
-            with connection.cursor() as cursor:
-                cursor.execute("SET sql_mode = ''")  # 清除 SQL 模式
-                cursor.execute(sql_insert)
-                connection.commit()
-                print(f"Data loaded successfully for partition {partition_name}.")
-    except Exception as ex:
-        print(f"Error loading data for partition {partition_name}: {ex}")
 
+def load_partition_data_to_data_product_deduped(
+    partition_name: str,
+    slices: list[tuple] | None = None,
+    max_memory_bytes: int = DEFAULT_DEDUP_MEMORY_BYTES,
+) -> int:
+    """
+    客户端去重的 tb_data_product 转换: 服务端只做无序扫描, 每个 (marketplace, root_category_id, asin)
+    的最优行在客户端选出 (内存有上限, 超出时落盘), 展开后 LOAD DATA 到临时表,
+    再计算行指纹, 以与 SQL 转换相同的 ON DUPLICATE KEY UPDATE 合并到 tb_data_product, 同一事务提交.
 
-def load_partition_data_to_data_week(partition_name: str):
+    :param partition_name: 分区名称，例如 p0, p1 等。
+    :param slices: 增量转换的切片, None 表示整个分区.
+    :param max_memory_bytes: 去重哈希表的内存上限.
+    :return: 受影响的行数.
+    """
+    asin_filter, params = build_asin_filter(partition_name, slices)
+    columns = ", ".join(DATA_PRODUCT_FIELDS)
+    staging_table = f"tmp_data_product_{partition_name}"
+    with BestRowReducer(
+        product_key, product_order, max_memory_bytes
+    ) as reducer, get_connection(POOL_TRANSFORM) as connection:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT {", ".join(PRODUCT_SOURCE_FIELDS)}
+                FROM db_junglescout_amazon.tb_sales_estimates_weekly_v2
+                PARTITION ({partition_name}){asin_filter}
+                """,
+                params,
+            )
+            while rows := cursor.fetchmany(DEDUP_FETCH_SIZE):
+                reducer.add_all(rows)
+
+            cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS {staging_table}")
+            cursor.execute(
+                f"""
+                CREATE TEMPORARY TABLE {staging_table}
+                SELECT {columns} FROM db_junglescout_amazon.tb_data_product LIMIT 0
+                """
+            )
+            with fifo_infile(iter_product_records(reducer.iter_best())) as infile_path:
+                cursor.execute(
+                    f"""
+                    LOAD DATA LOCAL INFILE %s
+                    INTO TABLE {staging_table}
+                    FIELDS TERMINATED BY ','
+                    ENCLOSED BY '\"'
+                    LINES TERMINATED BY '\\n'
+                    ({columns})
+                    """,
+                    (infile_path,),
+                )
+            cursor.execute(
+                f"""
+                INSERT INTO db_junglescout_amazon.tb_data_product ({columns}, row_fingerprint)
+                SELECT {columns}, {fingerprint_sql(DATA_PRODUCT_FINGERPRINT_FIELDS)}
+                FROM {staging_table}
+                {SQL_DATA_PRODUCT_ON_DUPLICATE}
+                """
+            )
+            rowcount = cursor.rowcount
+            cursor.execute(f"DROP TEMPORARY TABLE {staging_table}")
+        connection.commit()
+    return rowcount
+
+
+def load_partition_data_to_data_week(
+    partition_name: str,
+    slices: list[tuple] | None = None,
+    engine: str = DEFAULT_TRANSFORM_ENGINE,
+    chunk_rows: int = 0,
+    exploded_slices: list[tuple] | None = None,
+) -> int:
     """
     加载特定分区的数据到 MySQL 数据库中。
 
     :param partition_name: 分区名称，例如 p0, p1 等。
+    :param slices: 增量转换的切片, None 表示整个分区.
+    :param engine: 转换引擎名, 见 transform_engine.TRANSFORM_ENGINES.
+    :param chunk_rows: 大于 0 时按 (year, week) 等切片分块, 每块约 chunk_rows 行, 单独提交并记录断点.
+    :param exploded_slices: 本次加载时已拆分卖家写入 tb_data_week、且更早加载的文件都已转换过的切片, 不再转换.
+    :return: 受影响的行数.
     """
-    sql_insert = f"""
-INSERT INTO db_junglescout_amazon.tb_data_week (
-  created_datetime,
-  modified_datetime,
-  marketplace,
-  root_category_id,
-  year,
-  week,
-  start_date,
-  end_date,
-  asin,
-  seller_id,
-  is_available,
-  category_rank,
-  subcategory_rank,
-  price,
-  review_count,
-  ratings,
-  revenue,
-  revenue_1p,
-  revenue_3p,
-  sales,
-  sales_1p,
-  sales_3p,
-  revenue_org,
-  revenue_1p_org,
-  revenue_3p_org,
-  sales_org,
-  sales_1p_org,
-  sales_3p_org
-)
-WITH RECURSIVE SplitSellerId AS (
-  SELECT
-    created_datetime,
-    modified_datetime,
-    marketplace,
-    root_category_id,
-    year,
-    week,
-    start_date,
-    end_date,
-    is_available,
-    category_rank,
-    subcategory_rank,
-    price,
-    review_count,
-    ratings,
-    revenue,
-    revenue_1p,
-    revenue_3p,
-    sales,
-    sales_1p,
-    sales_3p,
-    SUBSTRING_INDEX(seller_id_mode, '|', 1) AS seller_id,
-    SUBSTRING(seller_id_mode, LENGTH(SUBSTRING_INDEX(seller_id_mode, '|', 1)) + 2) AS remaining_sellers,
-    asin,
-    (LENGTH(seller_id_mode) - LENGTH(REPLACE(seller_id_mode, '|', '')) + 1) AS seller_num
-  FROM (
-    SELECT
-      created_datetime,
-      modified_datetime,
-      marketplace,
-      root_category_id,
-      year,
-      week,
-      start_date,
-      end_date,
-      asin,
-      is_available,
-      category_rank,
-      subcategory_rank,
-      price,
-      review_count,
-      ratings,
-      revenue,
-      revenue_1p,
-      revenue_3p,
-      sales,
-      sales_1p,
-      sales_3p,
-      seller_id_mode
-    FROM
-      db_junglescout_amazon.tb_sales_estimates_weekly_v2
-      PARTITION ({partition_name})
-  ) AS RandomSelection
-  UNION ALL
-  SELECT
-    created_datetime,
-    modified_datetime,
-    marketplace,
-    root_category_id,
-    year,
-    week,
-    start_date,
-    end_date,
-    is_available,
-    category_rank,
-    subcategory_rank,
-    price,
-    review_count,
-    ratings,
-    revenue,
-    revenue_1p,
-    revenue_3p,
-    sales,
-    sales_1p,
-    sales_3p,
-    SUBSTRING_INDEX(remaining_sellers, '|', 1) AS seller_id,
-    SUBSTRING(remaining_sellers, LENGTH(SUBSTRING_INDEX(remaining_sellers, '|', 1)) + 2) AS remaining_sellers,
-    asin,
-    seller_num
-  FROM
-    SplitSellerId
-  WHERE
-    remaining_sellers != ''
-)
+    slices = exclude_slices(partition_name, slices, exploded_slices or [])
+    if slices == []:
+        print(f"all slices of {partition_name} were exploded at load time, skip")
+        return 0
+    transform_engine = get_transform_engine(engine)
+    # 连接池的会话初始化已清除 SQL 模式
+    if chunk_rows:
+        return run_chunked_transform(
+            f"tb_data_week {partition_name}",
+            plan_week_chunks(partition_name, slices, chunk_rows),
+            lambda chunk_slices: transform_engine.build_data_week_sql(
+                partition_name, chunk_slices
+            ),
+        )
+    return execute_transform_sql(
+        *transform_engine.build_data_week_sql(partition_name, slices)
+    )
 
 
-SELECT
-  created_datetime,
-  modified_datetime,
-  marketplace,
-  root_category_id,
-  year,
-  week,
-  start_date,
-  end_date,
-  asin,
-  seller_id,
-  is_available,
-  category_rank,
-  subcategory_rank,
-  price,
-  review_count,
-  ratings,
-  revenue / seller_num AS revenue,
-  revenue_1p / seller_num AS revenue_1p,
-  revenue_3p / seller_num AS revenue_3p,
-  sales / seller_num AS sales,
-  sales_1p / seller_num AS sales_1p,
-  sales_3p / seller_num AS sales_3p,
-  revenue AS revenue_org,
-  revenue_1p AS revenue_1p_org,
-  revenue_3p AS revenue_3p_org,
-  sales AS sales_org,
-  sales_1p AS sales_1p_org,
-  sales_3p AS sales_3p_org
-FROM
-  SplitSellerId
-ON DUPLICATE KEY UPDATE
-  modified_datetime = VALUES(modified_datetime),
-  is_available = VALUES(is_available),
-  category_rank = VALUES(category_rank),
-  subcategory_rank = VALUES(subcategory_rank),
-  price = VALUES(price),
-  review_count = VALUES(review_count),
-  ratings = VALUES(ratings),
-  revenue = VALUES(revenue),
-  revenue_1p = VALUES(revenue_1p),
-  revenue_3p = VALUES(revenue_3p),
-  sales = VALUES(sales),
-  sales_1p = VALUES(sales_1p),
-  sales_3p = VALUES(sales_3p),
-  revenue_org = VALUES(revenue_org),
-  revenue_1p_org = VALUES(revenue_1p_org),
-  revenue_3p_org = VALUES(revenue_3p_org),
-  sales_org = VALUES(sales_org),
-  sales_1p_org = VALUES(sales_1p_org),
-  sales_3p_org = VALUES(sales_3p_org);
+async def check_nonempty_partitions(
+    table_name: str, partitions: list[str], pool_size: int
+) -> set[str]:
     """
+    在临时的 aiomysql 连接池上并发检查原始表各分区是否有数据.
 
+    :param table_name: 原始表名.
+    :param partitions: 分区名称列表.
+    :param pool_size: 连接数.
+    :return: 有数据的分区.
+    """
+    pool = await AsyncMySQLPool.create(
+        pool_size, session_variables=get_session_variables(POOL_TRANSFORM)
+    )
     try:
-        with mysql.connector.connect(**DB_CONFIG) as connection:
-            with connection.cursor() as cursor:
-                cursor.execute(sql_insert)
-                connection.commit()
-                print(f"Data loaded successfully for partition {partition_name}.")
-    except Exception as ex:
-        print(f"Error loading data for partition {partition_name}: {ex}")
+        return await get_nonempty_partitions(
+            pool, f"db_junglescout_amazon.{table_name}", partitions
+        )
+    finally:
+        await pool.close()
 
 
 def execute_query(query):
     try:
-        with mysql.connector.connect(**DB_CONFIG) as connection:
+        with get_connection(POOL_TRANSFORM) as connection:
             with connection.cursor() as cursor:
                 cursor.execute(query)
                 connection.commit()
@@ -641,67 +1035,305 @@ def execute_query(query):
         print(f"Error query {err}")
 
 
-def set_global_setting():
+def set_global_setting(load_engine: str = LOAD_ENGINE_LOAD_DATA):
     execute_query(query="SET GLOBAL sql_mode = ''")  # 清除全局 SQL 模式
-    execute_query(query="SET GLOBAL local_infile = 1;")
+    if load_engine == LOAD_ENGINE_LOAD_DATA:
+        execute_query(query="SET GLOBAL local_infile = 1;")
 
 
-def drop_primary_key_from_tb_sales_estimates():
-    """
-    删除 TbSalesEstimatesWeeklyV2 表的主键约束.
-    """
-    sql_drop_pk = """
-    ALTER TABLE db_junglescout_amazon.tb_sales_estimates_weekly_v2 
-    DROP PRIMARY KEY;
-    """
-    execute_query(query=sql_drop_pk)
-    print("Primary key dropped successfully from tb_sales_estimates_weekly_v2.")
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="校验分区 CSV 并加载到 MySQL")
+    parser.add_argument(
+        "--base-path",
+        default="/home/changliu/junglescout",  # 替换为实际的绝对路径
+        help="分区数据根目录",
+    )
+    parser.add_argument(
+        "--where",
+        action="append",
+        default=[],
+        help="分区谓词, 可重复, 例如 --where 'marketplace in (us, de)' --where 'year >= 2024'",
+    )
+    parser.add_argument(
+        "--strict",
+        action="store_true",
+        help="整表所有 CSV 头部校验通过后才开始加载 (默认边校验边加载)",
+    )
+    parser.add_argument(
+        "--load-workers", type=int, default=1, help="LOAD DATA 并发线程数"
+    )
+    parser.add_argument(
+        "--validate-workers", type=int, default=4, help="校验文件头部的并发线程数"
+    )
+    parser.add_argument(
+        "--adaptive-load",
+        action="store_true",
+        help="根据吞吐与 InnoDB 锁等待自动调整加载并发度, --load-workers 为上限",
+    )
+    parser.add_argument(
+        "--coalesce-files",
+        type=int,
+        default=0,
+        help="同一分区最多合并多少个小文件为一次 LOAD DATA, 0 表示逐个文件加载",
+    )
+    parser.add_argument(
+        "--staging-load",
+        action="store_true",
+        help="先加载到无主键的暂存表, 再按主键顺序一次性合并到正式表",
+    )
+    parser.add_argument(
+        "--defer-indexes",
+        action="store_true",
+        help="大批量回填: 删除主键和索引后加载 (加载会话关闭 unique_checks 与 foreign_key_checks), 清理重复行后一次性重建",
+    )
+    parser.add_argument(
+        "--verify-files",
+        action="store_true",
+        help="重新 stat 未变化目录中的每个文件以发现原地改写, 默认复用清单缓存中的 stat",
+    )
+    parser.add_argument(
+        "--presort",
+        action="store_true",
+        help="加载前按主键外部排序 (内存有上限, 超出时写入磁盘有序段)",
+    )
+    parser.add_argument(
+        "--chunk-mb",
+        type=int,
+        default=0,
+        help="超过该大小 (MB) 的 CSV 文件分块加载并记录断点, 0 表示不分块",
+    )
+    parser.add_argument(
+        "--load-engine",
+        choices=[LOAD_ENGINE_AUTO, LOAD_ENGINE_LOAD_DATA, LOAD_ENGINE_INSERT],
+        default=LOAD_ENGINE_AUTO,
+        help="加载引擎: auto 在目标实例禁止 local_infile 时改用多行 INSERT",
+    )
+    parser.add_argument(
+        "--async-load",
+        action="store_true",
+        help="以 asyncio 流水线加载: 小文件的服务端台账查询与 LOAD DATA 以协程并发, 并在转换前并发检查分区是否有数据 (需要 aiomysql)",
+    )
+    parser.add_argument(
+        "--async-connections",
+        type=int,
+        default=8,
+        help="--async-load 使用的 aiomysql 连接数",
+    )
+    parser.add_argument(
+        "--async-max-mb",
+        type=int,
+        default=16,
+        help="--async-load 时以协程加载的未压缩 CSV 文件大小上限 (MB), 更大的文件仍在线程中加载",
+    )
+    parser.add_argument(
+        "--transform-workers", type=int, default=1, help="同时转换的分区数 (转换连接池大小)"
+    )
+    parser.add_argument(
+        "--incremental-transform",
+        action="store_true",
+        help="每个转换任务只处理自其上次成功以来加载过的 (marketplace, root_category_id, year, week) 切片",
+    )
+    parser.add_argument(
+        "--explode-week",
+        action="store_true",
+        help="加载时拆分卖家并直接合并到 tb_data_week, 本次加载的切片跳过 tb_data_week 的 SQL 转换 (仅 LOAD DATA 引擎, 不分块)",
+    )
+    parser.add_argument(
+        "--transform-engine",
+        choices=list(TRANSFORM_ENGINES),
+        default=DEFAULT_TRANSFORM_ENGINE,
+        help="分区转换引擎: recursive_cte (递归 CTE) 或 json_table (MySQL 8.0.4+)",
+    )
+    parser.add_argument(
+        "--transform-chunk-rows",
+        type=int,
+        default=0,
+        help="分块转换: 每个事务约处理多少行原始数据, 按键范围分块单独提交并记录断点, 0 表示整个分区一个事务 (客户端去重的 tb_data_product 不分块)",
+    )
+    parser.add_argument(
+        "--client-product-dedup",
+        action="store_true",
+        help="tb_data_product 的最优行在客户端挑选 (取代服务端 ROW_NUMBER 窗口), 仅 LOAD DATA 引擎",
+    )
+    parser.add_argument(
+        "--dedup-memory-mb",
+        type=int,
+        default=DEFAULT_DEDUP_MEMORY_BYTES // 1024 // 1024,
+        help="客户端去重哈希表的内存上限 (MB), 超出时写入磁盘有序段",
+    )
+    return parser.parse_args()
 
 
 if __name__ == "__main__":
-    base_path = "/home/changliu/junglescout"  # 替换为实际的绝对路径
+    args = parse_args()
+    base_path = args.base_path
+    # 连接池大小与并发数挂钩, 加载池额外预留连接给台账同步和锁指标采集
+    init_pool(
+        POOL_LOAD,
+        pool_size=args.load_workers + 2,
+        session_variables=(
+            {**SESSION_VARIABLES[POOL_LOAD], **BULK_LOAD_SESSION_VARIABLES}
+            if args.defer_indexes
+            else None
+        ),
+    )
+    init_pool(POOL_TRANSFORM, pool_size=args.transform_workers)
 
     create_table_if_not_exists(class_obj=TbSalesEstimatesWeeklyV2, db_config=DB_CONFIG)
+    ensure_table_schema(class_obj=TbSalesEstimatesWeeklyV2, db_config=DB_CONFIG)
     create_table_if_not_exists(class_obj=TbDataProduct, db_config=DB_CONFIG)
+    ensure_table_schema(class_obj=TbDataProduct, db_config=DB_CONFIG)
     create_table_if_not_exists(class_obj=TbDataWeek, db_config=DB_CONFIG)
-    set_global_setting()
-    # drop_primary_key_from_tb_sales_estimates()
+    ensure_table_schema(class_obj=TbDataWeek, db_config=DB_CONFIG)
+    create_table_if_not_exists(class_obj=TbTransformChunks, db_config=DB_CONFIG)
+    create_table_if_not_exists(class_obj=TbTransformWatermarks, db_config=DB_CONFIG)
+    load_engine = (
+        detect_load_engine() if args.load_engine == LOAD_ENGINE_AUTO else args.load_engine
+    )
+    set_global_setting(load_engine)
+    explode_week = args.explode_week and load_engine == LOAD_ENGINE_LOAD_DATA
+    if args.explode_week and not explode_week:
+        print("--explode-week requires the load_data engine, fall back to SQL transform")
+    # 暂存表、预排序和大文件分块都建立在 LOAD DATA 之上, INSERT 引擎按文件直接写入正式表
+    staging_load = args.staging_load and load_engine == LOAD_ENGINE_LOAD_DATA
+    if args.staging_load and not staging_load:
+        print("--staging-load requires the load_data engine, fall back to direct load")
+    presort = args.presort and load_engine == LOAD_ENGINE_LOAD_DATA
+    if args.presort and not presort:
+        print("--presort requires the load_data engine, fall back to unsorted load")
+    chunk_bytes = (
+        args.chunk_mb * 1024 * 1024 if load_engine == LOAD_ENGINE_LOAD_DATA else 0
+    )
+    if args.chunk_mb and not chunk_bytes:
+        print("--chunk-mb requires the load_data engine, fall back to whole-file load")
+    # 本次加载的起点, 此后加载的切片已在加载时拆分卖家
+    load_start_datetime = get_server_time()
+    client_product_dedup = (
+        args.client_product_dedup and load_engine == LOAD_ENGINE_LOAD_DATA
+    )
+    if args.client_product_dedup and not client_product_dedup:
+        print("--client-product-dedup requires the load_data engine, fall back to SQL transform")
     all_table_is_ok = validate_all_table_csv_headers(
-        base_path
+        base_path,
+        partition_filters=args.where,
+        strict=args.strict,
+        load_workers=args.load_workers,
+        validate_workers=args.validate_workers,
+        adaptive=args.adaptive_load,
+        coalesce_files=args.coalesce_files,
+        staging=staging_load,
+        defer_indexes=args.defer_indexes,
+        presort=presort,
+        chunk_bytes=chunk_bytes,
+        load_engine=load_engine,
+        explode_week=explode_week,
+        verify_files=args.verify_files,
+        async_connections=args.async_connections if args.async_load else 0,
+        async_max_bytes=args.async_max_mb * 1024 * 1024,
     )  # 校验 CSV 文件的 Header
-    # try:
-    #     add_pk_to_js_org_table()
-    # except Exception as ex:
-    #     print(f"{ex=}")
 
     try:
         start_time = time.time()  # 记录整个过程开始时间
 
         # 调用函数处理每个分区
         partitions = [f"p{item}" for item in range(1024)]  # 根据您的分区名称调整
-
-        # 使用 tqdm 显示进度条
-        for partition in tqdm(partitions, desc="Loading data_product"):
-            partition_start_time = time.time()  # 记录每个分区开始时间
-            load_partition_data_to_data_product(partition)
-            partition_end_time = time.time()  # 记录每个分区结束时间
-            partition_execution_time = partition_end_time - partition_start_time
-            print(
-                f"Done loading data to data product for partition: {partition} in {partition_execution_time:.2f} seconds"
+        product_jobs = {
+            f"data_product {partition}": partition for partition in partitions
+        }
+        week_jobs = {f"data_week {partition}": partition for partition in partitions}
+        # 本次加载时已拆分卖家写入 tb_data_week 的切片; 其中更早加载的文件尚未被 week 任务转换过的切片仍需转换
+        exploded_slices = (
+            get_exploded_slices(
+                TbSalesEstimatesWeeklyV2.__tablename__,
+                list(week_jobs),
+                load_start_datetime,
             )
-
-        print("Done load_partition_data_to_data_product")
-
-        for partition in tqdm(partitions, desc="Loading Data Week"):
-            partition_start_time = time.time()  # 记录每个分区开始时间
-            load_partition_data_to_data_week(partition)
-            partition_end_time = time.time()  # 记录每个分区结束时间
-            partition_execution_time = partition_end_time - partition_start_time
-            print(
-                f"Done loading data to data week for partition: {partition} in {partition_execution_time:.2f} seconds"
+            if explode_week
+            else {}
+        )
+        # 水位取在读取切片之前, 任务成功后推进到这里
+        transform_start_datetime = get_server_time()
+        job_slices = (
+            get_job_slices(
+                TbSalesEstimatesWeeklyV2.__tablename__, [*product_jobs, *week_jobs]
             )
-
-        print("Done load_partition_data_to_data_week")
+            if args.incremental_transform
+            else {}
+        )
+        # 原始表中没有数据的分区无需转换, 以协程并发检查各分区
+        if args.async_load:
+            empty_partitions = set(partitions) - asyncio.run(
+                check_nonempty_partitions(
+                    TbSalesEstimatesWeeklyV2.__tablename__,
+                    partitions,
+                    args.async_connections,
+                )
+            )
+            for job_name, partition in [*product_jobs.items(), *week_jobs.items()]:
+                if partition in empty_partitions:
+                    job_slices[job_name] = []
+        # 自上次成功以来没有加载过切片的任务无需执行
+        skipped_jobs = [
+            job_name for job_name, slices in job_slices.items() if slices == []
+        ]
+        print(f"{len(skipped_jobs)} transform jobs have no new slices or an empty partition, skip")
+
+        # product 与 week 任务交错, 并发数即转换连接池大小
+        transform_jobs = interleave_jobs(
+            [
+                (
+                    job_name,
+                    (
+                        partial(
+                            load_partition_data_to_data_product_deduped,
+                            partition,
+                            job_slices.get(job_name),
+                            args.dedup_memory_mb * 1024 * 1024,
+                        )
+                        if client_product_dedup
+                        else partial(
+                            load_partition_data_to_data_product,
+                            partition,
+                            job_slices.get(job_name),
+                            args.transform_engine,
+                            args.transform_chunk_rows,
+                        )
+                    ),
+                )
+                for job_name, partition in product_jobs.items()
+                if job_slices.get(job_name) != []
+            ],
+            [
+                (
+                    job_name,
+                    partial(
+                        load_partition_data_to_data_week,
+                        partition,
+                        job_slices.get(job_name),
+                        args.transform_engine,
+                        args.transform_chunk_rows,
+                        exploded_slices.get(job_name),
+                    ),
+                )
+                for job_name, partition in week_jobs.items()
+                if job_slices.get(job_name) != []
+            ],
+        )
+        transform_results = run_transform_jobs(
+            transform_jobs, workers=args.transform_workers
+        )
+        failed_jobs = summarize_transform_results(transform_results)["failed"]
+        advance_watermarks(
+            [
+                *skipped_jobs,
+                *(
+                    result["name"]
+                    for result in transform_results
+                    if result["error"] is None
+                ),
+            ],
+            transform_start_datetime,
+        )
 
         end_time = time.time()  # 记录整个过程结束时间
         total_execution_time = end_time - start_time
@@ -709,3 +1341,8 @@ if __name__ == "__main__":
 
     except Exception as ex:
         print(f"Error occurred: {ex}")
+        failed_jobs = 1
+
+    if failed_jobs:
+        print(f"{failed_jobs} transform jobs failed")
+        sys.exit(1)